@@ -7,6 +7,8 @@ from datetime import datetime
 from dataclasses import dataclass, field
 from typing import List, Dict, Any, Optional, Callable
 
+from dir_cache import DirNameCache
+
 @dataclass
 class OperationLog:
     type: str
@@ -67,19 +69,21 @@ def sanitize_filename(name: str) -> str:
     if not name: return "未命名"
     return re.sub(r'[\\/*?:"<>|]', '_', name).strip()
 
-def find_unique_filepath(filepath: str) -> str:
-    if not os.path.exists(filepath): return filepath
+def find_unique_filepath(filepath: str, name_cache: Optional[DirNameCache] = None) -> str:
+    exists = name_cache.exists if name_cache else os.path.exists
+    if not exists(filepath): return filepath
     base, ext = os.path.splitext(filepath)
     i = 1
     while True:
         new_filepath = f"{base}_{i}{ext}"
-        if not os.path.exists(new_filepath): return new_filepath
+        if not exists(new_filepath): return new_filepath
         i += 1
 
 class RegexFileProcessor:
     def __init__(self, folders: List[str], reporter: ConsoleReporter):
         self.folders = folders
         self.reporter = reporter
+        self.name_cache = DirNameCache() # 每个文件夹只扫描一次，改名后同步更新
 
     def detect_duplicates(self) -> ProcessResult:
         self.reporter.start_phase("阶段一：检测重复")
@@ -102,9 +106,10 @@ class RegexFileProcessor:
                 for path_to_mark in sorted_paths[1:]:
                     if "_DUPLICATE" in os.path.basename(path_to_mark): continue
                     base, ext = os.path.splitext(path_to_mark)
-                    new_path = find_unique_filepath(f"{base}_DUPLICATE{ext}")
+                    new_path = find_unique_filepath(f"{base}_DUPLICATE{ext}", self.name_cache)
                     try:
                         os.rename(path_to_mark, new_path)
+                        self.name_cache.move(path_to_mark, new_path)
                         log = OperationLog("rename_only", path_to_mark, new_path)
                         result.logs.append(log)
                         result.marked += 1
@@ -158,13 +163,14 @@ class RegexFileProcessor:
 
                 new_script_name = modified_data['scriptName']
                 new_filename_base = sanitize_filename(f"正则-{new_script_name}") + ".json"
-                new_path = find_unique_filepath(os.path.join(folder, new_filename_base))
+                new_path = find_unique_filepath(os.path.join(folder, new_filename_base), self.name_cache)
                 
                 try:
                     with open(filepath, 'w', encoding='utf-8') as f:
                         json.dump(modified_data, f, indent=2, ensure_ascii=False)
                     if filepath.lower() != new_path.lower():
                         os.rename(filepath, new_path)
+                        self.name_cache.move(filepath, new_path)
                     
                     log = OperationLog("rename_and_modify", filepath, new_path, {"original_script_name": original_script_name})
                     result.logs.append(log)
@@ -9,6 +9,8 @@ from dataclasses import dataclass
 from typing import List, Dict, Optional, Any, Tuple, Set
 from pathlib import Path
 
+from dir_cache import DirNameCache
+
 # 尝试加载 GUI 库，用于文件夹选择器
 try:
     import tkinter as tk
@@ -115,6 +117,7 @@ class JsonOrganizer:
         self.tasks: List[FileTask] = []
         self.stats = collections.defaultdict(lambda: {"total": 0, "action": 0})
         self.scanned_count = 0
+        self.name_cache = DirNameCache() # 冲突检测用的目录文件名集合
 
     def _generate_new_name(self, f_type: str, data: Dict, original_path: Path) -> Optional[str]:
         """根据类型生成标准文件名"""
@@ -195,6 +198,7 @@ class JsonOrganizer:
                 if not DRY_RUN:
                     try:
                         current_path.rename(new_path)
+                        self.name_cache.move(current_path, new_path)
                         logs.append({"type": "rename", "old": str(current_path), "new": str(new_path)})
                         current_path = new_path
                     except Exception as e: print(f"错误: 无法重命名 {current_path.name}: {e}")
@@ -209,6 +213,7 @@ class JsonOrganizer:
                 if not DRY_RUN:
                     try:
                         shutil.move(str(current_path), str(dest))
+                        self.name_cache.move(current_path, dest)
                         logs.append({"type": "move", "old": str(current_path), "new": str(dest)})
                     except Exception as e: print(f"错误: 无法移动 {current_path.name}: {e}")
                 else:
@@ -218,10 +223,10 @@ class JsonOrganizer:
         return logs
 
     def _get_unique_path(self, path: Path) -> Path:
-        """解决文件名冲突"""
-        if not path.exists() or DRY_RUN: return path
+        """解决文件名冲突 (查询内存中的目录文件名集合，不逐个访问磁盘)"""
+        if not self.name_cache.exists(path) or DRY_RUN: return path
         idx = 1
-        while path.exists():
+        while self.name_cache.exists(path):
             path = path.with_stem(f"{path.stem}_{idx}")
             idx += 1
         return path
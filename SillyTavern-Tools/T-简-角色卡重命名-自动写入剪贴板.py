@@ -1,9 +1,6 @@
-import base64
-import zlib
 from PIL import Image
 import sys
 sys.path.append('/data/data/com.termux/files/usr/lib/python3.12/site-packages')
-import png
 import json
 import os
 import re
@@ -11,24 +8,18 @@ import collections
 import subprocess
 import time
 
+from png_chunks import read_chunks, decode_chara_payload, PNGChunkError
+
 def read_png_metadata(png_file_path):
     """读取 PNG 文件中的元数据信息，并返回关键字为 "chara" 的文本内容。"""
     try:
-        with open(png_file_path, 'rb') as f:
-            reader = png.Reader(file=f)
-            chunks = list(reader.chunks())
-
-            for chunk_type, chunk_data in chunks:
-                if chunk_type == b'tEXt':
-                    keyword, text = chunk_data.split(b'\x00', 1)
-                    if keyword.lower() == b'chara':
-                        try:
-                            text = zlib.decompress(text)
-                        except zlib.error:
-                            pass
-                        return base64.b64decode(text).decode('utf-8')
+        # 只读块头，不读取 IDAT 图像数据
+        for chunk_type, chunk_data in read_chunks(png_file_path, (b'tEXt',)):
+            keyword, text = chunk_data.split(b'\x00', 1)
+            if keyword.lower() == b'chara':
+                return decode_chara_payload(text)
     except Exception as e:
-        if not isinstance(e, png.FormatError):
+        if not isinstance(e, PNGChunkError):
             print(f"读取 PNG 文件 {png_file_path} 失败：{e}")
         return None
 
@@ -1,8 +1,6 @@
-import base64
-import zlib
 import sys
-import png
 import json
+import argparse
 import os
 import re
 import collections
@@ -10,14 +8,27 @@ import subprocess
 import time
 import hashlib
 import math
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor, Future
 from typing import Optional, List, Tuple, Dict, Any, Set
 from dataclasses import dataclass
 from enum import Enum, auto
 
+from png_chunks import read_chunks, decode_chara_payload
+import image_hash
+from dir_cache import DirNameCache
+
 # === 全局配置 ===
 PROGRAM_VERSION = "Termux-Pro"
 DHASH_SIZE = 8
+PARTIAL_HASH_BLOCK = 64 * 1024 # 查重预筛选: 首尾各读取的字节数
+WATCH_SETTLE_SECONDS = 3.0 # 监视模式: 文件大小/修改时间保持不变多久才视为下载完成
+WATCH_POLL_INTERVAL = 2.0 # 监视模式: 轮询间隔 (无 watchfiles 时) 与检查待处理文件的周期
+WATCH_LOG_MAX_OPS = 500 # 监视模式: 单个滚动日志最多记录的操作数，超出后换新文件
+NEAR_DUP_MAX_DISTANCE = 6 # 近似查重: dHash 汉明距离阈值 (64 位中不同的位数)
 LOGS_DIR_NAME = "logs"
+SCAN_INDEX_NAME = "scan_index.db" # 与 logs 目录同级
+ANALYZE_WORKERS = min(8, (os.cpu_count() or 2) * 2) # 阶段1 元数据解析线程数
 
 # === 核心正则与常量 ===
 # 匹配: 前缀-1024KB&5KB-123.png 或 前缀-1024KB-123.png
@@ -104,7 +115,7 @@ class ProcessedFileInfo:
     chara_json_str: Optional[str] = None
     detailed_data: Optional[DetailedCharaData] = None
     file_hash: Optional[str] = None
-    dhash: Optional[str] = None
+    dhash: Optional[int] = None
 
 # === 核心逻辑工具 ===
 class Utils:
@@ -127,13 +138,22 @@ class Utils:
         except: return None
 
     @staticmethod
-    def calculate_dhash(image_path: str) -> Optional[str]:
+    def calculate_partial_hash(filepath: str, size: int, block: int = PARTIAL_HASH_BLOCK) -> Optional[str]:
+        """只读取首尾各 block 字节计算哈希，用于在完整哈希之前快速排除不同文件。"""
+        hasher = hashlib.sha256()
         try:
-            from PIL import Image
-            img = Image.open(image_path).convert('L').resize((9, 8), Image.Resampling.LANCZOS)
-            return "".join(['1' if img.getpixel((c, r)) > img.getpixel((c + 1, r)) else '0' for r in range(8) for c in range(8)])
-        except ImportError: return None
-        except: return None
+            with open(filepath, 'rb') as f:
+                hasher.update(f.read(block))
+                if size > block:
+                    f.seek(max(block, size - block))
+                    hasher.update(f.read(block))
+            return hasher.hexdigest()
+        except OSError: return None
+
+    @staticmethod
+    def calculate_dhash(image_path: str) -> Optional[int]:
+        res = image_hash.compute_hashes([image_path])[0]
+        return res.get('dhash') if res else None
 
     @staticmethod
     def set_clipboard(text: str):
@@ -142,6 +162,107 @@ class Utils:
             p.communicate(text)
         except: print("  (提示: 未安装 Termux:API，无法自动复制到剪贴板)")
 
+# === BK 树 (近似查重) ===
+class BKTree:
+    """以汉明距离为度量的 BK 树，用于找出 dHash 相近的图片。
+
+    半径查询只剪掉距离差超过阈值的子树：阈值远小于 64 位时通常只访问一小部分节点，
+    阈值越大剪枝越少，最坏情况退化为逐对比较 (整体 O(n²))。"""
+    def __init__(self):
+        self.root: Optional[list] = None # 节点: [哈希值, [条目...], {距离: 子节点}]
+        self.size = 0
+
+    @staticmethod
+    def distance(a: int, b: int) -> int:
+        return image_hash.hamming(a, b)
+
+    def add(self, value: int, item: Any):
+        self.size += 1
+        if self.root is None:
+            self.root = [value, [item], {}]; return
+        node = self.root
+        while True:
+            d = self.distance(value, node[0])
+            if d == 0:
+                node[1].append(item); return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [value, [item], {}]; return
+            node = child
+
+    def query(self, value: int, max_distance: int) -> List[Tuple[Any, int]]:
+        """返回所有与 value 汉明距离 <= max_distance 的 (条目, 距离)。"""
+        if self.root is None: return []
+        found, stack = [], [self.root]
+        while stack:
+            node = stack.pop()
+            d = self.distance(value, node[0])
+            if d <= max_distance: found.extend((item, d) for item in node[1])
+            # 三角不等式剪枝: 只有距离落在 [d-k, d+k] 内的子树才可能命中
+            for child_d, child in node[2].items():
+                if d - max_distance <= child_d <= d + max_distance: stack.append(child)
+        return found
+
+# === 扫描索引 (SQLite) ===
+class ScanIndex:
+    """按 路径 + (大小, mtime, inode) 缓存分析结果与哈希，文件未变化时跳过重新解析。"""
+    SCHEMA = """CREATE TABLE IF NOT EXISTS files (
+        path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, inode INTEGER,
+        file_type TEXT, name TEXT, text_bytes INTEGER, sha256 TEXT, dhash TEXT)"""
+
+    def __init__(self, db_path: str):
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute(self.SCHEMA)
+
+    def _get(self, path: str, st: os.stat_result) -> Optional[tuple]:
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, inode, file_type, name, text_bytes, sha256, dhash FROM files WHERE path = ?", (path,)).fetchone()
+        if not row or (row[0], row[1], row[2]) != (st.st_size, st.st_mtime_ns, st.st_ino): return None
+        return row[3:]
+
+    def lookup(self, path: str, st: os.stat_result) -> Optional[ClassificationResult]:
+        row = self._get(path, st)
+        if not row or not row[0]: return None
+        try: return ClassificationResult(FileType[row[0]], row[1], row[2])
+        except KeyError: return None
+
+    def lookup_hashes(self, path: str, st: os.stat_result) -> Tuple[Optional[str], Optional[int]]:
+        row = self._get(path, st)
+        if not row: return None, None
+        # dHash 以 16 位十六进制保存 (SQLite INTEGER 无法容纳无符号 64 位)
+        dhash = int(row[4], 16) if row[4] and len(row[4]) == 16 else None
+        return row[3], dhash
+
+    def put(self, path: str, st: os.stat_result, res: ClassificationResult):
+        self.conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, NULL, NULL)",
+                          (path, st.st_size, st.st_mtime_ns, st.st_ino, res.file_type.name, res.name_or_prefix, res.text_size_bytes))
+
+    def set_hashes(self, path: str, st: os.stat_result, sha256: Optional[str], dhash: Optional[int]):
+        dhash = format(dhash, '016x') if dhash is not None else None
+        if self._get(path, st) is not None:
+            self.conn.execute("UPDATE files SET sha256 = COALESCE(?, sha256), dhash = COALESCE(?, dhash) WHERE path = ?", (sha256, dhash, path))
+        else:
+            self.conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, NULL, NULL, NULL, ?, ?)",
+                              (path, st.st_size, st.st_mtime_ns, st.st_ino, sha256, dhash))
+
+    def move(self, old_path: str, new_path: str):
+        # 重命名不改变 大小/mtime/inode，只需更新路径
+        self.conn.execute("DELETE FROM files WHERE path = ?", (new_path,))
+        self.conn.execute("UPDATE files SET path = ? WHERE path = ?", (new_path, old_path))
+
+    def prune(self, root_dir: str, seen: Set[str]):
+        """删除 root_dir 下本次扫描未见到的记录 (文件已被删除或移走)。"""
+        prefix = os.path.join(root_dir, "")
+        stale = [(p,) for (p,) in self.conn.execute("SELECT path FROM files WHERE substr(path, 1, ?) = ?", (len(prefix), prefix))
+                 if p not in seen]
+        self.conn.executemany("DELETE FROM files WHERE path = ?", stale)
+
+    def close(self):
+        try:
+            self.conn.commit()
+            self.conn.close()
+        except sqlite3.Error: pass
+
 # === PNG 分析器 (引擎) - 核心修正部分 ===
 class PNGMetadataAnalyzer:
     @staticmethod
@@ -152,39 +273,23 @@ class PNGMetadataAnalyzer:
         has_text = False
 
         try:
-            with open(filepath, 'rb') as f:
-                reader = png.Reader(file=f)
-                chunks = list(reader.chunks())
-                if not chunks or chunks[0][0] != b'IHDR': raise png.FormatError
-                
-                for k_bytes, v_bytes in chunks:
-                    if k_bytes == b'tEXt' or k_bytes == b'iTXt': # 增加 iTXt 支持 (ComfyUI常用)
-                        has_text = True
-                        # iTXt 结构更复杂，这里简化处理，只看 tEXt 或尝试简单解码
-                        # 多数 ComfyUI 也用 tEXt 存 prompt
-                        length = len(v_bytes)
-                        total_text_bytes += length
-                        try:
-                            # 简化解析：尝试分割 keyword
-                            # tEXt: Keyword\0Text
-                            if k_bytes == b'tEXt':
-                                split = v_bytes.split(b'\x00', 1)
-                                if len(split) == 2:
-                                    k_str = split[0].decode('utf-8', 'ignore').lower()
-                                    if k_str in chunks_data: chunks_data[k_str] = split[1]
-                            # 粗暴检查内容：如果chunks_data没命中，但内容里有 Comfy 标记
-                            # (此处为了性能暂不深度解析 iTXt，通常 tEXt 足够覆盖)
-                        except: pass
+            # 只读取块头，遇到 IDAT 即停止；IDAT 之后的文本块通过尾部扫描定位
+            for k_bytes, v_bytes in read_chunks(filepath):
+                has_text = True
+                # iTXt 只计入文本大小，关键词匹配仍以 tEXt 为准 (多数 ComfyUI 也用 tEXt 存 prompt)
+                total_text_bytes += len(v_bytes)
+                if k_bytes == b'tEXt':
+                    # tEXt: Keyword\0Text
+                    split = v_bytes.split(b'\x00', 1)
+                    if len(split) == 2:
+                        k_str = split[0].decode('utf-8', 'ignore').lower()
+                        if k_str in chunks_data: chunks_data[k_str] = split[1]
         except: return ClassificationResult(FileType.ERROR, "文件损坏", 0)
 
         # 1. 角色卡识别 (最高优先级)
         if chunks_data['chara']:
             try:
-                raw = chunks_data['chara']
-                try: 
-                    if raw.startswith(b'x\x9c') or raw.startswith(b'x\xda'): raw = zlib.decompress(raw)
-                except: pass
-                payload = base64.b64decode(raw).decode('utf-8')
+                payload = decode_chara_payload(chunks_data['chara'])
                 data = json.loads(payload)
                 name = (data.get("data", {}).get("name") if isinstance(data.get("data"), dict) else data.get("name")) or "角色名未知"
                 return ClassificationResult(FileType.CHARACTER_CARD, Utils.sanitize_filename(name), total_text_bytes, payload)
@@ -225,9 +330,12 @@ class PNGProcessor:
         self.nai_dir = os.path.join(self.root_dir, "NAI")
         self.comfy_dir = os.path.join(self.root_dir, "ComfyUI") # 新增目录
         self.logs_dir = os.path.join(os.path.dirname(__file__), LOGS_DIR_NAME)
+        self.index = ScanIndex(os.path.join(os.path.dirname(__file__), SCAN_INDEX_NAME))
+        self.name_cache = DirNameCache() # 目标目录文件名集合，避免逐个 os.path.exists
         
         self.global_counter = 0
         self.processed_list: List[ProcessedFileInfo] = []
+        self.track_cards = True # 监视模式不做查重，关闭后不再累积 processed_list
         self.op_log: List[Dict] = []
         self.stats = collections.defaultdict(int)
         
@@ -245,99 +353,154 @@ class PNGProcessor:
         while True:
             suffix = f"_{idx}" if idx > 0 else ""
             candidate = os.path.join(dir_path, f"{base}{suffix}.png")
-            if not os.path.exists(candidate): return candidate
+            if not self.name_cache.exists(candidate): return candidate
             idx += 1
 
-    def phase1_scan_and_organize(self):
+    @staticmethod
+    def _iter_png_dirs(top: str):
+        """与 os.walk 相同的自顶向下遍历，但直接产出 PNG 的 DirEntry，复用 scandir 的结果。"""
+        try:
+            with os.scandir(top) as it: entries = list(it)
+        except OSError: return
+        yield top, [e for e in entries if e.name.lower().endswith(".png") and e.is_file()]
+        for e in entries:
+            if e.is_dir(follow_symlinks=False): yield from PNGProcessor._iter_png_dirs(e.path)
+
+    def _collect_scan_items(self, pool: ThreadPoolExecutor) -> List[tuple]:
+        """按遍历顺序返回 (root, entry, 正则匹配, stat, 结果或 Future)。
+        已规范命名的文件不解析；索引命中直接给出结果；其余提交到线程池。"""
+        items = []
+        for root, entries in self._iter_png_dirs(self.root_dir):
+            if LOGS_DIR_NAME in root: continue
+            for entry in entries:
+                match = PROCESSED_FILENAME_PATTERN.match(entry.name)
+                if match:
+                    items.append((root, entry, match, None, None)); continue
+                try: st = entry.stat()
+                except OSError:
+                    items.append((root, entry, None, None, None)); continue
+                res = self.index.lookup(entry.path, st)
+                items.append((root, entry, None, st, res or pool.submit(PNGMetadataAnalyzer.analyze, entry.path)))
+        return items
+
+    def _note_processed_name(self, f_path: str, match: re.Match):
+        """已规范命名的文件：只推进编号并登记角色卡，不解析。"""
+        try:
+            self.global_counter = max(self.global_counter, int(match.group(3)))
+            prefix = match.group(1)
+            # 将 Comfy 也加入白名单
+            if prefix not in ["Pic-SD", "Pic-NAI", "Pic-Comfy", "Pic-Mixed", "Pic-纯图片", "未命名", "未知类型"]:
+                if self.track_cards: self.processed_list.append(ProcessedFileInfo(f_path, f_path, FileType.CHARACTER_CARD, 0))
+                self.stats['角色卡'] += 1
+            self.stats['跳过(已整理)'] += 1
+        except: pass
+
+    def _commit_file(self, root: str, f_path: str, st: os.stat_result, res: ClassificationResult,
+                     cjk_pending: Optional[list]) -> Optional[str]:
+        """分配编号、分流目录、重命名并写入 op_log；返回新路径 (未改名时返回 None)。
+        cjk_pending 为 None 时 (监视模式) 中文名纯图片直接保留原名。"""
+        f = os.path.basename(f_path)
+        f_size_kb = math.ceil(st.st_size / 1024)
+        if res.file_type == FileType.ERROR:
+            self.stats['错误文件'] += 1; return None
+
+        self.global_counter += 1
+        text_kb = math.ceil(res.text_size_bytes / 1024)
+        
+        # 目录分流
+        target_root = root
+        if res.file_type == FileType.SD_PARAM: target_root = self.sd_dir
+        elif res.file_type == FileType.NAI_PARAM: target_root = self.nai_dir
+        elif res.file_type == FileType.COMFY_PARAM: target_root = self.comfy_dir # Comfy 分流
+        
+        # 中文纯图拦截
+        if res.file_type == FileType.PURE_IMAGE and Utils.contains_chinese(f):
+            if cjk_pending is not None: cjk_pending.append((f_path, target_root, f_size_kb))
+            self.global_counter -= 1
+            self.stats['待确认中文图'] += 1
+            return None
+
+        new_path = self._get_new_path(target_root, res.name_or_prefix, f_size_kb, text_kb)
+        renamed = None
+        
+        if os.path.abspath(f_path) != os.path.abspath(new_path):
+            try:
+                os.rename(f_path, new_path)
+                self.name_cache.move(f_path, new_path)
+                self.index.move(f_path, new_path)
+                renamed = new_path
+                op_type = "move" if os.path.dirname(f_path) != os.path.dirname(new_path) else "rename"
+                self.op_log.append({"type": op_type, "original_path": f_path, "new_path": new_path})
+                print(f"  [{res.file_type.name}] {f} -> {os.path.basename(new_path)}")
+            except Exception as e:
+                print(f"  ! 错误: {e}")
+                self.global_counter -= 1; self.stats['操作失败'] += 1
+                return None
+        else: new_path = f_path
+
+        if res.file_type == FileType.CHARACTER_CARD and self.track_cards:
+            self.processed_list.append(ProcessedFileInfo(f_path, new_path, FileType.CHARACTER_CARD, f_size_kb, chara_json_str=res.chara_json_str))
+        
+        self.stats[res.file_type.name] += 1
+        return renamed
+
+    def phase1_scan_and_organize(self, interactive: bool = True):
         ConsoleUI.header("阶段 1: 扫描与智能整理")
         print(f"  正在扫描目录: {self.root_dir}")
         print("  (已规范命名的文件将自动跳过解析，仅更新索引)\n")
         
         cjk_pending = []
+        seen: Set[str] = set()
         start_time = time.time()
         
-        for root, _, files in os.walk(self.root_dir):
-            if LOGS_DIR_NAME in root: continue
-            
-            for f in files:
-                if not f.lower().endswith(".png"): continue
-                f_path = os.path.join(root, f)
+        # 阶段 1a: 遍历 + 正则/索引预检，需要解析的文件交给线程池并行分析
+        # 阶段 1b: 主线程严格按遍历顺序分配编号、重命名、写日志，命名结果与逐个处理完全一致
+        pool = ThreadPoolExecutor(max_workers=ANALYZE_WORKERS)
+        try:
+            for root, entry, match, st, pending in self._collect_scan_items(pool):
+                f_path = entry.path
+                seen.add(f_path)
                 self.stats['total_scanned'] += 1
                 
                 # 正则预检
-                match = PROCESSED_FILENAME_PATTERN.match(f)
                 if match:
-                    try:
-                        self.global_counter = max(self.global_counter, int(match.group(3)))
-                        prefix = match.group(1)
-                        # 将 Comfy 也加入白名单
-                        if prefix not in ["Pic-SD", "Pic-NAI", "Pic-Comfy", "Pic-Mixed", "Pic-纯图片", "未命名", "未知类型"]:
-                            self.processed_list.append(ProcessedFileInfo(f_path, f_path, FileType.CHARACTER_CARD, 0))
-                            self.stats['角色卡'] += 1
-                        self.stats['跳过(已整理)'] += 1
-                    except: pass
-                    continue
+                    self._note_processed_name(f_path, match); continue
                 
-                # 全量解析
-                try: f_size_kb = math.ceil(os.path.getsize(f_path) / 1024)
-                except: continue
-
-                res = PNGMetadataAnalyzer.analyze(f_path)
-                
-                if res.file_type == FileType.ERROR:
-                    self.stats['错误文件'] += 1; continue
-
-                self.global_counter += 1
-                text_kb = math.ceil(res.text_size_bytes / 1024)
-                
-                # 目录分流
-                target_root = root
-                if res.file_type == FileType.SD_PARAM: target_root = self.sd_dir
-                elif res.file_type == FileType.NAI_PARAM: target_root = self.nai_dir
-                elif res.file_type == FileType.COMFY_PARAM: target_root = self.comfy_dir # Comfy 分流
-                
-                # 中文纯图拦截
-                if res.file_type == FileType.PURE_IMAGE and Utils.contains_chinese(f):
-                    cjk_pending.append((f_path, target_root, f_size_kb))
-                    self.global_counter -= 1
-                    self.stats['待确认中文图'] += 1
-                    continue
-
-                new_path = self._get_new_path(target_root, res.name_or_prefix, f_size_kb, text_kb)
-                
-                if os.path.abspath(f_path) != os.path.abspath(new_path):
-                    try:
-                        os.rename(f_path, new_path)
-                        op_type = "move" if os.path.dirname(f_path) != os.path.dirname(new_path) else "rename"
-                        self.op_log.append({"type": op_type, "original_path": f_path, "new_path": new_path})
-                        print(f"  [{res.file_type.name}] {f} -> {os.path.basename(new_path)}")
-                    except Exception as e:
-                        print(f"  ! 错误: {e}")
-                        self.global_counter -= 1; self.stats['操作失败'] += 1
-                        continue
-                else: new_path = f_path
-
-                if res.file_type == FileType.CHARACTER_CARD:
-                    self.processed_list.append(ProcessedFileInfo(f_path, new_path, FileType.CHARACTER_CARD, f_size_kb, chara_json_str=res.chara_json_str))
+                if st is None: continue
+
+                if isinstance(pending, Future):
+                    res = pending.result()
+                    self.index.put(f_path, st, res)
+                else:
+                    res = pending
+                    self.stats['索引命中'] += 1
                 
-                self.stats[res.file_type.name] += 1
+                new_path = self._commit_file(root, f_path, st, res, cjk_pending)
+                if new_path: seen.add(new_path)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
 
         # 中文纯图处理
         if cjk_pending:
             ConsoleUI.warn(f"发现 {len(cjk_pending)} 张纯图片的文件名包含中文。")
-            if ConsoleUI.ask_yes_no("  是否将它们统一重命名为 'Pic-纯图片-xxx.png'?", 'n'):
+            if interactive and ConsoleUI.ask_yes_no("  是否将它们统一重命名为 'Pic-纯图片-xxx.png'?", 'n'):
                 print("  正在重命名...")
                 for old_path, t_root, size in cjk_pending:
                     self.global_counter += 1
                     new_path = self._get_new_path(t_root, "Pic-纯图片", size, 0)
                     try:
                         os.rename(old_path, new_path)
+                        self.name_cache.move(old_path, new_path)
+                        self.index.move(old_path, new_path)
+                        seen.add(new_path)
                         self.op_log.append({"type": "rename", "original_path": old_path, "new_path": new_path})
                         self.stats['PURE_IMAGE'] += 1
                     except: pass
             else:
                 print("  已保留原文件名。")
 
+        self.index.prune(self.root_dir, seen)
+        self.index.conn.commit()
         duration = time.time() - start_time
         ConsoleUI.sub_header(f"阶段 1 完成 (耗时 {duration:.2f}s)")
         print(f"  扫描总数: {self.stats['total_scanned']}")
@@ -346,6 +509,31 @@ class PNGProcessor:
         print(f"  ComfyUI:  {self.stats['COMFY_PARAM']}")
         print(f"  纯图片:   {self.stats['PURE_IMAGE']}")
         print(f"  跳过:     {self.stats['跳过(已整理)']}")
+        print(f"  索引命中: {self.stats['索引命中']}")
+
+    def _load_card_details(self, p: ProcessedFileInfo, st: os.stat_result, need_sha: bool = True):
+        """按需补齐 SHA-256 / dHash / 角色名与开场白，优先使用扫描索引中的缓存。"""
+        if not p.file_hash or p.dhash is None:
+            cached_sha, cached_dhash = self.index.lookup_hashes(p.new_filepath, st)
+            p.file_hash = p.file_hash or cached_sha
+            if p.dhash is None: p.dhash = cached_dhash
+        new_sha = new_dhash = None
+        if need_sha and not p.file_hash: p.file_hash = new_sha = Utils.calculate_file_hash(p.new_filepath)
+        if p.dhash is None: p.dhash = new_dhash = Utils.calculate_dhash(p.new_filepath)
+        if new_sha or new_dhash is not None: self.index.set_hashes(p.new_filepath, st, new_sha, new_dhash)
+        if not p.detailed_data:
+            json_str = p.chara_json_str
+            if not json_str: 
+                 tmp = PNGMetadataAnalyzer.analyze(p.new_filepath)
+                 json_str = tmp.chara_json_str
+            if json_str:
+                try:
+                    d = json.loads(json_str)
+                    src = d.get("data", d)
+                    name = src.get("name") or src.get("displayName") or ""
+                    fm = src.get("first_mes") or src.get("description") or ""
+                    p.detailed_data = DetailedCharaData(name.strip(), fm.strip())
+                except: pass
 
     def phase2_deduplication(self):
         cards = [c for c in self.processed_list if c.file_type == FileType.CHARACTER_CARD]
@@ -355,31 +543,37 @@ class PNGProcessor:
         print(f"  现有 {len(cards)} 张角色卡。")
         if not ConsoleUI.ask_yes_no("  开始查重吗？", 'n'): return
 
-        print("\n  正在分析数据 (Lazy Load)...")
-        for i, p in enumerate(cards):
-            print(f"\r  进度: {int((i+1)/len(cards)*100)}%", end="")
-            if not p.file_hash and os.path.exists(p.new_filepath):
-                p.file_hash = Utils.calculate_file_hash(p.new_filepath)
-                p.dhash = Utils.calculate_dhash(p.new_filepath)
-                if not p.detailed_data:
-                    json_str = p.chara_json_str
-                    if not json_str: 
-                         tmp = PNGMetadataAnalyzer.analyze(p.new_filepath)
-                         json_str = tmp.chara_json_str
-                    if json_str:
-                        try:
-                            d = json.loads(json_str)
-                            src = d.get("data", d)
-                            name = src.get("name") or src.get("displayName") or ""
-                            fm = src.get("first_mes") or src.get("description") or ""
-                            p.detailed_data = DetailedCharaData(name.strip(), fm.strip())
-                        except: pass
+        # 分级筛选: 字节大小 -> 首尾 64KB 哈希 -> 完整 SHA-256 + dHash
+        # 大小或首尾内容不同的卡片不可能完全重复，无需整文件读取与图像解码
+        print("\n  正在筛选候选 (大小 -> 首尾 64KB)...")
+        file_stats: Dict[str, os.stat_result] = {}
+        by_size = collections.defaultdict(list)
+        for p in cards:
+            try: file_stats[p.new_filepath] = st = os.stat(p.new_filepath)
+            except OSError: continue
+            by_size[st.st_size].append(p)
+
+        by_partial = collections.defaultdict(list)
+        for size, group in by_size.items():
+            if len(group) < 2: continue
+            for p in group:
+                partial = Utils.calculate_partial_hash(p.new_filepath, size)
+                if partial: by_partial[(size, partial)].append(p)
+        candidate_paths = {p.new_filepath for group in by_partial.values() if len(group) > 1 for p in group}
+        candidates = [p for p in cards if p.new_filepath in candidate_paths]
+        print(f"  候选: {len(candidates)} / {len(cards)}")
+
+        if candidates: print("\n  正在分析候选数据 (Lazy Load)...")
+        for i, p in enumerate(candidates):
+            print(f"\r  进度: {int((i+1)/len(candidates)*100)}%", end="")
+            if not p.file_hash: self._load_card_details(p, file_stats[p.new_filepath])
         print("\n")
+        self.index.conn.commit()
 
         duplicates_map = collections.defaultdict(list)
         seen = {}
 
-        for p in cards:
+        for p in candidates:
             if not p.file_hash or not p.detailed_data: continue
             key = (p.file_hash, p.dhash, p.detailed_data.norm_name, p.detailed_data.norm_first_mes)
             if key in seen: duplicates_map[p.detailed_data.norm_name].append((seen[key], p.new_filepath))
@@ -400,6 +594,76 @@ class PNGProcessor:
             print(report_text)
             Utils.set_clipboard(report_text)
 
+    def phase3_near_duplicates(self):
+        cards = [c for c in self.processed_list if c.file_type == FileType.CHARACTER_CARD]
+        if len(cards) < 2: return
+
+        ConsoleUI.header("阶段 3: 近似重复检测 (可选)")
+        print("  通过 dHash 汉明距离查找重新编码/压缩过的同一张卡 (需读取全部卡片图像)。")
+        if not ConsoleUI.ask_yes_no("  开始近似查重吗？", 'n'): return
+        try: max_distance = int(input(f"  汉明距离阈值 (0-64) [{NEAR_DUP_MAX_DISTANCE}]: ").strip() or NEAR_DUP_MAX_DISTANCE)
+        except ValueError: max_distance = NEAR_DUP_MAX_DISTANCE
+
+        print("\n  正在计算 dHash (批量)...")
+        file_stats: Dict[str, os.stat_result] = {}
+        for p in cards:
+            try: file_stats[p.new_filepath] = st = os.stat(p.new_filepath)
+            except OSError: continue
+            if p.dhash is None: p.dhash = self.index.lookup_hashes(p.new_filepath, st)[1]
+        missing = [p for p in cards if p.new_filepath in file_stats and p.dhash is None]
+        for p, res in zip(missing, image_hash.compute_hashes([p.new_filepath for p in missing])):
+            if res and 'dhash' in res:
+                p.dhash = res['dhash']
+                self.index.set_hashes(p.new_filepath, file_stats[p.new_filepath], None, p.dhash)
+
+        valid: List[ProcessedFileInfo] = []
+        for p in cards:
+            if p.new_filepath not in file_stats or p.dhash is None: continue
+            self._load_card_details(p, file_stats[p.new_filepath], need_sha=False)
+            if p.detailed_data: valid.append(p)
+        print(f"  有效卡片: {len(valid)} / {len(cards)}\n")
+        self.index.conn.commit()
+
+        # 逐个查询后插入：每对相近卡片只会被发现一次，无需 O(n²) 两两比较
+        tree = BKTree()
+        parent = list(range(len(valid)))
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]; x = parent[x]
+            return x
+
+        image_only = 0
+        for i, p in enumerate(valid):
+            for j, _ in tree.query(p.dhash, max_distance):
+                q = valid[j]
+                if p.file_hash and p.file_hash == q.file_hash: continue # 完全重复已在阶段 2 报告
+                if p.detailed_data.norm_name.casefold() != q.detailed_data.norm_name.casefold():
+                    image_only += 1; continue
+                parent[find(i)] = find(j)
+            tree.add(p.dhash, i)
+
+        groups = collections.defaultdict(list)
+        for i in range(len(valid)): groups[find(i)].append(valid[i])
+        groups = [g for g in groups.values() if len(g) > 1]
+
+        if not groups:
+            print(f"  ✅ 未发现近似重复的角色卡 (阈值 {max_distance})。")
+        else:
+            ConsoleUI.warn(f"发现 {len(groups)} 组近似重复卡片！")
+            report_lines = [f"=== 近似重复报告 (dHash 距离 <= {max_distance}) ==="]
+            for group in groups:
+                keep = max(group, key=lambda c: os.path.getsize(c.new_filepath) if os.path.exists(c.new_filepath) else 0)
+                report_lines.append(f"\n角色: {keep.detailed_data.norm_name}")
+                report_lines.append(f"  建议保留: {os.path.basename(keep.new_filepath)} (最大文件)")
+                for c in group:
+                    if c is keep: continue
+                    report_lines.append(f"  相似文件: {os.path.basename(c.new_filepath)} (距离 {BKTree.distance(keep.dhash, c.dhash)})")
+
+            report_text = "\n".join(report_lines)
+            print(report_text)
+            Utils.set_clipboard(report_text)
+        if image_only: print(f"\n  另有 {image_only} 对图像相近但角色名不同，未列入报告。")
+
     def save_logs(self):
         if not self.op_log: return
         log_file = os.path.join(self.logs_dir, f"log_{time.strftime('%Y%m%d_%H%M%S')}.json")
@@ -408,6 +672,118 @@ class PNGProcessor:
             print(f"\n  [日志] 已保存至: {LOGS_DIR_NAME}/{os.path.basename(log_file)}")
         except: pass
 
+# === 监视模式 ===
+class DownloadWatcher:
+    """持续监视目录，只整理新出现且已经写完的 PNG。
+
+    优先使用 watchfiles (inotify)，不可用时退化为基于 scandir 快照的轮询。
+    每次改名都立即追加到滚动日志，run_undo 可以照常撤销。"""
+    def __init__(self, processor: PNGProcessor):
+        self.p = processor
+        self.pending: Dict[str, Optional[Tuple[int, int, float]]] = {} # 路径 -> (大小, mtime_ns, 稳定起始时间)
+        self.snapshot: Dict[str, Tuple[int, int]] = {}
+        self.log_file: Optional[str] = None
+        self.log_ops: List[Dict] = []
+
+    def _take_snapshot(self) -> Dict[str, Tuple[int, int]]:
+        snap = {}
+        for root, entries in self.p._iter_png_dirs(self.p.root_dir):
+            if LOGS_DIR_NAME in root: continue
+            for e in entries:
+                try: st = e.stat()
+                except OSError: continue
+                snap[e.path] = (st.st_size, st.st_mtime_ns)
+        return snap
+
+    def _mark(self, path: str):
+        # 跳过 Android 下载中的临时文件 (.pending-xxx / .trashed-xxx)
+        if os.path.basename(path).startswith("."): return
+        if path.lower().endswith(".png") and LOGS_DIR_NAME not in os.path.dirname(path):
+            self.pending.setdefault(path, None)
+
+    def _flush_settled(self):
+        """处理大小与修改时间已稳定 WATCH_SETTLE_SECONDS 秒的待处理文件。"""
+        now = time.time()
+        for path, seen in list(self.pending.items()):
+            try: st = os.stat(path)
+            except OSError:
+                del self.pending[path]; continue
+            sig = (st.st_size, st.st_mtime_ns)
+            if seen is None or seen[:2] != sig:
+                self.pending[path] = (*sig, now); continue
+            if now - seen[2] < WATCH_SETTLE_SECONDS: continue
+            del self.pending[path]
+            self._process(path, st)
+
+    def _process(self, path: str, st: os.stat_result):
+        f = os.path.basename(path)
+        self.p.name_cache.add(path)
+        match = PROCESSED_FILENAME_PATTERN.match(f)
+        if match:
+            self.p._note_processed_name(path, match); return
+        res = self.p.index.lookup(path, st)
+        if not res:
+            res = PNGMetadataAnalyzer.analyze(path)
+            self.p.index.put(path, st, res)
+        before = len(self.p.op_log)
+        self.p._commit_file(os.path.dirname(path), path, st, res, None)
+        self.p.index.conn.commit()
+        if len(self.p.op_log) > before: self._append_log(self.p.op_log[before:])
+
+    def _append_log(self, ops: List[Dict]):
+        if self.log_file is None or len(self.log_ops) >= WATCH_LOG_MAX_OPS:
+            self.log_file = os.path.join(self.p.logs_dir, f"log_{time.strftime('%Y%m%d_%H%M%S')}_watch.json")
+            self.log_ops = []
+        self.log_ops.extend(ops)
+        tmp = self.log_file + ".tmp"
+        try:
+            with open(tmp, 'w') as f: json.dump(self.log_ops, f, indent=2)
+            os.replace(tmp, self.log_file)
+        except OSError as e: print(f"  ! 日志写入失败: {e}")
+
+    def run(self):
+        ConsoleUI.header("监视模式 (Ctrl+C 退出)")
+        print(f"  目录: {self.p.root_dir}")
+        try:
+            from watchfiles import watch, Change
+        except ImportError:
+            watch = None
+        if watch:
+            print("  事件来源: watchfiles (inotify)")
+            for changes in watch(self.p.root_dir, step=200, rust_timeout=int(WATCH_POLL_INTERVAL * 1000), yield_on_timeout=True):
+                for change, path in changes:
+                    if change == Change.deleted:
+                        self.pending.pop(path, None); self.p.name_cache.discard(path)
+                    else: self._mark(path)
+                self._flush_settled()
+        else:
+            print(f"  事件来源: 轮询 (每 {WATCH_POLL_INTERVAL:.0f}s 比对一次目录快照；可 pip install watchfiles)")
+            self.snapshot = self._take_snapshot()
+            while True:
+                time.sleep(WATCH_POLL_INTERVAL)
+                snap = self._take_snapshot()
+                for path, sig in snap.items():
+                    if self.snapshot.get(path) != sig: self._mark(path)
+                for path in self.snapshot.keys() - snap.keys(): self.p.name_cache.discard(path)
+                self.snapshot = snap
+                self._flush_settled()
+
+def run_watch(target_dir: str):
+    ConsoleUI.check_storage_permission(target_dir)
+    ConsoleUI.safety_check_sillytavern(target_dir)
+    processor = PNGProcessor(target_dir)
+    try:
+        # 先完整整理一遍 (利用扫描索引，通常很快)，同时确定当前编号
+        processor.phase1_scan_and_organize(interactive=False)
+        processor.save_logs()
+        processor.op_log = []
+        # 长时间运行时不再登记角色卡，避免列表随事件无限增长
+        processor.processed_list = []
+        processor.track_cards = False
+        DownloadWatcher(processor).run()
+    except KeyboardInterrupt: print("\n  监视已停止。")
+    finally: processor.index.close()
+
 # === 撤销功能 ===
 def run_undo():
     log_dir = os.path.join(os.path.dirname(__file__), LOGS_DIR_NAME)
@@ -443,28 +819,31 @@ def run_undo():
     try: os.remove(target_log)
     except: pass
 
-def main():
+def main(target_dir: Optional[str] = None):
     print(f"\n{ConsoleUI.SEP_LINE}")
     print(f"  PNG 文件批量处理与分析工具 {PROGRAM_VERSION}")
     print(f"{ConsoleUI.SEP_LINE}")
 
     print("  1. 开始整理")
     print("  2. [撤销] 从日志恢复操作")
+    print("  3. 监视模式 (自动整理新下载的 PNG)")
     print("  0. 退出")
     
     choice = input("\n选项 [1]: ").strip()
-    if choice == '' or choice == '1':
+    if choice in ('', '1', '3'):
         default_path = os.path.expanduser("~/storage/shared/Download")
-        target_dir = default_path
         
-        if os.path.exists(default_path):
-             print(f"\n默认路径: {default_path}")
-             if not ConsoleUI.ask_yes_no("处理此目录?", 'y'):
+        if not target_dir: # 命令行未指定目录时再询问
+            if os.path.exists(default_path):
+                 target_dir = default_path
+                 print(f"\n默认路径: {default_path}")
+                 if not ConsoleUI.ask_yes_no("处理此目录?", 'y'):
+                     target_dir = input("输入路径: ").strip()
+            else:
                  target_dir = input("输入路径: ").strip()
-        else:
-             target_dir = input("输入路径: ").strip()
 
         if not target_dir or not os.path.exists(target_dir): return print("路径错误")
+        if choice == '3': return run_watch(target_dir)
 
         ConsoleUI.check_storage_permission(target_dir)
         ConsoleUI.safety_check_sillytavern(target_dir)
@@ -473,10 +852,19 @@ def main():
         try:
             processor.phase1_scan_and_organize()
             processor.phase2_deduplication()
+            processor.phase3_near_duplicates()
         except KeyboardInterrupt: print("\n! 中断")
-        finally: processor.save_logs()
+        finally:
+            processor.save_logs()
+            processor.index.close()
             
     elif choice == '2': run_undo()
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description=f"PNG 文件批量处理与分析工具 {PROGRAM_VERSION}")
+    parser.add_argument("--watch", action="store_true", help="监视模式: 持续整理新下载的 PNG (不进入菜单)")
+    parser.add_argument("path", nargs="?", help="目标目录 (默认 ~/storage/shared/Download；不加 --watch 时跳过菜单中的目录询问)")
+    args = parser.parse_args()
+    if args.path and not os.path.isdir(args.path): sys.exit(f"路径错误: {args.path}")
+    if args.watch: run_watch(args.path or os.path.expanduser("~/storage/shared/Download"))
+    else: main(args.path)
@@ -1,12 +1,14 @@
 import base64
 import zlib
-import png
 import json
 import os
 import sys
 import re
 from typing import Tuple, Optional, List, Dict, Any
 
+from png_chunks import read_chunks, PNGChunkError
+from card_catalog import CardCatalog
+
 BASE_DOWNLOAD_DIR = os.path.expanduser("~/storage/shared/Download")
 SD_PARAMS_DIR = os.path.join(BASE_DOWNLOAD_DIR, "SD")
 NAI_PARAMS_DIR = os.path.join(BASE_DOWNLOAD_DIR, "NAI")
@@ -54,17 +56,14 @@ def _is_potential_character_card_by_name(filename: str) -> bool:
 
 def _has_chara_metadata(filepath: str) -> bool:
     try:
-        with open(filepath, 'rb') as f:
-            reader = png.Reader(file=f)
-            for chunk_type_bytes, chunk_data_bytes in reader.chunks():
-                if chunk_type_bytes == b'tEXt':
-                    try:
-                        key_bytes, _ = chunk_data_bytes.split(b'\x00', 1)
-                        if key_bytes.decode('utf-8', errors='ignore').lower() == 'chara':
-                            return True
-                    except (ValueError, UnicodeDecodeError):
-                        continue 
-    except (FileNotFoundError, png.FormatError, png.ChunkError):
+        for _, chunk_data_bytes in read_chunks(filepath, (b'tEXt',)):
+            try:
+                key_bytes, _ = chunk_data_bytes.split(b'\x00', 1)
+                if key_bytes.decode('utf-8', errors='ignore').lower() == 'chara':
+                    return True
+            except (ValueError, UnicodeDecodeError):
+                continue 
+    except (OSError, PNGChunkError):
         return False
     return False
 
@@ -229,67 +228,62 @@ def view_png_text_chunks(filepath: str):
 
     chara_block_successfully_parsed_as_dict = False
     try:
-        with open(filepath, 'rb') as f:
-            try:
-                reader = png.Reader(file=f)
-                chunks_data = list(reader.chunks())
-            except png.ChunkError as e:
-                print(f"{SEP_LINE_WARN}\n错误: 读取PNG数据块出错。\n详情: {e}\n{SEP_LINE_WARN}")
-                return
-            except png.FormatError as e:
-                 print(f"{SEP_LINE_WARN}\n错误: 文件非PNG格式或已损坏。\n详情: {e}\n{SEP_LINE_WARN}")
-                 return
-
-            text_chunks_found = 0
-            for i, (chunk_type_bytes, chunk_data_bytes) in enumerate(chunks_data):
-                if chunk_type_bytes == b'tEXt':
-                    text_chunks_found += 1
-                    print(f"\n--- tEXt 数据块 #{text_chunks_found} ---")
-                    try:
-                        keyword_bytes, data_bytes_for_decode = chunk_data_bytes.split(b'\x00', 1)
-                        
-                        content_obj, type_desc = _decode_text_chunk_data(keyword_bytes, data_bytes_for_decode)
-                        keyword_display = keyword_bytes.decode('utf-8', errors='replace')
-                        
-                        print(f"关键词: {keyword_display}")
-                        print(f"类型/状态: {type_desc}")
-                        print("内容:")
-
-                        display_string_for_content: str
-                        if isinstance(content_obj, dict) and keyword_display.lower() == 'chara':
-                            display_string_for_content = _format_chara_dict_value_for_display(content_obj, 0)
-                            chara_block_successfully_parsed_as_dict = True
+        try:
+            chunks_data = read_chunks(filepath, (b'tEXt',))
+        except PNGChunkError as e:
+            print(f"{SEP_LINE_WARN}\n错误: 文件非PNG格式或数据块已损坏。\n详情: {e}\n{SEP_LINE_WARN}")
+            return
+
+        text_chunks_found = 0
+        for i, (chunk_type_bytes, chunk_data_bytes) in enumerate(chunks_data):
+            if chunk_type_bytes == b'tEXt':
+                text_chunks_found += 1
+                print(f"\n--- tEXt 数据块 #{text_chunks_found} ---")
+                try:
+                    keyword_bytes, data_bytes_for_decode = chunk_data_bytes.split(b'\x00', 1)
+                    
+                    content_obj, type_desc = _decode_text_chunk_data(keyword_bytes, data_bytes_for_decode)
+                    keyword_display = keyword_bytes.decode('utf-8', errors='replace')
+                    
+                    print(f"关键词: {keyword_display}")
+                    print(f"类型/状态: {type_desc}")
+                    print("内容:")
+
+                    display_string_for_content: str
+                    if isinstance(content_obj, dict) and keyword_display.lower() == 'chara':
+                        display_string_for_content = _format_chara_dict_value_for_display(content_obj, 0)
+                        chara_block_successfully_parsed_as_dict = True
+                    else:
+                        if chara_block_successfully_parsed_as_dict and \
+                           keyword_display.lower() != 'chara' and \
+                           keyword_display.lower() not in CRITICAL_CONTEXT_KEYWORDS:
+                            display_string_for_content = "  (此数据块内容未作详细显示)"
                         else:
-                            if chara_block_successfully_parsed_as_dict and \
-                               keyword_display.lower() != 'chara' and \
-                               keyword_display.lower() not in CRITICAL_CONTEXT_KEYWORDS:
-                                display_string_for_content = "  (此数据块内容未作详细显示)"
-                            else:
-                                if isinstance(content_obj, str):
-                                    lines = content_obj.splitlines()
-                                    formatted_lines = [f"  {line}" for line in lines]
-                                    
-                                    temp_display_str = "\n".join(formatted_lines)
-                                    if len(temp_display_str) > 3000 and keyword_display.lower() != 'chara':
-                                        display_string_for_content = temp_display_str[:1500] + \
-                                                                     "\n  ... (内容过长，已截断) ...\n" + \
-                                                                     temp_display_str[-1500:]
-                                    else:
-                                        display_string_for_content = temp_display_str
-                                elif isinstance(content_obj, bytes):
-                                    hex_representation = content_obj.hex()
-                                    if len(hex_representation) > 200:
-                                        display_string_for_content = f"  (原始字节数据): {hex_representation[:100]}...{hex_representation[-100:]}"
-                                    else:
-                                        display_string_for_content = f"  (原始字节数据): {hex_representation}"
-                                else: 
-                                    display_string_for_content = f"  {str(content_obj)}"
-                        print(display_string_for_content)
-                    except ValueError:
-                        print(f"{SEP_LINE_WARN}\n错误: tEXt块格式无效。\n原始数据: {chunk_data_bytes[:64]}\n{SEP_LINE_WARN}")
-            
-            if text_chunks_found == 0:
-                print("未在此文件中找到 tEXt 数据块。")
+                            if isinstance(content_obj, str):
+                                lines = content_obj.splitlines()
+                                formatted_lines = [f"  {line}" for line in lines]
+                                
+                                temp_display_str = "\n".join(formatted_lines)
+                                if len(temp_display_str) > 3000 and keyword_display.lower() != 'chara':
+                                    display_string_for_content = temp_display_str[:1500] + \
+                                                                 "\n  ... (内容过长，已截断) ...\n" + \
+                                                                 temp_display_str[-1500:]
+                                else:
+                                    display_string_for_content = temp_display_str
+                            elif isinstance(content_obj, bytes):
+                                hex_representation = content_obj.hex()
+                                if len(hex_representation) > 200:
+                                    display_string_for_content = f"  (原始字节数据): {hex_representation[:100]}...{hex_representation[-100:]}"
+                                else:
+                                    display_string_for_content = f"  (原始字节数据): {hex_representation}"
+                            else: 
+                                display_string_for_content = f"  {str(content_obj)}"
+                    print(display_string_for_content)
+                except ValueError:
+                    print(f"{SEP_LINE_WARN}\n错误: tEXt块格式无效。\n原始数据: {chunk_data_bytes[:64]}\n{SEP_LINE_WARN}")
+        
+        if text_chunks_found == 0:
+            print("未在此文件中找到 tEXt 数据块。")
     except FileNotFoundError:
         print(f"{SEP_LINE_WARN}\n错误: 文件 '{os.path.basename(filepath)}' 未找到。\n{SEP_LINE_WARN}")
     except Exception as e:
@@ -379,6 +373,29 @@ def _select_file_from_dir(directory: str, file_type_name: str, recursive: bool =
                 if choice_num in current_page_options: return current_page_options[choice_num]
             except ValueError: pass
 
+def _search_card_catalog() -> Optional[str]:
+    """增量更新角色卡目录后按 关键词 / 标签 搜索，返回选中的文件路径。"""
+    catalog = CardCatalog()
+    try:
+        print(f"\n正在更新角色卡目录: {BASE_DOWNLOAD_DIR}")
+        c = catalog.update(BASE_DOWNLOAD_DIR)
+        print(f"扫描 {c['scanned']} 个 PNG，更新 {c['updated']} 个，移除 {c['removed']} 个。")
+        while True:
+            print(SEP_LINE_MINOR)
+            text = input("关键词 (留空不限): ").strip()
+            tags = [t for t in re.split(r"[,，]", input("标签 (逗号分隔，留空不限): ")) if t.strip()]
+            rows = catalog.query(text, tags, limit=FILES_PER_PAGE)
+            if not rows:
+                print("无匹配结果。")
+            for i, (_, name, creator, tag_str) in enumerate(rows):
+                print(f"  {i + 1:>2}. {name or '(未命名)'}  [{creator or '-'}]  {tag_str}")
+            choice = input("输入序号查看, 回车重新搜索, 0 返回: ").strip()
+            if choice == '0': return None
+            if choice.isdigit() and 1 <= int(choice) <= len(rows): return rows[int(choice) - 1][0]
+    finally:
+        catalog.close()
+
+
 def main_viewer():
     _ensure_dir_exists(SD_PARAMS_DIR, create_if_missing=True)
     _ensure_dir_exists(NAI_PARAMS_DIR, create_if_missing=True)
@@ -393,9 +410,10 @@ def main_viewer():
         print(f"  2. 查看SD参数图 (来自 Download/{sd_rel_path} 目录)")
         print(f"  3. 查看NAI参数图 (来自 Download/{nai_rel_path} 目录)")
         print("  4. 手动输入PNG文件路径")
+        print(f"  5. 搜索{FILE_TYPE_NAME_CHARA}目录 (关键词 / 标签)")
         print("  0. 退出")
         print(SEP_LINE_DOT)
-        choice = input("请输入选项 (0-4): ").strip()
+        choice = input("请输入选项 (0-5): ").strip()
         selected_filepath: Optional[str] = None
 
         if choice == '1':
@@ -409,6 +427,8 @@ def main_viewer():
             expanded_path = os.path.expanduser(manual_path_input)
             if os.path.isfile(expanded_path) and expanded_path.lower().endswith(".png"):
                 selected_filepath = expanded_path
+        elif choice == '5':
+            selected_filepath = _search_card_catalog()
         elif choice == '0': break
         
         if selected_filepath:
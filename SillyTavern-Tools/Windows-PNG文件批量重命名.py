@@ -1,6 +1,3 @@
-import base64
-import zlib
-import png
 import sys
 import json
 import os
@@ -16,6 +13,8 @@ from dataclasses import dataclass, field
 from enum import Enum, auto
 import math
 
+from png_chunks import read_chunks, decode_chara_payload
+
 # === 常量与正则 ===
 PROGRAM_VERSION = "Windows-Pro-v5.6"
 DHASH_SIZE = 8
@@ -59,26 +58,20 @@ class PNGAnalyzer:
         chunks = {}
         total_text_bytes = 0
         try:
-            with open(filepath, 'rb') as f:
-                reader = png.Reader(file=f)
-                for k, v in reader.chunks():
-                    if k in [b'tEXt', b'iTXt']:
-                        total_text_bytes += len(v)
-                        try:
-                            if k == b'tEXt':
-                                key, val = v.split(b'\x00', 1)
-                                key_s = key.decode('utf-8', 'ignore').lower()
-                                chunks[key_s] = val
-                        except: pass
+            for k, v in read_chunks(filepath):
+                total_text_bytes += len(v)
+                try:
+                    if k == b'tEXt':
+                        key, val = v.split(b'\x00', 1)
+                        key_s = key.decode('utf-8', 'ignore').lower()
+                        chunks[key_s] = val
+                except: pass
         except: return FileType.ERROR, "Error", 0, None
 
         # 1. 角色卡
         if chunks.get('chara'):
             try:
-                raw = chunks['chara']
-                try: raw = zlib.decompress(raw)
-                except: pass
-                payload = base64.b64decode(raw).decode('utf-8')
+                payload = decode_chara_payload(chunks['chara'])
                 data = json.loads(payload)
                 name = (data.get("data", {}).get("name") or data.get("name") or "Unnamed")
                 return FileType.CHARACTER_CARD, re.sub(r'[\\/:*?"<>|\r\n\t]', '_', name), total_text_bytes, payload
@@ -0,0 +1,192 @@
+import os
+import sys
+import json
+import sqlite3
+import argparse
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from png_chunks import read_chunks, parse_text_chunk, decode_chara_payload, PNGChunkError
+
+# === 角色卡目录 (SQLite FTS5) ===
+# 把每张卡的 名称/作者/标签/描述/开场白/备选开场白 抽取进数据库，
+# 按 路径 + mtime + 大小 增量更新；查询时无需再打开任何 PNG。
+
+CATALOG_DB_NAME = "card_catalog.db"
+DEFAULT_CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), CATALOG_DB_NAME)
+FTS_COLUMNS = ("name", "creator", "tags", "description", "first_mes", "alternate_greetings")
+TRIGRAM_MIN_LEN = 3  # trigram 分词器要求查询词至少 3 个字符，更短的改用 LIKE
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL, mtime_ns INTEGER, size INTEGER, is_card INTEGER,
+    name TEXT, creator TEXT, tags TEXT, description TEXT, first_mes TEXT, alternate_greetings TEXT);
+CREATE TABLE IF NOT EXISTS card_tags (file_id INTEGER NOT NULL, tag TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS idx_card_tags ON card_tags(tag, file_id);
+"""
+
+
+def extract_card_fields(chara_json: str) -> Dict[str, Any]:
+    """角色卡 JSON (V1/V2) -> 目录字段。"""
+    data = json.loads(chara_json)
+    src = data.get("data") if isinstance(data.get("data"), dict) else data
+    def text(*keys) -> str:
+        for k in keys:
+            v = src.get(k) or data.get(k)
+            if isinstance(v, str) and v.strip(): return v.strip()
+        return ""
+    tags = src.get("tags") or data.get("tags") or []
+    greetings = src.get("alternate_greetings") or []
+    return {
+        "name": text("name", "displayName"),
+        "creator": text("creator", "createBy"),
+        "tags": [str(t).strip() for t in tags if str(t).strip()] if isinstance(tags, list) else [],
+        "description": text("description"),
+        "first_mes": text("first_mes"),
+        "alternate_greetings": [g for g in greetings if isinstance(g, str)] if isinstance(greetings, list) else [],
+    }
+
+
+def read_card_fields(path: str) -> Optional[Dict[str, Any]]:
+    """读取 PNG 中的 chara 块并抽取字段；不是角色卡或无法解析时返回 None。"""
+    try:
+        for chunk_type, data in read_chunks(path):
+            keyword, raw = parse_text_chunk(chunk_type, data)
+            if keyword == 'chara': return extract_card_fields(decode_chara_payload(raw))
+    except (OSError, PNGChunkError, ValueError, UnicodeDecodeError, AttributeError):
+        return None
+    return None
+
+
+class CardCatalog:
+    def __init__(self, db_path: str = DEFAULT_CATALOG_PATH):
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript(SCHEMA)
+        self.trigram = self._create_fts()
+
+    def _create_fts(self) -> bool:
+        row = self.conn.execute("SELECT sql FROM sqlite_master WHERE name = 'cards_fts'").fetchone()
+        if row: return "trigram" in row[0]
+        cols = ", ".join(FTS_COLUMNS)
+        try:
+            self.conn.execute(f"CREATE VIRTUAL TABLE cards_fts USING fts5({cols}, tokenize='trigram')")
+            return True
+        except sqlite3.OperationalError:  # SQLite < 3.34 没有 trigram 分词器
+            self.conn.execute(f"CREATE VIRTUAL TABLE cards_fts USING fts5({cols})")
+            return False
+
+    def _remove(self, file_id: int):
+        self.conn.execute("DELETE FROM cards_fts WHERE rowid = ?", (file_id,))
+        self.conn.execute("DELETE FROM card_tags WHERE file_id = ?", (file_id,))
+        self.conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def _upsert(self, path: str, st: os.stat_result, fields: Optional[Dict[str, Any]]):
+        row = self.conn.execute("SELECT id FROM files WHERE path = ?", (path,)).fetchone()
+        if row: self._remove(row[0])
+        if fields is None:
+            self.conn.execute("INSERT INTO files (path, mtime_ns, size, is_card) VALUES (?, ?, ?, 0)",
+                              (path, st.st_mtime_ns, st.st_size))
+            return
+        values = (fields["name"], fields["creator"], ", ".join(fields["tags"]), fields["description"],
+                  fields["first_mes"], "\n".join(fields["alternate_greetings"]))
+        cur = self.conn.execute(
+            "INSERT INTO files (path, mtime_ns, size, is_card, name, creator, tags, description, first_mes, alternate_greetings) "
+            "VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?, ?)", (path, st.st_mtime_ns, st.st_size) + values)
+        file_id = cur.lastrowid
+        self.conn.execute(f"INSERT INTO cards_fts (rowid, {', '.join(FTS_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?)", (file_id,) + values)
+        self.conn.executemany("INSERT INTO card_tags (file_id, tag) VALUES (?, ?)",
+                              [(file_id, t) for t in {t.casefold() for t in fields["tags"]}])
+
+    def update(self, root_dir: str, progress: bool = True) -> Dict[str, int]:
+        """增量更新 root_dir 下的所有 PNG：未变化 (路径+mtime+大小一致) 的文件不会被打开。"""
+        root_dir = os.path.abspath(root_dir)
+        known: Dict[str, Tuple[int, int, int]] = {
+            p: (i, m, s) for i, p, m, s in self.conn.execute("SELECT id, path, mtime_ns, size FROM files")}
+        seen: Set[str] = set()
+        counts = {"scanned": 0, "updated": 0, "removed": 0}
+        stack = [root_dir]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as it: entries = sorted(it, key=lambda e: e.name)
+            except OSError: continue
+            for e in entries:
+                if e.is_dir(follow_symlinks=False):
+                    stack.append(e.path); continue
+                if not e.name.lower().endswith(".png"): continue
+                try: st = e.stat()
+                except OSError: continue
+                seen.add(e.path)
+                counts["scanned"] += 1
+                old = known.get(e.path)
+                if old and (old[1], old[2]) == (st.st_mtime_ns, st.st_size): continue
+                self._upsert(e.path, st, read_card_fields(e.path))
+                counts["updated"] += 1
+                if progress: print(f"\r  已更新: {counts['updated']}", end="")
+        prefix = os.path.join(root_dir, "")
+        for path, (file_id, _, _) in known.items():
+            if path.startswith(prefix) and path not in seen:
+                self._remove(file_id); counts["removed"] += 1
+        self.conn.commit()
+        if progress and counts["updated"]: print()
+        return counts
+
+    def query(self, text: str = "", tags: Optional[List[str]] = None, creator: str = "", limit: int = 50) -> List[Tuple[str, str, str, str]]:
+        """按关键词 (全文)、标签 (全部匹配)、作者 过滤，返回 [(路径, 名称, 作者, 标签)]。"""
+        sql = ["SELECT f.path, f.name, f.creator, f.tags FROM files f"]
+        where, params = ["f.is_card = 1"], []
+        text = text.strip()
+        if text and (not self.trigram or len(text) >= TRIGRAM_MIN_LEN):
+            sql.append("JOIN cards_fts ON cards_fts.rowid = f.id")
+            where.append("cards_fts MATCH ?")
+            params.append('"' + text.replace('"', '""') + '"')
+        elif text:
+            like = "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            where.append("(" + " OR ".join(f"f.{c} LIKE ? ESCAPE '\\'" for c in FTS_COLUMNS) + ")")
+            params.extend([like] * len(FTS_COLUMNS))
+        for tag in tags or []:
+            where.append("f.id IN (SELECT file_id FROM card_tags WHERE tag = ?)")
+            params.append(tag.strip().casefold())
+        if creator:
+            where.append("f.creator LIKE ?")
+            params.append(f"%{creator}%")
+        sql.append("WHERE " + " AND ".join(where))
+        sql.append("ORDER BY " + ("cards_fts.rank" if "cards_fts MATCH ?" in where else "f.name"))
+        sql.append("LIMIT ?")
+        params.append(limit)
+        return self.conn.execute(" ".join(sql), params).fetchall()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="角色卡目录: 构建 SQLite FTS5 索引并搜索")
+    parser.add_argument("--db", default=DEFAULT_CATALOG_PATH, help="数据库路径")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_build = sub.add_parser("build", help="扫描目录并增量更新目录")
+    p_build.add_argument("root", nargs="?", default=os.path.expanduser("~/storage/shared/Download"))
+    p_query = sub.add_parser("query", help="搜索角色卡，例如: query 魔法 --tag 奇幻")
+    p_query.add_argument("text", nargs="?", default="")
+    p_query.add_argument("--tag", action="append", default=[], help="标签 (可重复，需全部匹配)")
+    p_query.add_argument("--creator", default="")
+    p_query.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+
+    catalog = CardCatalog(args.db)
+    try:
+        if args.command == "build":
+            if not os.path.isdir(args.root): sys.exit(f"路径错误: {args.root}")
+            c = catalog.update(args.root)
+            print(f"扫描 {c['scanned']} 个 PNG，更新 {c['updated']} 个，移除 {c['removed']} 个。")
+        else:
+            rows = catalog.query(args.text, args.tag, args.creator, args.limit)
+            for path, name, creator, tags in rows:
+                print(f"{name or '(未命名)'}  [{creator or '-'}]  {tags}\n    {path}")
+            print(f"共 {len(rows)} 条结果。")
+    finally:
+        catalog.close()
+
+
+if __name__ == "__main__":
+    main()
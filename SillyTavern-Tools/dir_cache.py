@@ -0,0 +1,72 @@
+import os
+from typing import Dict, Optional, Set, Union
+
+PathLike = Union[str, "os.PathLike[str]"]
+
+
+def _probe_case_insensitive(directory: str, names: Set[str]) -> bool:
+    """用一个现有名称的大小写互换形式探测目录所在文件系统是否不区分大小写。"""
+    for name in names:
+        swapped = name.swapcase()
+        if swapped != name and swapped not in names:
+            return os.path.exists(os.path.join(directory, swapped))
+    # 目录中没有可探测的名称时，改用目录自身的名称探测
+    parent, base = os.path.split(directory)
+    swapped = os.path.join(parent, base.swapcase())
+    if base and base.swapcase() != base and os.path.exists(swapped):
+        try: return os.path.samefile(swapped, directory)
+        except OSError: return False
+    return False
+
+
+class DirNameCache:
+    """目录文件名缓存：每个目录只 os.scandir 一次，之后的存在性判断与改名记录都在内存中完成。
+
+    case_insensitive 为 None (默认) 时按目录探测文件系统是否区分大小写，
+    判断结果与 os.path.exists 一致；也可以传 True/False 强制指定。"""
+
+    def __init__(self, case_insensitive: Optional[bool] = None):
+        self.case_insensitive = case_insensitive
+        self._dirs: Dict[str, Set[str]] = {}
+        self._folded: Dict[str, bool] = {}
+
+    def _names(self, directory: str) -> Set[str]:
+        names = self._dirs.get(directory)
+        if names is None:
+            try:
+                with os.scandir(directory) as it:
+                    names = {e.name for e in it}
+            except OSError:
+                names = set()
+            folded = self.case_insensitive
+            if folded is None: folded = _probe_case_insensitive(directory, names)
+            if folded: names = {n.casefold() for n in names}
+            self._dirs[directory], self._folded[directory] = names, folded
+        return names
+
+    def _lookup(self, path: PathLike):
+        directory, name = os.path.split(os.path.abspath(os.fspath(path)))
+        names = self._names(directory)
+        return names, (name.casefold() if self._folded[directory] else name)
+
+    def exists(self, path: PathLike) -> bool:
+        names, name = self._lookup(path)
+        return name in names
+
+    def add(self, path: PathLike):
+        names, name = self._lookup(path)
+        names.add(name)
+
+    def discard(self, path: PathLike):
+        names, name = self._lookup(path)
+        names.discard(name)
+
+    def move(self, old_path: PathLike, new_path: PathLike):
+        """记录一次重命名/移动 (在实际 os.rename 成功之后调用)。"""
+        self.discard(old_path)
+        self.add(new_path)
+
+    def invalidate(self, directory: PathLike = None):
+        """丢弃缓存，下次访问时重新扫描 (外部程序改动了目录时使用)。"""
+        if directory is None: self._dirs.clear()
+        else: self._dirs.pop(os.path.abspath(os.fspath(directory)), None)
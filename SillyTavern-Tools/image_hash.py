@@ -0,0 +1,120 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# === 感知哈希引擎 (dHash / aHash / pHash) ===
+# 每张图只解码一次：先用 Image.reduce 按整数倍快速缩小，再转灰度缩放到 32x32，
+# 三种哈希都从这张缩略图派生；一批图片的比较位用 NumPy 一次算完并打包为 64 位整数。
+
+THUMB_SIZE = 32
+HASH_KINDS = ('dhash', 'ahash', 'phash')
+BATCH_SIZE = 128
+PROCESS_POOL_MIN_FILES = 500  # 文件数超过该值才启用进程池
+
+
+def _load_thumbnail(path: str):
+    """解码并缩小为 THUMB_SIZE x THUMB_SIZE 灰度图，失败返回 None。"""
+    from PIL import Image
+    try:
+        with Image.open(path) as im:
+            im.draft('L', (THUMB_SIZE, THUMB_SIZE))  # JPEG 可在解码阶段直接缩小
+            if im.mode not in ('L', 'RGB', 'RGBA'): im = im.convert('RGBA' if 'transparency' in im.info else 'RGB')
+            factor = min(im.width, im.height) // (THUMB_SIZE * 2)
+            if factor > 1: im = im.reduce(factor)
+            return im.convert('L').resize((THUMB_SIZE, THUMB_SIZE), Image.Resampling.LANCZOS)
+    except Exception:
+        return None
+
+
+def _dct_matrix(n: int):
+    k = np.arange(n)[:, None]
+    m = np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n))
+    m[0] /= np.sqrt(2)
+    return m * np.sqrt(2 / n)
+
+
+def _pack_bits(bits) -> List[int]:
+    """(N, 64) 布尔数组 -> N 个整数，第一个比较位为最高位。"""
+    packed = np.packbits(bits.reshape(len(bits), 64), axis=1)
+    return [int(v) for v in packed.view('>u8').ravel()]
+
+
+def _bits_to_int(bits: Sequence[bool]) -> int:
+    value = 0
+    for b in bits: value = (value << 1) | bool(b)
+    return value
+
+
+def _hash_thumbnails(thumbs: list, kinds: Sequence[str]) -> List[Dict[str, int]]:
+    from PIL import Image
+    results: List[Dict[str, int]] = [{} for _ in thumbs]
+    if not thumbs: return results
+    small = {
+        'dhash': [t.resize((9, 8), Image.Resampling.LANCZOS) for t in thumbs] if 'dhash' in kinds else None,
+        'ahash': [t.resize((8, 8), Image.Resampling.LANCZOS) for t in thumbs] if 'ahash' in kinds else None,
+    }
+
+    if np is None:
+        # 无 NumPy 时逐图计算 (缩略图只有几十个像素，仍然很快)
+        for i, t in enumerate(thumbs):
+            if small['dhash']:
+                px = list(small['dhash'][i].getdata())
+                results[i]['dhash'] = _bits_to_int(px[r * 9 + c] > px[r * 9 + c + 1] for r in range(8) for c in range(8))
+            if small['ahash']:
+                px = list(small['ahash'][i].getdata())
+                avg = sum(px) / 64
+                results[i]['ahash'] = _bits_to_int(p > avg for p in px)
+        return results
+
+    if small['dhash']:
+        arr = np.stack([np.asarray(t, dtype=np.int16) for t in small['dhash']])  # (N, 8, 9)
+        for r, h in zip(results, _pack_bits(arr[:, :, :-1] > arr[:, :, 1:])): r['dhash'] = h
+    if small['ahash']:
+        arr = np.stack([np.asarray(t, dtype=np.float32) for t in small['ahash']]).reshape(len(thumbs), 64)
+        for r, h in zip(results, _pack_bits(arr > arr.mean(axis=1, keepdims=True))): r['ahash'] = h
+    if 'phash' in kinds:
+        arr = np.stack([np.asarray(t, dtype=np.float32) for t in thumbs])  # (N, 32, 32)
+        dct = _dct_matrix(THUMB_SIZE)
+        low = (dct @ arr @ dct.T)[:, :8, :8].reshape(len(thumbs), 64)
+        median = np.median(low[:, 1:], axis=1, keepdims=True)  # 排除直流分量
+        for r, h in zip(results, _pack_bits(low > median)): r['phash'] = h
+    return results
+
+
+def _hash_batch(paths: Sequence[str], kinds: Sequence[str]) -> List[Optional[Dict[str, int]]]:
+    thumbs = [_load_thumbnail(p) for p in paths]
+    ok = [t for t in thumbs if t is not None]
+    hashed = iter(_hash_thumbnails(ok, kinds))
+    return [next(hashed) if t is not None else None for t in thumbs]
+
+
+def _make_pool(n_files: int):
+    if n_files >= PROCESS_POOL_MIN_FILES and (os.cpu_count() or 1) > 1:
+        try: return ProcessPoolExecutor()
+        except (ImportError, OSError, NotImplementedError): pass  # Termux 等平台缺少 sem_open
+    # PIL 解码与缩放会释放 GIL，线程池同样有效
+    return ThreadPoolExecutor(max_workers=min(8, (os.cpu_count() or 2) * 2))
+
+
+def compute_hashes(paths: Sequence[str], kinds: Sequence[str] = ('dhash',)) -> List[Optional[Dict[str, int]]]:
+    """批量计算感知哈希，返回与 paths 对应的 {哈希名: 64 位整数}；无法解码或缺少 Pillow 时为 None。"""
+    try: import PIL  # noqa: F401
+    except ImportError: return [None] * len(paths)
+    kinds = [k for k in kinds if k in HASH_KINDS and (k != 'phash' or np is not None)]
+    if len(paths) <= BATCH_SIZE: return _hash_batch(paths, kinds)
+
+    batches = [paths[i:i + BATCH_SIZE] for i in range(0, len(paths), BATCH_SIZE)]
+    results: List[Optional[Dict[str, int]]] = []
+    with _make_pool(len(paths)) as pool:
+        for batch_result in pool.map(_hash_batch, batches, [kinds] * len(batches)):
+            results.extend(batch_result)
+    return results
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
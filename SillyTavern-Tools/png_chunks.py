@@ -0,0 +1,313 @@
+import os
+import sys
+import json
+import struct
+import zlib
+import base64
+import shutil
+import tempfile
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+from dataclasses import dataclass
+
+# === PNG 数据块读取 (只读块头，不解码图像) ===
+# 角色卡 / SD / NAI / ComfyUI 信息都存放在 tEXt/iTXt 块中。
+# 逐块读取头部并用 seek() 跳过数据，遇到第一个 IDAT 即停止；
+# 对于写在 IDAT 之后的文本块 (SillyTavern 导出的卡片就是如此)，
+# 只读取文件尾部的一小段来定位，不会读取图像数据本身。
+# 写入时同样基于块头遍历：只重建被替换的文本块，其余字节 (含 IDAT) 原样拷贝。
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+TEXT_CHUNK_TYPES = (b'tEXt', b'iTXt')
+HEAD_READ_SIZE = 64 * 1024
+TAIL_SCAN_SIZES = (64 * 1024, 1024 * 1024)
+
+_HEADER = struct.Struct('>I4s')
+
+
+class PNGChunkError(ValueError):
+    """文件不是 PNG，或块结构 / CRC 损坏。"""
+
+
+@dataclass
+class ChunkHeader:
+    chunk_type: bytes
+    offset: int  # 长度字段所在位置
+    length: int
+
+    @property
+    def data_offset(self) -> int:
+        return self.offset + 8
+
+    @property
+    def end(self) -> int:
+        return self.offset + 12 + self.length
+
+
+def _is_chunk_type(t: bytes) -> bool:
+    return len(t) == 4 and all(65 <= c <= 90 or 97 <= c <= 122 for c in t)
+
+
+class _RangeReader:
+    """按偏移读取文件，命中已缓存的头部/尾部缓冲区时不再发起 I/O。"""
+
+    def __init__(self, f: BinaryIO, size: int):
+        self.f = f
+        self.size = size
+        self.blocks: List[Tuple[int, bytes]] = []
+
+    def cache(self, start: int, length: int) -> bytes:
+        buf = self.read(start, length)
+        self.blocks.append((start, buf))
+        return buf
+
+    def read(self, start: int, length: int) -> bytes:
+        for b_start, buf in self.blocks:
+            if b_start <= start and start + length <= b_start + len(buf):
+                return buf[start - b_start:start - b_start + length]
+        self.f.seek(start)
+        data = self.f.read(length)
+        if len(data) != length: raise PNGChunkError("文件被截断")
+        return data
+
+    def header_at(self, pos: int) -> ChunkHeader:
+        if pos + 8 > self.size: raise PNGChunkError("文件被截断")
+        length, chunk_type = _HEADER.unpack(self.read(pos, 8))
+        if not _is_chunk_type(chunk_type): raise PNGChunkError(f"无效的块类型: {chunk_type!r}")
+        if pos + 12 + length > self.size: raise PNGChunkError(f"块 {chunk_type!r} 超出文件末尾")
+        return ChunkHeader(chunk_type, pos, length)
+
+    def chunk_data(self, header: ChunkHeader, verify: bool = True) -> bytes:
+        raw = self.read(header.data_offset, header.length + 4)
+        data, crc = raw[:-4], raw[-4:]
+        if verify and zlib.crc32(data, zlib.crc32(header.chunk_type)) != struct.unpack('>I', crc)[0]:
+            raise PNGChunkError(f"块 {header.chunk_type!r} CRC 校验失败")
+        return data
+
+
+def iter_chunk_headers(f: BinaryIO) -> Iterator[ChunkHeader]:
+    """从文件开头依次产出所有块头 (含 IEND)，只读取每块的 8 字节头部。"""
+    size = os.fstat(f.fileno()).st_size
+    reader = _RangeReader(f, size)
+    if reader.read(0, 8) != PNG_SIGNATURE: raise PNGChunkError("不是 PNG 文件")
+    pos = 8
+    while True:
+        header = reader.header_at(pos)
+        yield header
+        if header.chunk_type == b'IEND': return
+        pos = header.end
+
+
+def _scan_tail(reader: _RangeReader, first_idat: int, types: Tuple[bytes, ...]) -> Optional[List[ChunkHeader]]:
+    """在文件尾部缓冲区中寻找一个能够一路衔接到 IEND 的 IDAT 块，
+    返回其后所有目标类型的块头；找不到可靠锚点时返回 None。"""
+    for window in TAIL_SCAN_SIZES:
+        window = min(window, reader.size - first_idat)
+        base = reader.size - window
+        buf = reader.cache(base, window)
+        anchors = [first_idat - base] if base == first_idat else []
+        idx = buf.find(b'IDAT', 4)
+        while idx != -1:
+            anchors.append(idx - 4)
+            idx = buf.find(b'IDAT', idx + 1)
+
+        for anchor in anchors:
+            found: List[ChunkHeader] = []
+            pos = anchor
+            while pos + 12 <= window:
+                length, chunk_type = _HEADER.unpack_from(buf, pos)
+                if not _is_chunk_type(chunk_type) or pos + 12 + length > window: break
+                if chunk_type == b'IEND':
+                    if pos + 12 == window: return found
+                    break
+                if chunk_type in types: found.append(ChunkHeader(chunk_type, base + pos, length))
+                pos += 12 + length
+        if base == first_idat: break
+    return None
+
+
+def read_chunks(filepath: str, types: Tuple[bytes, ...] = TEXT_CHUNK_TYPES) -> List[Tuple[bytes, bytes]]:
+    """按文件顺序返回指定类型块的 (类型, 数据)，不读取 IDAT 数据。
+
+    失败时抛出 PNGChunkError (或 OSError)。"""
+    with open(filepath, 'rb', buffering=0) as f:
+        size = os.fstat(f.fileno()).st_size
+        reader = _RangeReader(f, size)
+        reader.cache(0, min(size, HEAD_READ_SIZE))
+        if size < 8 or reader.read(0, 8) != PNG_SIGNATURE: raise PNGChunkError("不是 PNG 文件")
+
+        results: List[Tuple[bytes, bytes]] = []
+        pos, first = 8, True
+        while True:
+            header = reader.header_at(pos)
+            if first and header.chunk_type != b'IHDR': raise PNGChunkError("首个块不是 IHDR")
+            first = False
+            if header.chunk_type == b'IEND': return results
+            if header.chunk_type == b'IDAT': break
+            if header.chunk_type in types: results.append((header.chunk_type, reader.chunk_data(header)))
+            pos = header.end
+
+        # IDAT 之后的文本块：先尝试尾部扫描，失败再逐块跳读头部
+        tail = _scan_tail(reader, pos, types)
+        if tail is None:
+            tail = []
+            while True:
+                header = reader.header_at(pos)
+                if header.chunk_type == b'IEND': break
+                if header.chunk_type in types: tail.append(header)
+                pos = header.end
+        results.extend((h.chunk_type, reader.chunk_data(h)) for h in tail)
+        return results
+
+
+def parse_text_chunk(chunk_type: bytes, data: bytes) -> Tuple[str, bytes]:
+    """拆分 tEXt / iTXt 块为 (小写关键词, 文本字节)；无法拆分时关键词为空串。"""
+    split = data.split(b'\x00', 1)
+    if len(split) != 2: return "", b""
+    keyword = split[0].decode('utf-8', 'ignore').lower()
+    if chunk_type != b'iTXt': return keyword, split[1]
+    # iTXt: 压缩标志(1) 压缩方法(1) 语言标签\0 翻译关键词\0 文本
+    rest = split[1]
+    if len(rest) < 2: return keyword, b""
+    flag, body = rest[0], rest[2:]
+    parts = body.split(b'\x00', 2)
+    if len(parts) != 3: return keyword, b""
+    text = parts[2]
+    if flag == 1:
+        try: text = zlib.decompress(text)
+        except zlib.error: return keyword, b""
+    return keyword, text
+
+
+def decode_chara_payload(raw: bytes) -> str:
+    """chara 块内容 (base64 JSON，可能经过 zlib 压缩) -> JSON 字符串。"""
+    # zlib 头: CMF 为 0x78 且 (CMF*256 + FLG) 能被 31 整除，涵盖 x\x01 / x^ / x\x9c / x\xda 等所有压缩级别
+    if len(raw) >= 2 and raw[0] == 0x78 and (raw[0] * 256 + raw[1]) % 31 == 0:
+        try: raw = zlib.decompress(raw)
+        except zlib.error: pass
+    return base64.b64decode(raw).decode('utf-8')
+
+
+# === 无损写入 (只替换文本块，不重新编码图像) ===
+
+def build_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(data, zlib.crc32(chunk_type)))
+
+
+def encode_chara_payload(chara_json: str, compress: bool = False) -> bytes:
+    """JSON 字符串 -> chara 块内容 (base64，可选 zlib 压缩，与 decode_chara_payload 对应)。"""
+    raw = base64.b64encode(chara_json.encode('utf-8'))
+    return zlib.compress(raw, 9) if compress else raw
+
+
+def _copy_range(src: BinaryIO, dst: BinaryIO, start: int, length: int):
+    """把 src 的 [start, start+length) 拷贝到 dst 当前位置，优先使用 os.sendfile (零拷贝)。"""
+    if length <= 0: return
+    if hasattr(os, 'sendfile'):
+        try:
+            while length > 0:
+                sent = os.sendfile(dst.fileno(), src.fileno(), start, length)
+                if sent == 0: break
+                start += sent; length -= sent
+        except OSError: pass
+    if length > 0:
+        src.seek(start)
+        while length > 0:
+            buf = src.read(min(length, 1024 * 1024))
+            if not buf: raise PNGChunkError("文件被截断")
+            dst.write(buf)
+            length -= len(buf)
+
+
+def splice_text_chunks(src_path: str, replacements: Dict[str, bytes], dst_path: Optional[str] = None) -> str:
+    """替换或插入 tEXt 块 {关键词: 文本字节}，其余块按原字节拷贝。
+
+    已存在的同名块 (tEXt 或 iTXt) 在第一次出现的位置被替换为 tEXt (重复的同名块会被删除)，
+    不存在的插入到 IEND 之前 (与 SillyTavern 写卡的位置一致)。
+    dst_path 为空时原地更新 (先写同目录下唯一命名的临时文件，复制原文件的权限后 os.replace)。返回写入的路径。"""
+    wanted = {k.lower(): v for k, v in replacements.items()}
+    written = set()
+    target = dst_path or src_path
+    with open(src_path, 'rb', buffering=0) as src:
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(target)}.", suffix=".tmp", dir=os.path.dirname(os.path.abspath(target)))
+        with open(fd, 'wb', buffering=0) as dst:
+            reader = _RangeReader(src, os.fstat(src.fileno()).st_size)
+            try:
+                dst.write(PNG_SIGNATURE)
+                copy_from = None  # 待拷贝的连续原始字节区间起点
+                for header in iter_chunk_headers(src):
+                    keyword = None
+                    if header.chunk_type in (b'tEXt', b'iTXt'):
+                        head = reader.read(header.data_offset, min(header.length, 80))
+                        keyword = head.split(b'\x00', 1)[0].decode('latin-1').lower()
+                    if header.chunk_type == b'IEND' or keyword in wanted:
+                        if copy_from is not None:
+                            _copy_range(src, dst, copy_from, header.offset - copy_from)
+                            copy_from = None
+                        if header.chunk_type == b'IEND':
+                            for k, v in wanted.items():
+                                if k not in written: dst.write(build_chunk(b'tEXt', k.encode('latin-1') + b'\x00' + v))
+                            _copy_range(src, dst, header.offset, header.end - header.offset)
+                            break
+                        if keyword not in written:
+                            dst.write(build_chunk(b'tEXt', keyword.encode('latin-1') + b'\x00' + wanted[keyword]))
+                            written.add(keyword)
+                        continue
+                    if copy_from is None: copy_from = header.offset
+            except BaseException:
+                dst.close()
+                os.remove(tmp_path)
+                raise
+    try:
+        shutil.copymode(src_path, tmp_path)  # mkstemp 创建的文件权限为 0600，替换后卡片不应丢失原有权限
+        os.replace(tmp_path, target)
+    except BaseException:
+        try: os.remove(tmp_path)
+        except OSError: pass
+        raise
+    return target
+
+
+def write_chara(src_path: str, chara_json: str, dst_path: Optional[str] = None, compress: bool = False) -> str:
+    """写入新的 chara 数据 (JSON 字符串)，图像数据原样保留。"""
+    return splice_text_chunks(src_path, {'chara': encode_chara_payload(chara_json, compress)}, dst_path)
+
+
+def update_chara(path: str, transform: Callable[[dict], Optional[dict]], compress: bool = False) -> bool:
+    """读取卡片 JSON -> transform(data) -> 原地写回；transform 返回 None 表示无需修改。
+
+    V3 卡片另有 ccv3 块且 SillyTavern 优先读取它，因此 ccv3 存在时同样经过 transform 一并写回，
+    否则修改在酒馆中不可见。chara / ccv3 为 iTXt 时也能读取，写回统一为 tEXt。"""
+    raws: Dict[str, bytes] = {}
+    for chunk_type, data in read_chunks(path, (b'tEXt', b'iTXt')):
+        keyword, text = parse_text_chunk(chunk_type, data)
+        if keyword in ('chara', 'ccv3') and keyword not in raws: raws[keyword] = text
+    if 'chara' not in raws: raise PNGChunkError("未找到 chara 数据块")
+    replacements = {}
+    for keyword, raw in raws.items():
+        new_data = transform(json.loads(decode_chara_payload(raw)))
+        if new_data is not None:
+            replacements[keyword] = encode_chara_payload(json.dumps(new_data, ensure_ascii=False), compress)
+    if not replacements: return False
+    splice_text_chunks(path, replacements)
+    return True
+
+
+def _set_name(data: dict, name: str) -> Optional[dict]:
+    changed = False
+    for target in (data, data.get('data') if isinstance(data.get('data'), dict) else None):
+        if target is not None and 'name' in target and target['name'] != name:
+            target['name'] = name; changed = True
+    return data if changed else None
+
+
+if __name__ == "__main__":
+    # 用法: python png_chunks.py set-name 新角色名 卡片1.png [卡片2.png ...]
+    if len(sys.argv) < 4 or sys.argv[1] != 'set-name':
+        sys.exit("用法: python png_chunks.py set-name <新角色名> <卡片.png> [...]")
+    new_name = sys.argv[2]
+    for card_path in sys.argv[3:]:
+        try:
+            changed = update_chara(card_path, lambda d: _set_name(d, new_name))
+            print(f"  {'已更新' if changed else '无变化'}: {card_path}")
+        except (OSError, ValueError) as e:
+            print(f"  ! 失败: {card_path}: {e}")
@@ -3,9 +3,238 @@ import os
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 from tkinter import font
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Set, Tuple, Callable, Iterable
 import re
 import sys
+import bisect
+import heapq
+import itertools
+import random
+import time
+import contextlib
+import io
+
+
+class EntryStore:
+    """条目索引: uid -> 条目、空闲 uid 最小堆、小写 注释/关键词 -> uid 集合.
+
+    条目本身仍保存在 worldbook_data["entries"] 中；增删改都要经过这里，索引才能保持同步。"""
+
+    def __init__(self):
+        self.entries: Dict[str, dict] = {}
+        self._by_uid: Dict[int, Tuple[str, dict]] = {}
+        self._titles: Dict[str, Set[int]] = {}
+        self._free: List[int] = []  # 已释放的 uid，可能混有已被重新占用的，取用时跳过
+        self._scan_from = 0  # 小于此值的空闲 uid 都在堆中，其余分配时向上顺序查找
+        self._display_max = -1
+        self._display_dirty = False
+
+    def rebuild(self, entries: Dict[str, dict]):
+        """重新索引一整本世界书的 entries (加载文件时调用)."""
+        self.entries = entries
+        self._by_uid, self._titles, self._free = {}, {}, []
+        self._scan_from, self._display_max, self._display_dirty = 0, -1, False
+        for key, entry in entries.items():
+            self._index(key, entry)
+
+    @staticmethod
+    def _terms(entry: dict) -> Set[str]:
+        terms = {str(k).strip().lower() for k in entry.get("key") or [] if str(k).strip()}
+        comment = str(entry.get("comment") or "").strip().lower()
+        if comment:
+            terms.add(comment)
+        return terms
+
+    def _index(self, key: str, entry: dict):
+        uid = entry.get("uid")
+        if uid in self._by_uid:  # 重复 uid 与原先的线性查找一致，只认第一个
+            return
+        self._by_uid[uid] = (key, entry)
+        for term in self._terms(entry):
+            self._titles.setdefault(term, set()).add(uid)
+        display_index = entry.get("displayIndex")
+        if isinstance(display_index, int) and display_index > self._display_max:
+            self._display_max = display_index
+
+    def _unindex(self, uid: int, release: bool = True) -> Tuple[str, dict]:
+        key, entry = self._by_uid.pop(uid)
+        for term in self._terms(entry):
+            uids = self._titles.get(term)
+            if uids is not None:
+                uids.discard(uid)
+                if not uids:
+                    del self._titles[term]
+        if release:
+            if isinstance(uid, int) and 0 <= uid < self._scan_from:
+                heapq.heappush(self._free, uid)
+            if entry.get("displayIndex") == self._display_max:
+                self._display_dirty = True
+        return key, entry
+
+    def uids(self) -> List[int]:
+        """按条目顺序返回所有 uid."""
+        return list(self._by_uid)
+
+    def get(self, uid: int) -> Optional[dict]:
+        item = self._by_uid.get(uid)
+        return item[1] if item else None
+
+    def add(self, entry: dict) -> str:
+        """加入新条目，返回它在 entries 中的键 (优先使用 uid 本身)."""
+        key = str(entry.get("uid"))
+        if key in self.entries:
+            key = next(str(i) for i in itertools.count(len(self.entries)) if str(i) not in self.entries)
+        self.entries[key] = entry
+        self._index(key, entry)
+        return key
+
+    def update(self, uid: int, info: dict) -> Optional[dict]:
+        """修改条目字段并刷新索引，条目不存在时返回 None."""
+        if uid not in self._by_uid:
+            return None
+        key, entry = self._unindex(uid, release=False)
+        entry.update(info)
+        if entry.get("uid") != uid and isinstance(uid, int) and 0 <= uid < self._scan_from:
+            heapq.heappush(self._free, uid)  # uid 被改掉时，旧 uid 视为释放
+        self._index(key, entry)
+        return entry
+
+    def remove(self, uid: int) -> bool:
+        if uid not in self._by_uid:
+            return False
+        key, _ = self._unindex(uid)
+        del self.entries[key]
+        return True
+
+    def next_uid(self) -> int:
+        """最小的未占用 uid (与 SillyTavern 新建条目的分配方式一致)，只查看不占用."""
+        while self._free and self._free[0] in self._by_uid:
+            heapq.heappop(self._free)
+        if self._free:
+            return self._free[0]
+        while self._scan_from in self._by_uid:
+            self._scan_from += 1
+        return self._scan_from
+
+    def next_display_index(self) -> int:
+        if self._display_dirty:  # 只有删掉当前最大值时才需要重新扫描
+            indices = [e.get("displayIndex") for e in self.entries.values()]
+            self._display_max = max((i for i in indices if isinstance(i, int)), default=-1)
+            self._display_dirty = False
+        return self._display_max + 1
+
+    def find(self, text: str) -> List[dict]:
+        """按注释或关键词精确查找 (不区分大小写)."""
+        uids = self._titles.get(text.strip().lower(), ())
+        return [self._by_uid[uid][1] for uid in sorted(uids, key=str)]
+
+
+class SearchIndex:
+    """关键词 / 次要关键词 / 注释 / 内容 的倒排索引.
+
+    英文与数字按单词建索引，查询词按前缀匹配；中日韩文字按单字和相邻两字建索引，
+    查询时取两字倒排的交集再核对原文，结果等同于子串匹配。"""
+    CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af"
+    TOKEN_RE = re.compile(f"([{CJK}]+)|[^\\W{CJK}]+")
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._postings: Dict[str, Set[int]] = {}
+        self._words: Set[str] = set()
+        self._vocabulary: List[str] = []  # 排序后的 _words，用于前缀查找，有改动时才重新排序
+        self._vocabulary_dirty = False
+        self._docs: Dict[int, Tuple[Set[str], str]] = {}  # uid -> (单词集合, 小写全文)
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    @classmethod
+    def _tokens(cls, text: str) -> Tuple[List[str], List[str]]:
+        """小写文本 -> (单词列表, 中日韩连续片段列表)."""
+        words, runs = [], []
+        for match in cls.TOKEN_RE.finditer(text):
+            (runs if match.group(1) else words).append(match.group(0))
+        return words, runs
+
+    @staticmethod
+    def _grams(run: str) -> List[str]:
+        return [run] if len(run) == 1 else [run[i:i + 2] for i in range(len(run) - 1)]
+
+    def _terms(self, text: str) -> Tuple[Set[str], Set[str]]:
+        words, runs = self._tokens(text)
+        words = {sys.intern(w) for w in words}
+        terms = set(words)
+        for run in runs:
+            terms.update(run)
+            terms.update(self._grams(run))
+        return words, terms
+
+    def add(self, uid: int, entry: dict):
+        """索引 (或重新索引) 一个条目."""
+        self.remove(uid)
+        parts = list(entry.get("key") or []) + list(entry.get("keysecondary") or [])
+        parts += [entry.get("comment") or "", entry.get("content") or ""]
+        text = "\n".join(str(p) for p in parts).lower()
+        words, terms = self._terms(text)
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is None:
+                posting = self._postings[term] = set()
+                if term in words:
+                    self._words.add(term)
+                    self._vocabulary_dirty = True
+            posting.add(uid)
+        self._docs[uid] = (words, text)
+
+    def remove(self, uid: int):
+        doc = self._docs.pop(uid, None)
+        if doc is None:
+            return
+        for term in self._terms(doc[1])[1]:
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            posting.discard(uid)
+            if not posting:
+                del self._postings[term]
+                if term in self._words:
+                    self._words.discard(term)
+                    self._vocabulary_dirty = True
+
+    def _prefixed(self, word: str) -> Iterable[str]:
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self._words)
+            self._vocabulary_dirty = False
+        i = bisect.bisect_left(self._vocabulary, word)
+        while i < len(self._vocabulary) and self._vocabulary[i].startswith(word):
+            yield self._vocabulary[i]
+            i += 1
+
+    def _matches(self, uid: int, words: List[str], runs: List[str]) -> bool:
+        doc_words, text = self._docs[uid]
+        return (all(any(w.startswith(q) for w in doc_words) for q in words)
+                and all(run in text for run in runs))
+
+    def search(self, query: str, candidates: Optional[Set[int]] = None) -> Set[int]:
+        """返回匹配查询中所有词的 uid 集合.
+
+        传入 candidates (上一次较短查询的结果) 时只逐个核对这些条目，输入时逐字收窄更快。"""
+        words, runs = self._tokens(query.lower())
+        if candidates is not None:
+            return {uid for uid in candidates if uid in self._docs and self._matches(uid, words, runs)}
+        hits: List[Set[int]] = []
+        for word in words:
+            hits.append(set().union(*(self._postings[w] for w in self._prefixed(word))))
+        for run in runs:
+            postings = sorted((self._postings.get(g, set()) for g in self._grams(run)), key=len)
+            found = postings[0].intersection(*postings[1:])
+            hits.append({uid for uid in found if run in self._docs[uid][1]} if len(run) > 2 else found)
+        if not hits:
+            return set(self._docs)
+        hits.sort(key=len)
+        return hits[0].intersection(*hits[1:])
 
 
 class WorldBookManager:
@@ -41,6 +270,7 @@ class WorldBookManager:
         """初始化 WorldBookManager."""
         self.worldbook_data = None
         self.current_file_path = None
+        self.store = EntryStore()
 
         self.position_options = list(self.POSITION_MAP_CHINESE.keys())
         self.role_options = list(self.ROLE_MAP.keys())
@@ -55,6 +285,7 @@ class WorldBookManager:
             with open(file_path, "r", encoding="utf-8") as f:
                 self.worldbook_data = json.load(f)
                 self.current_file_path = file_path
+                self.store.rebuild(self.worldbook_data.get("entries", {}))
                 return True
         except FileNotFoundError:
             messagebox.showerror("错误", f"文件未找到: {file_path}")
@@ -148,21 +379,20 @@ class WorldBookManager:
             messagebox.showerror("错误", "世界书数据未加载")
             return False
 
-        for index, entry in self.worldbook_data["entries"].items():
-            if entry["uid"] == uid:
-                entry.update(updated_info)
-                for key, value in updated_info.items():
-                    if key == "position" and value in self.POSITION_MAP_ENGLISH:
-                        entry[key] = self.POSITION_MAP_ENGLISH[value]
-                    elif key == "role" and value in self.ROLE_MAP:
-                        entry[key] = self.ROLE_MAP[value]
-                    elif key == "sticky" and value in self.STICKY_MAP:
-                        entry[key] = self.STICKY_MAP[value]
-                    elif key == "selectiveLogic" and value in self.SELECTIVE_LOGIC_MAP:
-                        entry[key] = self.SELECTIVE_LOGIC_MAP[value]
-                return True
-        messagebox.showerror("错误", f"未找到 UID 为 {uid} 的条目")
-        return False
+        entry = self.store.update(uid, updated_info)
+        if entry is None:
+            messagebox.showerror("错误", f"未找到 UID 为 {uid} 的条目")
+            return False
+        for key, value in updated_info.items():
+            if key == "position" and value in self.POSITION_MAP_ENGLISH:
+                entry[key] = self.POSITION_MAP_ENGLISH[value]
+            elif key == "role" and value in self.ROLE_MAP:
+                entry[key] = self.ROLE_MAP[value]
+            elif key == "sticky" and value in self.STICKY_MAP:
+                entry[key] = self.STICKY_MAP[value]
+            elif key == "selectiveLogic" and value in self.SELECTIVE_LOGIC_MAP:
+                entry[key] = self.SELECTIVE_LOGIC_MAP[value]
+        return True
 
     def delete_entry(self, uid: int) -> bool:
         """Deletes a worldbook entry by UID."""
@@ -171,15 +401,7 @@ class WorldBookManager:
             return False
 
         print(f"尝试删除 UID: {uid}")
-        print(f"当前 entries: {self.worldbook_data['entries'].keys()}")
-        deleted = False
-        for index, entry in list(self.worldbook_data["entries"].items()):
-            if entry["uid"] == uid:
-                print(f"找到匹配条目，索引: {index}, UID: {uid}")
-                del self.worldbook_data["entries"][index]
-                deleted = True
-                break
-        if deleted:
+        if self.store.remove(uid):
             print(f"UID: {uid} 删除成功")
             return True
         else:
@@ -190,49 +412,152 @@ class WorldBookManager:
         """Retrieves a worldbook entry by UID."""
         if not self.worldbook_data or "entries" not in self.worldbook_data:
             return None
-        for entry in self.worldbook_data["entries"].values():
-            if entry["uid"] == uid:
-                return entry
-        return None
+        return self.store.get(uid)
+
+    def find_entries(self, text: str) -> List[dict]:
+        """Finds entries whose comment or a key equals text (case-insensitive)."""
+        return self.store.find(text)
+
+    def add_entry(self, entry: dict):
+        """Adds a new entry (from create_entry) to the worldbook."""
+        if self.worldbook_data is None:
+            self.worldbook_data = {}
+        if "entries" not in self.worldbook_data:
+            self.worldbook_data["entries"] = self.store.entries
+        self.store.add(entry)
 
     def _get_next_uid(self) -> int:
-        """Returns the next available UID."""
-        if not self.worldbook_data or "entries" not in self.worldbook_data:
-            return 0
-        uids = [entry["uid"] for entry in self.worldbook_data["entries"].values()]
-        return max(uids) + 1 if uids else 0
+        """Returns the lowest unused UID."""
+        return self.store.next_uid()
 
     def _get_next_display_index(self) -> int:
         """Returns the next available display index."""
-        if not self.worldbook_data or "entries" not in self.worldbook_data:
-            return 0
-        indices = [entry["displayIndex"]
-                   for entry in self.worldbook_data["entries"].values()]
-        return max(indices) + 1 if indices else 0
+        return self.store.next_display_index()
 
     def get_entries_list_display(self) -> List[str]:
         """Returns a list of entry display strings for UI listbox."""
         if not self.worldbook_data or "entries" not in self.worldbook_data:
             return []
 
-        display_list = []
-        for entry in self.worldbook_data["entries"].values():
-            prefix = ""
-            if entry.get("constant"):
-                prefix += "[常驻] "
-            if entry.get("disable"):
-                prefix += "[禁用] "
-            key_display = entry["key"][0] if entry["key"] else ""
-            keysecondary_display = entry["keysecondary"][
-                0] if entry["keysecondary"] else ""
-
-            display_text = f"{prefix} {entry.get('uid', 'N/A')} - {key_display} - {keysecondary_display} ({entry['comment']})"
-            display_list.append(display_text)
-        return display_list
+        return [self.format_entry_display(entry) for entry in self.worldbook_data["entries"].values()]
+
+    @staticmethod
+    def format_entry_display(entry: dict) -> str:
+        """Returns the list row text of one entry."""
+        prefix = ""
+        if entry.get("constant"):
+            prefix += "[常驻] "
+        if entry.get("disable"):
+            prefix += "[禁用] "
+        key_display = entry["key"][0] if entry["key"] else ""
+        keysecondary_display = entry["keysecondary"][
+            0] if entry["keysecondary"] else ""
+
+        return f"{prefix} {entry.get('uid', 'N/A')} - {key_display} - {keysecondary_display} ({entry['comment']})"
+
+
+class VirtualEntryList:
+    """只渲染可见行的条目列表.
+
+    Listbox 中始终只有一屏的行，滚动条、滚轮和方向键改变的是起始行 offset；
+    rows 只保存 uid，行文本在显示时才由 row_text(uid) 生成。"""
+
+    def __init__(self, parent, row_text: Callable[[int], str], on_select: Callable[[int], None]):
+        self.row_text, self.on_select = row_text, on_select
+        self.rows: List[int] = []
+        self.offset = 0
+        self.visible = 20
+        self.selected_uid: Optional[int] = None
+
+        self.listbox = tk.Listbox(parent, height=20, width=15, selectmode=tk.SINGLE,
+                                  exportselection=False, activestyle="none")
+        self.scrollbar = ttk.Scrollbar(parent, orient="vertical", command=self._on_scrollbar)
+        self._line_height = font.Font(font=self.listbox.cget("font")).metrics("linespace") + 1
+        self._chrome = 2 * (int(self.listbox.cget("borderwidth")) + int(self.listbox.cget("highlightthickness")))
+
+        self.listbox.bind("<Configure>", self._on_resize)
+        self.listbox.bind("<<ListboxSelect>>", self._on_listbox_select)
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.listbox.bind(sequence, self._on_wheel)
+        self.listbox.bind("<Up>", lambda e: self._move(-1))
+        self.listbox.bind("<Down>", lambda e: self._move(1))
+        self.listbox.bind("<Prior>", lambda e: self._move(-self.visible))
+        self.listbox.bind("<Next>", lambda e: self._move(self.visible))
+
+    def set_rows(self, rows: List[int]):
+        self.rows = rows
+        self.render()
+
+    def render(self):
+        total = len(self.rows)
+        self.offset = max(0, min(self.offset, total - self.visible))
+        window = self.rows[self.offset:self.offset + self.visible]
+        self.listbox.delete(0, tk.END)
+        if window:
+            self.listbox.insert(tk.END, *(self.row_text(uid) for uid in window))
+        if self.selected_uid in window:
+            self.listbox.selection_set(window.index(self.selected_uid))
+        self.listbox.yview_moveto(0)
+        if total:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + self.visible) / total))
+        else:
+            self.scrollbar.set(0, 1)
+
+    def see(self, uid: int):
+        """滚动到 uid 所在行 (若它在当前列表中)."""
+        try: index = self.rows.index(uid)
+        except ValueError: return
+        if not self.offset <= index < self.offset + self.visible:
+            self.offset = index - self.visible // 2
+        self.render()
+
+    def _on_resize(self, event):
+        visible = max(1, (event.height - self._chrome) // self._line_height)
+        if visible != self.visible:
+            self.visible = visible
+            self.render()
+
+    def _on_scrollbar(self, *args):
+        if args[0] == "moveto":
+            self.offset = int(float(args[1]) * len(self.rows))
+        elif args[0] == "scroll":
+            self.offset += int(args[1]) * (self.visible if args[2] == "pages" else 1)
+        self.render()
+
+    def _on_wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.offset -= 3
+        else:
+            self.offset += 3
+        self.render()
+        return "break"
+
+    def _on_listbox_select(self, event):
+        selected_index = self.listbox.curselection()
+        if selected_index and self.offset + selected_index[0] < len(self.rows):
+            self.selected_uid = self.rows[self.offset + selected_index[0]]
+            self.on_select(self.selected_uid)
+
+    def _move(self, step: int):
+        if not self.rows:
+            return "break"
+        try: index = self.rows.index(self.selected_uid) + step
+        except ValueError: index = self.offset
+        index = max(0, min(index, len(self.rows) - 1))
+        self.selected_uid = self.rows[index]
+        if index < self.offset:
+            self.offset = index
+        elif index >= self.offset + self.visible:
+            self.offset = index - self.visible + 1
+        self.render()
+        self.on_select(self.selected_uid)
+        return "break"
 
 
 class WorldBookUI:
     """构建 SillyTavern 世界书编辑器 (Lorebook Editor) 的 Tkinter 用户界面."""
+    INDEX_BATCH_SECONDS = 0.03  # 每次 after() 回调最多建索引这么久，保证大世界书加载时界面不卡住
+    SEARCH_DELAY_MS = 150  # 输入停顿多久后再筛选
 
     def __init__(self, root, world_book_manager):
         """初始化 WorldBookUI."""
@@ -252,10 +577,18 @@ class WorldBookUI:
         self.str_entries = {}
         self.bool_vars = {}
 
+        self.search_index = SearchIndex()
+        self._indexed_entries = None  # 当前索引对应的 entries 字典，换了文件就重建
+        self._index_queue: List[int] = []
+        self._index_pos = 0
+        self._index_job = None
+        self._filter_job = None
+        self._last_query: Optional[str] = None
+        self._last_result: Optional[Set[int]] = None
+
         self.create_widgets()
         self.create_edit_fields()
         self.update_entry_list()
-        self.entry_listbox.bind("<<ListboxSelect>>", self.on_entry_select)
 
     def setup_styles(self):
         """Sets up UI styles."""
@@ -281,15 +614,22 @@ class WorldBookUI:
         ttk.Label(self.root, text="SillyTavern 世界书编辑器 (Lorebook Editor)", # 标题明确为世界书编辑器 (Lorebook Editor)
                   style="Header.TLabel").pack(pady=10)
 
-        self.entry_listbox = tk.Listbox(
-            self.root, height=20, width=15, selectmode=tk.SINGLE, exportselection=False)
-        self.entry_listbox.pack(side=tk.LEFT, padx=5,
-                                 pady=10, fill=tk.BOTH, expand=True)
+        list_frame = ttk.Frame(self.root)
+        list_frame.pack(side=tk.LEFT, padx=5, pady=10, fill=tk.BOTH, expand=True)
+
+        search_frame = ttk.Frame(list_frame)
+        search_frame.pack(side=tk.TOP, fill=tk.X, pady=(0, 5))
+        ttk.Label(search_frame, text="搜索:").pack(side=tk.LEFT)
+        self.search_var = tk.StringVar()
+        self.search_var.trace_add("write", self.on_search_change)
+        ttk.Entry(search_frame, textvariable=self.search_var).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
 
-        scrollbar = ttk.Scrollbar(
-            self.root, orient="vertical", command=self.entry_listbox.yview)
-        scrollbar.pack(side=tk.LEFT, fill=tk.Y)
-        self.entry_listbox.config(yscrollcommand=scrollbar.set)
+        self.status_label = ttk.Label(list_frame, text="")
+        self.status_label.pack(side=tk.BOTTOM, fill=tk.X)
+
+        self.entry_list = VirtualEntryList(list_frame, self._entry_row_text, self.on_entry_select)
+        self.entry_list.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.entry_list.scrollbar.pack(side=tk.LEFT, fill=tk.Y)
 
         self.button_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=5)
         self.create_button_widgets()
@@ -487,19 +827,13 @@ class WorldBookUI:
             if self.world_book_manager.save_worldbook(file_path):
                 messagebox.showinfo("成功", f"已保存到: {file_path}")
 
-    def on_entry_select(self, event):
-        """Handles entry selection from listbox."""
-        selected_index = self.entry_listbox.curselection()
-        if selected_index:
-            selected_text = self.entry_listbox.get(selected_index[0])
-            uid_match = re.search(r'(\d+) -', selected_text)
-            if uid_match:
-                uid = int(uid_match.group(1))
-                entry = self.world_book_manager.get_entry_by_uid(uid)
-                if entry:
-                    self.populate_edit_fields(entry)
-                    self.save_button.config(state=tk.NORMAL)
-                    self.delete_button.config(state=tk.NORMAL)
+    def on_entry_select(self, uid: int):
+        """Handles entry selection from the entry list."""
+        entry = self.world_book_manager.get_entry_by_uid(uid)
+        if entry:
+            self.populate_edit_fields(entry)
+            self.save_button.config(state=tk.NORMAL)
+            self.delete_button.config(state=tk.NORMAL)
 
     def populate_edit_fields(self, entry: dict):
         """Populates edit fields with selected entry data."""
@@ -572,18 +906,10 @@ class WorldBookUI:
 
     def save_entry(self):
         """Saves current entry data to worldbook data."""
-        selected_index = self.entry_listbox.curselection()
-        if not selected_index:
+        uid = self.entry_list.selected_uid
+        if uid is None:
             return
 
-        selected_text = self.entry_listbox.get(selected_index[0])
-        uid_match = re.search(r'(\d+) -', selected_text)
-        if uid_match:
-            uid = int(uid_match.group(1))
-            if uid is None:
-                messagebox.showerror("错误", "无法获取条目 UID")
-                return
-
         updated_info = {
             'key': [k.strip() for k in self.key_entry.get().split(',') if k.strip()],
             'keysecondary': [k.strip() for k in self.keysecondary_entry.get().split(',') if
@@ -620,58 +946,121 @@ class WorldBookUI:
             updated_info[prop] = entry_field.get()
 
         if self.world_book_manager.update_entry(uid, updated_info):
-            self.update_entry_list()
+            self.reindex_entry(uid)
             messagebox.showinfo("成功", "条目已保存")
 
     def delete_entry(self):
         """Deletes the currently selected entry."""
-        selected_index = self.entry_listbox.curselection()
-        print(f"选中的索引: {selected_index}")
-        if not selected_index:
+        uid = self.entry_list.selected_uid
+        print(f"选中的 UID: {uid}")
+        if uid is None:
             return
 
-        selected_text = self.entry_listbox.get(selected_index[0])
-        print(f"选中的文本: {selected_text}")
-        uid_match = re.search(r'(\d+) -', selected_text)
-        if uid_match:
-            uid = int(uid_match.group(1))
-            print(f"解析出的 UID: {uid}")
-            if uid is None:
-                messagebox.showerror("错误", "无法获取条目 UID")
-                return
-
-            if messagebox.askyesno("确认", "确定要删除此条目吗？"):
-                print(f"准备删除 UID: {uid}")
-                if self.world_book_manager.delete_entry(uid):
-                    print(f"WorldBookManager 删除成功")
-                    self.update_entry_list()
-                    self.clear_edit_fields()
-                    self.save_button.config(state=tk.DISABLED)
-                    self.delete_button.config(state=tk.DISABLED)
-                    messagebox.showinfo("成功", "条目已删除")
-                else:
-                    print(f"WorldBookManager 删除失败")
-        else:
-            print(f"未找到匹配的 UID")
-            messagebox.showerror("错误", "无法解析条目 UID")
+        if messagebox.askyesno("确认", "确定要删除此条目吗？"):
+            print(f"准备删除 UID: {uid}")
+            if self.world_book_manager.delete_entry(uid):
+                print(f"WorldBookManager 删除成功")
+                self.entry_list.selected_uid = None
+                self.reindex_entry(uid)
+                self.clear_edit_fields()
+                self.save_button.config(state=tk.DISABLED)
+                self.delete_button.config(state=tk.DISABLED)
+                messagebox.showinfo("成功", "条目已删除")
+            else:
+                print(f"WorldBookManager 删除失败")
 
     def new_entry(self):
         """Creates a new worldbook entry."""
         new_entry_data = self.world_book_manager.create_entry()
-        if self.world_book_manager.worldbook_data is None:
-            self.world_book_manager.worldbook_data = {'entries': {}}
-        self.world_book_manager.worldbook_data['entries'][str(new_entry_data['uid'])] = new_entry_data
-        self.update_entry_list()
+        self.world_book_manager.add_entry(new_entry_data)
+        self.entry_list.selected_uid = new_entry_data['uid']
+        self.reindex_entry(new_entry_data['uid'])
+        self.entry_list.see(new_entry_data['uid'])
         self.populate_edit_fields(new_entry_data)
         self.save_button.config(state=tk.NORMAL)
         self.delete_button.config(state=tk.NORMAL)
 
     def update_entry_list(self):
-        """Updates the entry listbox with current worldbook entries."""
-        self.entry_listbox.delete(0, tk.END)
-        display_texts = self.world_book_manager.get_entries_list_display()
-        for text in display_texts:
-            self.entry_listbox.insert(tk.END, text)
+        """Refreshes the entry list; rebuilds the search index when a new worldbook was loaded."""
+        entries = self.world_book_manager.store.entries
+        if entries is not self._indexed_entries:
+            self._start_index_build(entries)
+        self.apply_filter()
+
+    def reindex_entry(self, uid: int):
+        """Updates the search index after one entry was added, edited or deleted."""
+        entry = self.world_book_manager.get_entry_by_uid(uid)
+        if entry is None:
+            self.search_index.remove(uid)
+        else:
+            self.search_index.add(uid, entry)
+        self._last_query = self._last_result = None
+        self.update_entry_list()
+
+    def _entry_row_text(self, uid: int) -> str:
+        entry = self.world_book_manager.get_entry_by_uid(uid)
+        return self.world_book_manager.format_entry_display(entry) if entry else ""
+
+    def _start_index_build(self, entries: Dict[str, dict]):
+        """分批建立搜索索引: 每次 after() 回调只工作 INDEX_BATCH_SECONDS，其余时间留给界面响应."""
+        if self._index_job:
+            self.root.after_cancel(self._index_job)
+            self._index_job = None
+        self._indexed_entries = entries
+        self.entry_list.selected_uid = None
+        self.search_index.clear()
+        self._index_queue = self.world_book_manager.store.uids()
+        self._index_pos = 0
+        self._last_query = self._last_result = None
+        if self._index_queue:
+            self._index_job = self.root.after(1, self._index_step)
+
+    def _index_step(self):
+        self._index_job = None
+        store = self.world_book_manager.store
+        deadline = time.perf_counter() + self.INDEX_BATCH_SECONDS
+        end = self._index_pos
+        while end < len(self._index_queue) and time.perf_counter() < deadline:
+            entry = store.get(self._index_queue[end])
+            if entry is not None:
+                self.search_index.add(self._index_queue[end], entry)
+            end += 1
+        self._index_pos = end
+        if end < len(self._index_queue):
+            self._index_job = self.root.after(1, self._index_step)
+            if self.search_var.get().strip():
+                self.status_label.config(text=f"正在建立搜索索引… {end}/{len(self._index_queue)}")
+            return
+        self._index_queue = []
+        self.apply_filter()
+
+    def on_search_change(self, *args):
+        """输入时延迟筛选，连续输入只在停顿后执行一次."""
+        if self._filter_job:
+            self.root.after_cancel(self._filter_job)
+        self._filter_job = self.root.after(self.SEARCH_DELAY_MS, self.apply_filter)
+
+    def apply_filter(self):
+        """按搜索框内容筛选条目；新查询是上一次查询的延续时，只在上一次的结果中继续筛选."""
+        self._filter_job = None
+        uids = self.world_book_manager.store.uids()
+        query = self.search_var.get().strip()
+        if not query:
+            self._last_query = self._last_result = None
+            self.entry_list.set_rows(uids)
+            self.status_label.config(text=f"共 {len(uids)} 个条目")
+            return
+        if self._index_queue:  # 索引尚未建完，完成后会自动再筛选一次
+            self.entry_list.set_rows(uids)
+            self.status_label.config(text=f"正在建立搜索索引… {self._index_pos}/{len(self._index_queue)}")
+            return
+        if self._last_result is not None and query.startswith(self._last_query):
+            result = self.search_index.search(query, self._last_result)
+        else:
+            result = self.search_index.search(query)
+        self._last_query, self._last_result = query, result
+        self.entry_list.set_rows([uid for uid in uids if uid in result])
+        self.status_label.config(text=f"匹配 {len(result)} / {len(uids)} 个条目")
 
 
 
@@ -715,7 +1104,71 @@ def find_sillytavern_worlds_path(initial_dir=None):
     return None
 
 
+def run_benchmark(sizes: List[int], lookups: int = 500):
+    """对比原先的线性扫描与 EntryStore 索引: 查找 / 分配 uid / 修改 / 删除+新建 / 标题查找."""
+    def linear_get(entries, uid):
+        return next((e for e in entries.values() if e["uid"] == uid), None)
+
+    def linear_next_uid(entries):
+        return max((e["uid"] for e in entries.values()), default=-1) + 1
+
+    def linear_find(entries, text):
+        text = text.lower()
+        return [e for e in entries.values() if e["comment"].lower() == text or text in (k.lower() for k in e["key"])]
+
+    def per_op(func, samples) -> float:
+        start = time.perf_counter()
+        for sample in samples:
+            func(sample)
+        return (time.perf_counter() - start) / len(samples) * 1e6
+
+    print(f"{'条目数':>8} {'操作':<12} {'线性扫描 (µs)':>14} {'索引 (µs)':>10} {'加速':>8}")
+    for size in sizes:
+        manager = WorldBookManager()
+        manager.worldbook_data = {"entries": {}}
+        manager.store.rebuild(manager.worldbook_data["entries"])
+        for i in range(size):
+            manager.add_entry(manager.create_entry({"key": [f"Key{i}"], "comment": f"条目 {i}"}))
+        entries = manager.worldbook_data["entries"]
+        rng = random.Random(size)
+        uids = [rng.randrange(size) for _ in range(lookups)]
+        titles = [f"key{uid}" for uid in uids]
+
+        def churn(uid):  # 删除后立即新建，新条目应复用刚释放的 uid
+            manager.delete_entry(uid)
+            manager.add_entry(manager.create_entry({"key": [f"Key{uid}"], "comment": f"条目 {uid}"}))
+
+        plain = {k: dict(e) for k, e in entries.items()}
+
+        def linear_churn(uid):  # 同样分配最小空闲 uid，但每一步都扫描全部条目
+            index = next(k for k, e in plain.items() if e["uid"] == uid)
+            entry = plain.pop(index)
+            used = {e["uid"] for e in plain.values()}
+            entry["uid"] = next(i for i in itertools.count() if i not in used)
+            plain[str(entry["uid"])] = entry
+
+        rows = [
+            ("查找", lambda u: linear_get(entries, u), manager.get_entry_by_uid, uids),
+            ("分配 uid", lambda u: linear_next_uid(entries), lambda u: manager._get_next_uid(), uids),
+            ("修改", lambda u: linear_get(entries, u).update({"order": 1}),
+             lambda u: manager.update_entry(u, {"order": 1}), uids),
+            ("标题查找", lambda t: linear_find(entries, t), manager.find_entries, titles),
+        ]
+        for name, linear, indexed, samples in rows:
+            slow, fast = per_op(linear, samples), per_op(indexed, samples)
+            print(f"{size:>8} {name:<12} {slow:>14.2f} {fast:>10.2f} {slow / fast:>7.0f}x")
+        with contextlib.redirect_stdout(io.StringIO()):  # delete_entry 会逐条打印日志
+            fast = per_op(churn, uids)
+            slow = per_op(linear_churn, uids)
+        print(f"{size:>8} {'删除+新建':<12} {slow:>14.2f} {fast:>10.2f} {slow / fast:>7.0f}x")
+
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--bench":
+        # --- 基准测试模式: python Lorebook世界书编辑.py --bench [条目数 ...] ---
+        run_benchmark([int(n) for n in sys.argv[2:]] or [2000, 20000])
+        sys.exit(0)
+
     root = tk.Tk()
     app = WorldBookApp(root)
 
@@ -1,13 +1,70 @@
 import json
 import os
 import shutil
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 from datetime import datetime
-from typing import List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 
 import yaml
 
+from worldbook_json import JSON_ERRORS, StreamingJsonWriter, atomic_write, decode_text, iter_worldbook_entries, read_ahead
+
+
+class _PreviousOutput:
+  """按 [字节偏移, 长度] 从上一次生成的世界书中取回条目或 content 的 JSON 文本，不解析整本世界书。"""
+
+  def __init__(self, path: Optional[str]):
+    try:
+      self._f = open(path, "rb") if path else None
+    except OSError:
+      self._f = None
+
+  def get(self, span: Optional[list], brackets: str = '""') -> Optional[str]:
+    """brackets 为取回的文本应有的首尾字符 (条目为 "{}"，字符串为 '""')，对不上时返回 None。"""
+    if self._f is None or not span:
+      return None
+    try:
+      self._f.seek(span[0])
+      raw = self._f.read(span[1]).decode("utf-8")
+    except (OSError, UnicodeDecodeError, TypeError, ValueError, IndexError):
+      return None
+    if len(raw) < 2 or raw[0] != brackets[0] or raw[-1] != brackets[1]:
+      return None
+    return raw.replace("\r\n", "\n")  # JSON 字符串里没有真正的换行，CRLF 只会来自 Windows 上的缩进换行
+
+  def close(self):
+    if self._f is not None:
+      self._f.close()  # Windows 上必须先关闭旧文件，才能替换为新生成的世界书
+
+
+class _UidPool:
+  """为新出现的文件/文件夹分配 uid: 先由小到大使用上次留下的空号，再从最大号之后递增。
+
+  缓存中记录过的 uid 都不会分出去，已有条目的 uid 因此在增删文件后保持不变。"""
+
+  def __init__(self, used: set):
+    top = max(used, default=-1)
+    self._free = [uid for uid in range(top, -1, -1) if uid not in used]  # 倒序存放，pop() 取最小的空号
+    self._next = top + 1
+
+  def take(self) -> int:
+    if self._free:
+      return self._free.pop()
+    self._next += 1
+    return self._next - 1
+
 
 class WorldbookManager:
+  # 生成缓存: 与输出的世界书放在一起，按 相对路径 记录每个文件的 mtime_ns + 大小、uid、生成的条目 (content 置空)，
+  # 以及条目与其 content 在上次输出中的字节位置；各文件夹记录起止分隔条目的 uid。
+  # 未变动的文件不读取：显示位置也没变时整段条目原样拷贝，否则只拷贝 content 并重新编码其余字段。
+  # 输出文件被改动过时重新读取全部文件，但 uid 仍沿用
+  BUILD_CACHE_SUFFIX = ".cache"
+  BUILD_CACHE_VERSION = 3
+  READ_WORKERS = 8  # 手机存储上单个文件的读取延迟占主导，与 CPU 核数无关
+  READ_AHEAD = READ_WORKERS * 4  # 最多提前读取的文件数，读完未写出的内容不会随文件数增长
+  FALLBACK_ENCODINGS = ("gb18030",)
 
   def __init__(self, root_dir: Optional[str] = None):
     self.root_dir = root_dir
@@ -268,8 +325,80 @@ class WorldbookManager:
         "fileSize": len(content.encode("utf-8")),
     }
 
+  def _ingest_file(self, file_path: str, cached: Optional[dict]) -> Tuple[list, Optional[str]]:
+    """线程池中执行: 返回 (stamp, 文件内容)；文件与缓存记录一致时不读取，内容为 None。"""
+    st = os.stat(file_path)
+    stamp = [st.st_mtime_ns, st.st_size]
+    if cached and cached["stamp"] == stamp:
+      return stamp, None
+    with open(file_path, "rb") as f:
+      return stamp, decode_text(f.read(), self.FALLBACK_ENCODINGS)
+
+  def _walk_sources(self) -> Iterator[Tuple[str, object, Optional[Tuple[str, str]]]]:
+    """按遍历顺序产出 (相对文件夹, 名称, (文件路径, 相对路径))；文件夹起始分隔条目的第三项为 None。"""
+    for folder_path, dirnames, filenames in os.walk(self.root_dir):
+      dirnames.sort()
+      filenames.sort()
+
+      relative_folder_path = os.path.relpath(folder_path, self.root_dir)
+      if relative_folder_path != ".":  # 检查是否为根目录的直接子目录/文件
+        current_folder_files = sorted([
+            os.path.splitext(f)[0]
+            for f in filenames
+            if f.endswith(('.txt', '.md', '.yaml', '.yml'))
+        ])
+        yield relative_folder_path, current_folder_files, None
+
+      rel_prefix = "" if relative_folder_path == "." else relative_folder_path.replace("\\", "/") + "/"
+      for file_name in filenames:
+        if file_name.endswith((".txt", ".md", ".yaml", ".yml")):
+          yield relative_folder_path, file_name, (os.path.join(folder_path, file_name), rel_prefix + file_name)
+
+  @staticmethod
+  def _depth_for_size(file_size: int) -> int:
+    if file_size <= 512:
+      return 4
+    elif file_size <= 1024:
+      return 5
+    elif file_size <= 1536:
+      return 6
+    elif file_size <= 2048:
+      return 7
+    return 8
+
+  @staticmethod
+  def _file_stamp(path: str) -> Optional[list]:
+    try:
+      st = os.stat(path)
+    except OSError:
+      return None
+    return [st.st_mtime_ns, st.st_size]
+
+  def _load_build_cache(self, cache_filepath: str, root_name: str, output_filepath: str) -> Tuple[dict, dict, Optional[bool]]:
+    """返回 (文件记录, 文件夹记录, 上次输出是否为紧凑格式)；上次的输出不可用时第三项为 None。"""
+    try:
+      with open(cache_filepath, "r", encoding="utf-8") as f:
+        cache = json.load(f)
+    except (OSError, ValueError):
+      return {}, {}, None
+    if not isinstance(cache, dict) or cache.get("version") != self.BUILD_CACHE_VERSION or cache.get("root") != root_name:
+      return {}, {}, None
+    # 输出文件被删除或改动过: 记录的字节位置不可信，但 uid 照样沿用
+    output_ok = cache.get("output") is not None and cache.get("output") == self._file_stamp(output_filepath)
+    return cache.get("files", {}), cache.get("folders", {}), cache.get("compact") if output_ok else None
+
+  def _save_build_cache(self, cache_filepath: str, root_name: str, output_filepath: str, compact: bool, files: dict, folders: dict):
+    cache = {"version": self.BUILD_CACHE_VERSION, "root": root_name, "output": self._file_stamp(output_filepath),
+             "compact": compact, "files": files, "folders": folders}
+    try:
+      with atomic_write(cache_filepath) as f:
+        f.write(json.dumps(cache, ensure_ascii=False, separators=(",", ":")))  # 记录里没有条目内容，一次性编码即可
+    except OSError as e:
+      print(f"  写入生成缓存 {cache_filepath} 失败: {e}")
+
   def generate_worldbook(
-      self, output_filename: str = "worldbook.json", identifier: str = "Ixia", user_tags: str = ""
+      self, output_filename: str = "worldbook.json", identifier: str = "Ixia", user_tags: str = "",
+      use_cache: bool = True, compact: bool = False
   ):
     if not self.root_dir:
       print("  错误：未设置根目录。请先使用 select_directory() 方法选择目录。")
@@ -279,8 +408,6 @@ class WorldbookManager:
     print("  开始生成 世界书.json 文件...")
     print("-" * 30)
 
-    entries = {}
-    uid_counter = 0
     display_index = 0
     folder_order = 99
     folder_stack = []
@@ -318,139 +445,159 @@ class WorldbookManager:
 ---
 }}""" % (formatted_date, tags_line, author_line)
 
-    entries[uid_counter] = {
-        "uid": uid_counter,
-        "key": [],
-        "keysecondary": [],
-        "comment": "【说明】",
-        "content": metadata_content,
-        "constant": True,
-        "vectorized": False,
-        "selective": False,
-        "selectiveLogic": 0,
-        "addMemo": True,
-        "order": 98,
-        "position": 0,
-        "disable": False,
-        "excludeRecursion": False,
-        "preventRecursion": False,
-        "delayUntilRecursion": False,
-        "probability": 100,
-        "matchWholeWords": None,
-        "useProbability": True,
-        "depth": 4,
-        "group": "",
-        "groupOverride": False,
-        "groupWeight": 100,
-        "scanDepth": None,
-        "caseSensitive": None,
-        "useGroupScoring": None,
-        "automationId": "",
-        "role": 1,
-        "sticky": 0,
-        "cooldown": 0,
-        "delay": 0,
-        "displayIndex": display_index,
-    }
-    uid_counter += 1
-    display_index += 1
-
     uploadFolderName = os.path.basename(self.root_dir)
     total_files_processed = 0
-
-    for folder_path, dirnames, filenames in os.walk(self.root_dir):
-      dirnames.sort()
-      filenames.sort()
-
-      relative_folder_path = os.path.relpath(folder_path, self.root_dir)
-      if relative_folder_path != ".":  # 检查是否为根目录的直接子目录/文件
-        current_folder_files = sorted([
-            os.path.splitext(f)[0]
-            for f in filenames
-            if f.endswith(('.txt', '.md', '.yaml', '.yml'))
-        ])
-
-        current_depth = relative_folder_path.replace("\\", "/").count("/")
-        entries[uid_counter] = self._create_divider_entry(
-            uid_counter,
-            display_index,
-            relative_folder_path,
-            current_folder_files,
-            True,
-            folder_order,
-        )
-        folder_stack.append(
-            {"path": relative_folder_path, "order": folder_order})
-        uid_counter += 1
+    identifier_for_filename = identifier if identifier else "Ixia"
+    output_filepath = f"「{identifier_for_filename}」-世界书 - {uploadFolderName}.json"
+    cache_filepath = output_filepath + self.BUILD_CACHE_SUFFIX
+    old_files, old_folders, old_compact = (
+        self._load_build_cache(cache_filepath, uploadFolderName, output_filepath) if use_cache else ({}, {}, None))
+    output_ok = old_compact is not None
+    new_files: Dict[str, dict] = {}
+    new_folders: Dict[str, list] = {}
+    reused_files = 0
+    # 已有的文件/文件夹沿用缓存中的 uid，新出现的从空号分配；没有缓存时等同于按遍历顺序编号
+    used_uids = {0} | {record["uid"] for record in old_files.values()} | {uid for pair in old_folders.values() for uid in pair if uid is not None}
+    uid_pool = _UidPool(used_uids)
+
+    def ingest(job):
+      _, _, source = job
+      return None if source is None else self._ingest_file(source[0], old_files.get(source[1]) if output_ok else None)
+
+    # 边遍历目录边把每个文件的 stat/读取/解码 交给线程池 (最多提前 READ_AHEAD 个)，按遍历顺序组装条目；
+    # 条目按顺序边生成边写入临时文件，全部成功后才替换输出文件
+    try:
+      with ThreadPoolExecutor(max_workers=self.READ_WORKERS) as pool, \
+          StreamingJsonWriter(output_filepath, compact=compact) as writer, \
+          closing(_PreviousOutput(output_filepath if output_ok else None)) as previous:
+        writer.add(0, {
+            "uid": 0,
+            "key": [],
+            "keysecondary": [],
+            "comment": "【说明】",
+            "content": metadata_content,
+            "constant": True,
+            "vectorized": False,
+            "selective": False,
+            "selectiveLogic": 0,
+            "addMemo": True,
+            "order": 98,
+            "position": 0,
+            "disable": False,
+            "excludeRecursion": False,
+            "preventRecursion": False,
+            "delayUntilRecursion": False,
+            "probability": 100,
+            "matchWholeWords": None,
+            "useProbability": True,
+            "depth": 4,
+            "group": "",
+            "groupOverride": False,
+            "groupWeight": 100,
+            "scanDepth": None,
+            "caseSensitive": None,
+            "useGroupScoring": None,
+            "automationId": "",
+            "role": 1,
+            "sticky": 0,
+            "cooldown": 0,
+            "delay": 0,
+            "displayIndex": display_index,
+        })
         display_index += 1
-        folder_order += 10
-        print(f"\n  处理文件夹: {relative_folder_path}")  # 关键：打印处理的文件夹
 
-      for file_name in filenames:
-        if file_name.endswith((".txt", ".md", ".yaml", ".yml")):
-          file_path = os.path.join(folder_path, file_name)
+        for (relative_folder_path, name, source), future in read_ahead(pool, ingest, self._walk_sources(), self.READ_AHEAD):
+          if source is None:  # 文件夹的起始分隔条目
+            cached_uids = old_folders.get(relative_folder_path) or [None, None]
+            start_uid = cached_uids[0] if cached_uids[0] is not None else uid_pool.take()
+            new_folders[relative_folder_path] = [start_uid, cached_uids[1]]  # 结束分隔条目的 uid 在写出时才分配
+            writer.add(start_uid, self._create_divider_entry(
+                start_uid,
+                display_index,
+                relative_folder_path,
+                name,
+                True,
+                folder_order,
+            ))
+            folder_stack.append(
+                {"path": relative_folder_path, "order": folder_order})
+            display_index += 1
+            folder_order += 10
+            print(f"\n  处理文件夹: {relative_folder_path}")  # 关键：打印处理的文件夹
+            continue
+
+          file_path, rel_path = source
+          order = 99 if relative_folder_path == "." else folder_order + 1
+          cached = old_files.get(rel_path)
+          raw_entry = raw_content = None
           try:
-            with open(file_path, "r", encoding="utf-8") as f:
-              content = f.read()
+            stamp, content = future.result()
+            if content is None:  # 文件未变
+              if old_compact == compact and (cached["entry"]["displayIndex"], cached["entry"]["order"]) == (display_index, order):
+                raw_entry = previous.get(cached["span"], "{}")
+              if raw_entry is None:
+                raw_content = previous.get(cached["content"])
+              if raw_entry is None and raw_content is None:  # 上次的输出里取不到，退回读取源文件
+                stamp, content = self._ingest_file(file_path, None)
           except Exception as e:
             print(f"  读取文件 {file_path} 失败: {e}")
             continue
-
-          info = self._extract_info(
-              content,
-              file_name,
-              relative_folder_path,
-              uploadFolderName,
-              uid_counter,
-              display_index,
-          )
-          if info:
-            depth = 4
-            file_size = info["fileSize"]
-            if file_size <= 512:
-              depth = 4
-            elif file_size <= 1024:
-              depth = 5
-            elif file_size <= 1536:
-              depth = 6
-            elif file_size <= 2048:
-              depth = 7
-            else:
-              depth = 8
-
-            order = 99 if relative_folder_path == "." else folder_order + 1
-            entries[uid_counter] = self._create_entry(info, order, depth)
-            uid_counter += 1
+          uid = cached["uid"] if cached else uid_pool.take()
+          if raw_entry is not None:
+            # 文件未变且位置未变: 整段条目原样拷贝
+            entry = cached["entry"]
+            span = writer.add_encoded(uid, raw_entry)
+            spans = span, [span[0] + cached["content"][0] - cached["span"][0], cached["content"][1]]
+            new_files[rel_path] = {"stamp": stamp, "uid": uid, "entry": entry, "span": spans[0], "content": spans[1]}
+            reused_files += 1
             display_index += 1
             total_files_processed += 1
-
-    while folder_stack:
-      folder_info = folder_stack.pop()
-      entries[uid_counter] = self._create_divider_entry(
-          uid_counter,
-          display_index,
-          f"{folder_info['path']}",
-          None,
-          False,
-          folder_info["order"] + 2,
-      )
-      uid_counter += 1
-      display_index += 1
-
-    worldbook = {"entries": entries}
-    output = json.dumps(worldbook, indent=2, ensure_ascii=False)
-
-    try:
-      identifier_for_filename = identifier if identifier else "Ixia"
-      output_filepath = f"「{identifier_for_filename}」-世界书 - {uploadFolderName}.json"
-      with open(output_filepath, "w", encoding="utf-8") as outfile:
-        outfile.write(output)
-      print(f"\n{'-' * 30}")
-      print(f"  世界书.json 文件生成成功: {output_filepath}")
-      print(f"  共处理了 {total_files_processed} 个文件。")
-      print(f"{'-' * 30}")
+            continue
+          if raw_content is not None:
+            # 文件未变: 沿用缓存的条目与上次输出中的内容，只更新显示位置与文件夹顺序
+            entry = dict(cached["entry"], uid=uid, displayIndex=display_index, order=order)
+            reused_files += 1
+          else:
+            info = self._extract_info(
+                content,
+                name,
+                relative_folder_path,
+                uploadFolderName,
+                uid,
+                display_index,
+            )
+            entry = self._create_entry(info, order, self._depth_for_size(info["fileSize"]))
+          spans = writer.add(uid, entry, locate="content", raw=raw_content)
+          new_files[rel_path] = {"stamp": stamp, "uid": uid, "entry": dict(entry, content=None), "span": spans[0], "content": spans[1]}
+          display_index += 1
+          total_files_processed += 1
+
+        while folder_stack:
+          folder_info = folder_stack.pop()
+          folder_uids = new_folders[folder_info["path"]]
+          if folder_uids[1] is None:
+            folder_uids[1] = uid_pool.take()
+          writer.add(folder_uids[1], self._create_divider_entry(
+              folder_uids[1],
+              display_index,
+              f"{folder_info['path']}",
+              None,
+              False,
+              folder_info["order"] + 2,
+          ))
+          display_index += 1
     except Exception as e:
       print(f"  生成 世界书.json 文件失败: {e}")
+      return
+
+    if use_cache:  # 输出文件每次都会重写，记录的输出 stamp 随之变化
+      self._save_build_cache(cache_filepath, uploadFolderName, output_filepath, compact, new_files, new_folders)
+    print(f"\n{'-' * 30}")
+    print(f"  世界书.json 文件生成成功: {output_filepath}")
+    print(f"  共处理了 {total_files_processed} 个文件。")
+    if reused_files:
+      print(f"  其中 {reused_files} 个文件未变动，直接使用了缓存。")
+    print(f"{'-' * 30}")
 
   def split_worldbook(self, json_filepath: str, output_file_ext: str = "txt"):
 
@@ -458,23 +605,9 @@ class WorldbookManager:
     print(f"  开始处理 JSON 文件: {json_filepath}")
     print(f"  文件扩展名: .{output_file_ext}")
     print("-" * 30)
-    try:
-      with open(json_filepath, "r", encoding="utf-8") as f:
-        worldbook_data = json.load(f)
-    except FileNotFoundError:
+    if not os.path.isfile(json_filepath):
       print(f"  错误: JSON 文件未找到: {json_filepath}")
       return
-    except json.JSONDecodeError:
-      print(
-          "  错误: JSON 文件解析失败，请检查文件 '{json_filepath}' 格式是否正确，可能不是有效的 JSON 文件。"
-      )
-      return
-
-    entries = worldbook_data.get("entries", {})
-    total_entries = len(entries)
-    processed_entries_count = 0
-
-    print(f"  共计 {total_entries} 个条目待处理...")
 
     json_filename_without_ext = os.path.splitext(os.path.basename(json_filepath))[
         0]
@@ -497,18 +630,27 @@ class WorldbookManager:
 
     os.makedirs(output_root_dir, exist_ok=True)
 
-    for entry_id, entry_data in entries.items():
-      processed_entries_count += 1
-      self._process_entry(
-          entry_data,
-          output_root_dir,
-          output_file_ext,
-          entry_id,
-          processed_entries_count,
-          total_entries,
+    # 条目逐个读取、逐个写出，不会把整本世界书与所有拆分结果同时留在内存中
+    processed_entries_count = 0
+    try:
+      for entry_id, entry_data in iter_worldbook_entries(json_filepath):
+        processed_entries_count += 1
+        self._process_entry(
+            entry_data,
+            output_root_dir,
+            output_file_ext,
+            entry_id,
+            processed_entries_count,
+        )
+    except JSON_ERRORS:
+      print(
+          f"\n  错误: JSON 文件解析失败，请检查文件 '{json_filepath}' 格式是否正确，可能不是有效的 JSON 文件。"
+          f" (已拆分 {processed_entries_count} 个条目)"
       )
+      return
 
     print(f"\n{'-' * 30}")
+    print(f"  共处理 {processed_entries_count} 个条目。")
     print(f"\n  世界书文件拆分处理完成，文件已保存到: {output_root_dir}")
     print(f"{'-' * 30}")
 
@@ -560,10 +702,9 @@ class WorldbookManager:
       output_file_ext: str,
       entry_id: str,
       processed_entries_count: int,
-      total_entries: int,
   ):
     print(
-        f"   处理条目 {processed_entries_count}/{total_entries} (ID: {entry_id})...",
+        f"   处理条目 {processed_entries_count} (ID: {entry_id})...",
         end="",
     )
 
@@ -588,7 +729,7 @@ class WorldbookManager:
 
     try:
       filepath = os.path.join(full_folder_path, file_name)
-      with open(filepath, "w", encoding="utf-8") as outfile:
+      with atomic_write(filepath) as outfile:
           if output_file_ext in ("yaml", "yml"):
               yaml.dump(content, outfile, allow_unicode=True)
           else:
@@ -678,9 +819,12 @@ if __name__ == "__main__":
         user_tags = input(
             "请输入标签，多个标签请用逗号分隔 (例如: 标签1,标签2,  如果不需要标签，请直接按 Enter 键): "
         ).strip()
+        compact = input(
+            "是否输出紧凑 JSON (无缩进，体积更小，适合只导入酒馆不再手动查看)? (y/n, 默认: n): "
+        ).strip().lower() == "y"
         worldbook_manager.root_dir = root_directory
         worldbook_manager.generate_worldbook(
-            identifier=identifier, user_tags=user_tags
+            identifier=identifier, user_tags=user_tags, compact=compact
         )
         print(f"\n  操作完成，请检查生成的 世界书.json 文件。")
       else:
@@ -2,9 +2,17 @@ import json
 import os
 import re
 import sys
-from typing import Optional, Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime
 
+from worldbook_json import StreamingJsonWriter, decode_text, read_ahead
+
+READ_WORKERS = 8  # 读取源文件的线程数 (I/O 等待为主)
+READ_AHEAD = READ_WORKERS * 4  # 最多提前读取的文件数，读完未写出的内容不会随文件数增长
+FALLBACK_ENCODINGS = ("gb18030",)
+
+
 # ==============================================================================
 #  部分 1: 世界书生成器 (文件夹 -> .json)
 # ==============================================================================
@@ -37,6 +45,15 @@ class WorldbookGenerator:
             print(f"  警告: 加载 {file_description} ({file_path}) 失败 - {e}。将使用空设置。")
             return {}
 
+    @staticmethod
+    def _read_source(file_path: str) -> Tuple[Optional[str], Optional[Exception]]:
+        """读取并解码一个源文件，返回 (内容, 错误)。"""
+        try:
+            with open(file_path, "rb") as f:
+                return decode_text(f.read(), FALLBACK_ENCODINGS), None
+        except Exception as e:
+            return None, e
+
     def _find_rule_for_file(self, file_name: str) -> dict:
         """根据文件名匹配并返回最合适的规则。"""
         for rule in self.rules:
@@ -70,38 +87,14 @@ class WorldbookGenerator:
             "comment": base_name, "content": content, "displayIndex": displayIndex,
         }
 
-    def generate_worldbook(self, identifier: str = "Touhou"):
+    def generate_worldbook(self, identifier: str = "Touhou", compact: bool = False):
         """执行生成过程。"""
         print(f"\n[生成器] 开始生成世界书 (从 '{self.root_dir}')...")
         
-        ordered_file_list = [f for f in self.processing_order if os.path.exists(os.path.join(self.source_texts_dir, f))]
+        paths = [(f, os.path.join(self.source_texts_dir, f)) for f in self.processing_order]
+        ordered_files = [(f, p) for f, p in paths if os.path.exists(p)]
         
-        entries = {}
-        uid_counter, display_index, total_files_processed = 1, 1, 0
-
-        for file_name in ordered_file_list:
-            file_path = os.path.join(self.source_texts_dir, file_name)
-            try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    content = f.read()
-
-                info = self._extract_info(content, file_name, uid_counter, display_index)
-                entry = self._create_entry(info, file_name)
-                
-                entries[str(uid_counter)] = entry
-                uid_counter += 1
-                display_index += 1
-                total_files_processed += 1
-                print(f"\r  处理中: {total_files_processed}/{len(ordered_file_list)} ({file_name})", end="")
-            except Exception as e:
-                print(f"\n  读取文件 {file_path} 失败: {e}")
-                continue
-        
-        print("\n")
         worldbook_name = os.path.basename(self.root_dir)
-        worldbook = {"name": worldbook_name, "entries": entries, "description": ""}
-        output = json.dumps(worldbook, indent=2, ensure_ascii=False)
-
         timestamp = datetime.now().strftime("%m-%d-%M")
         
         # --- 智能前缀逻辑 ---
@@ -112,14 +105,34 @@ class WorldbookGenerator:
             base_output_name = f"{prefix_to_add}{worldbook_name}"
         
         output_filepath = f"{base_output_name} ({timestamp}).json"
-        
+        uid_counter, display_index, total_files_processed = 1, 1, 0
+
+        # 文件在线程池中预读解码，仍按 processing_order 的顺序组装 (uid 与串行时一致)；
+        # 条目生成后立即写入临时文件，全部完成后才替换为输出文件
         try:
-            with open(output_filepath, "w", encoding="utf-8") as outfile:
-                outfile.write(output)
+            with ThreadPoolExecutor(max_workers=READ_WORKERS) as pool, \
+                    StreamingJsonWriter(output_filepath, compact=compact, head={"name": worldbook_name}, tail={"description": ""}) as writer:
+                for (file_name, file_path), future in read_ahead(pool, lambda job: self._read_source(job[1]), ordered_files, READ_AHEAD):
+                    content, error = future.result()
+                    if error:
+                        print(f"\n  读取文件 {file_path} 失败: {error}")
+                        continue
+                    try:
+                        info = self._extract_info(content, file_name, uid_counter, display_index)
+                        entry = self._create_entry(info, file_name)
+                    except Exception as e:
+                        print(f"\n  读取文件 {file_path} 失败: {e}")
+                        continue
+                    writer.add(str(uid_counter), entry)
+                    uid_counter += 1
+                    display_index += 1
+                    total_files_processed += 1
+                    print(f"\r  处理中: {total_files_processed}/{len(ordered_files)} ({file_name})", end="")
+            print("\n")
             print(f"世界书生成成功: {output_filepath}")
             print(f"共处理 {total_files_processed} 个文件。")
         except Exception as e:
-            print(f"生成文件失败: {e}")
+            print(f"\n生成文件失败: {e}")
 
 
 # ==============================================================================
@@ -289,6 +302,10 @@ def select_directory_interactive() -> Optional[str]:
         except (ValueError, IndexError): pass
         print("无效输入。")
 
+def ask_compact() -> bool:
+    """询问是否输出紧凑 JSON (无缩进，体积更小，适合只导入酒馆的文件)。"""
+    return input("是否输出紧凑 JSON (无缩进)? (y/N): ").strip().lower() in ("y", "yes")
+
 def select_file_interactive() -> Optional[str]:
     """交互式选择.json文件。"""
     files = [f for f in os.listdir('.') if f.lower().endswith('.json')]
@@ -323,7 +340,7 @@ if __name__ == "__main__":
             else:
                 identifier = input("请输入此世界书的识别名 (默认: Touhou): ").strip() or "Touhou"
                 generator = WorldbookGenerator(input_path)
-                generator.generate_worldbook(identifier)
+                generator.generate_worldbook(identifier, ask_compact())
         
         elif os.path.isfile(input_path) and input_path.lower().endswith('.json'):
             print("模式: 【分解】 (.json -> 文件夹)")
@@ -353,7 +370,7 @@ if __name__ == "__main__":
                 if target_dir:
                     identifier = input("请输入此世界书的识别名 (默认: Touhou): ").strip() or "Touhou"
                     generator = WorldbookGenerator(target_dir)
-                    generator.generate_worldbook(identifier)
+                    generator.generate_worldbook(identifier, ask_compact())
             elif choice == '0':
                 break
             else:
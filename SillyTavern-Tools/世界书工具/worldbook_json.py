@@ -0,0 +1,172 @@
+import codecs
+import json
+import os
+from collections import deque
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, IO, Iterable, Iterator, Optional, Sequence, Tuple
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# === 世界书 JSON 读写 ===
+# 生成时每个条目编码后立即写入临时文件，全部完成后 os.replace 原子替换，
+# 中途出错不会留下写了一半的世界书；拆分时装有 ijson 则边解析边产出条目。
+# 源文件由线程池预读，但最多只提前 window 个，已读未写的内容不会随文件数增长。
+# 两个生成器读取源文件时共用 decode_text 检测编码。
+
+JSON_ERRORS: Tuple[type, ...] = (json.JSONDecodeError,) + ((ijson.JSONError,) if ijson else ())
+_SPLICE_MARK = "\x00\x01splice\x01\x00"  # 文件名/文件夹名中不可能出现的占位字符串
+_SPLICE_MARK_JSON = json.dumps(_SPLICE_MARK)
+_COMPACT = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode  # 不缩进时走 C 加速的编码器
+_CONSTANTS = {None: "null", True: "true", False: "false"}
+_encode_string = json.encoder.encode_basestring  # ensure_ascii=False 时 json 用的字符串编码 (C 实现)
+
+
+def decode_text(data: bytes, fallbacks: Sequence[str] = ("gb18030",)) -> str:
+    """按 BOM -> UTF-8 -> 备选编码 的顺序只解码一次，换行符与文本模式读取时一样统一为 \\n。
+
+    所有备选编码都失败时抛出 UTF-8 的解码错误 (报告的位置对大多数文件更有意义)。"""
+    if data.startswith(codecs.BOM_UTF8):
+        text = data[len(codecs.BOM_UTF8):].decode("utf-8")
+    elif data.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        text = data.decode("utf-16")
+    else:
+        try:
+            text = data.decode("utf-8")
+        except UnicodeDecodeError as utf8_error:
+            for encoding in fallbacks:
+                try:
+                    text = data.decode(encoding)
+                    break
+                except UnicodeDecodeError:
+                    continue
+            else:
+                raise utf8_error
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+@contextmanager
+def atomic_write(path: str, encoding: str = "utf-8") -> Iterator[IO[str]]:
+    """写入同目录下的临时文件，成功后替换 path；出错时删除临时文件，原文件保持不变。"""
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "w", encoding=encoding) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        try: os.remove(tmp_path)
+        except OSError: pass
+        raise
+
+
+class StreamingJsonWriter:
+    """流式写出 {头部字段..., "entries": {键: 条目}, 尾部字段...}，不在内存中拼出整本世界书。
+
+    默认输出与 json.dumps(data, indent=2, ensure_ascii=False) 逐字节一致；
+    compact=True 时不缩进并使用 (",", ":") 分隔符，适合只给程序读取的文件。
+    offset 记录已写入的字节数 (按文本模式换行符转换后的实际字节计)，供调用方记下条目在文件中的位置。"""
+
+    def __init__(self, path: str, compact: bool = False, head: Optional[Dict[str, Any]] = None,
+                 tail: Optional[Dict[str, Any]] = None, items_key: str = "entries", indent: int = 2):
+        self.path, self.compact, self.indent = path, compact, indent
+        self.head, self.tail, self.items_key = head or {}, tail or {}, items_key
+        self.count = 0
+        self.offset = 0
+        self._fields = 0
+        self._newline_extra = len(os.linesep) - 1  # atomic_write 以文本模式写入，"\n" 会被转换为 os.linesep
+
+    def __enter__(self) -> "StreamingJsonWriter":
+        self._context = atomic_write(self.path)
+        self._f = self._context.__enter__()
+        self._write("{")
+        for key, value in self.head.items(): self._write_field(key, self._encode(value, 1), 1)
+        self._write_field(self.items_key, "{", 1)
+        return self
+
+    def _encode(self, value: Any, level: int) -> str:
+        if self.compact: return _COMPACT(value)
+        # json.dumps(indent=...) 只能用纯 Python 编码器，条目多时是生成的主要耗时；
+        # 这里自己展开非空的 dict/list，标量与空容器交给 C 编码器，结果与 json.dumps(indent=...) 相同
+        if isinstance(value, str): return _encode_string(value)
+        if value is None or value is True or value is False: return _CONSTANTS[value]
+        if type(value) is int: return int.__repr__(value)
+        if isinstance(value, dict) and value and all(isinstance(k, str) for k in value):
+            inner = self._newline(level + 1)
+            items = [f"{inner}{_encode_string(k)}: {self._encode(v, level + 1)}" for k, v in value.items()]
+            return "{" + ",".join(items) + self._newline(level) + "}"
+        if isinstance(value, (list, tuple)) and value:
+            inner = self._newline(level + 1)
+            return "[" + ",".join(inner + self._encode(v, level + 1) for v in value) + self._newline(level) + "]"
+        if isinstance(value, (dict, list, tuple)):  # 空容器，或键不全是字符串的 dict (交给 json 转换键)
+            return json.dumps(value, ensure_ascii=False, indent=self.indent).replace("\n", "\n" + " " * (self.indent * level))
+        return _COMPACT(value)  # 浮点数 (含 NaN/Infinity) 等其余情况
+
+    def _newline(self, level: int) -> str:
+        return "" if self.compact else "\n" + " " * (self.indent * level)
+
+    def _write(self, text: str):
+        self._f.write(text)
+        size = len(text) if text.isascii() else len(text.encode("utf-8"))
+        self.offset += size + self._newline_extra * text.count("\n") if self._newline_extra else size
+
+    def _write_field(self, key: Any, text: str, level: int):
+        separator = "," if (self.count if level == 2 else self._fields) else ""
+        colon = ":" if self.compact else ": "
+        self._write(f"{separator}{self._newline(level)}{_encode_string(str(key))}{colon}{text}")
+        if level == 1: self._fields += 1
+
+    def add(self, key: Any, entry: Any, locate: Optional[str] = None, raw: Optional[str] = None) -> Optional[Tuple[list, list]]:
+        """写入一个条目。locate 为字段名时返回 ([条目偏移, 长度], [该字段值的偏移, 长度]) (字节)，
+        raw 为该字段预先编码好的 JSON 文本 (例如从上次输出中按偏移取回的字符串)，原样写入不再编码。"""
+        if locate is None:
+            self._write_field(key, self._encode(entry, 2), 2)
+            self.count += 1
+            return None
+        value = raw if raw is not None else _encode_string(entry[locate]) if isinstance(entry[locate], str) else _COMPACT(entry[locate])
+        head, tail = self._encode(dict(entry, **{locate: _SPLICE_MARK}), 2).split(_SPLICE_MARK_JSON, 1)
+        self._write_field(key, "", 2)
+        entry_offset = self.offset
+        self._write(head)
+        value_offset = self.offset
+        self._write(value)
+        value_span = [value_offset, self.offset - value_offset]
+        self._write(tail)
+        self.count += 1
+        return [entry_offset, self.offset - entry_offset], value_span
+
+    def add_encoded(self, key: Any, text: str) -> list:
+        """写入已按同样格式编码好的条目文本 (例如从上次输出中原样取回的条目)，返回 [条目偏移, 长度]。"""
+        self._write_field(key, text, 2)
+        self.count += 1
+        size = len(text) if text.isascii() else len(text.encode("utf-8"))
+        size += self._newline_extra * text.count("\n")
+        return [self.offset - size, size]
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if exc_type is None:
+            self._write((self._newline(1) if self.count else "") + "}")
+            for key, value in self.tail.items(): self._write_field(key, self._encode(value, 1), 1)
+            self._write(self._newline(0) + "}")
+        return self._context.__exit__(exc_type, exc, tb)
+
+
+def read_ahead(pool: Executor, fn: Callable[[Any], Any], items: Iterable[Any], window: int) -> Iterator[Tuple[Any, Future]]:
+    """按 items 的顺序产出 (item, future)；取走一个才提交下一个，线程池中最多有 window 个任务。"""
+    pending: deque = deque()
+    for item in items:
+        pending.append((item, pool.submit(fn, item)))
+        if len(pending) >= window: yield pending.popleft()
+    while pending: yield pending.popleft()
+
+
+def iter_worldbook_entries(path: str) -> Iterator[Tuple[str, Any]]:
+    """逐个产出 entries 中的 (键, 条目)；装有 ijson 时边读边解析，否则一次性加载。"""
+    if ijson is None:
+        with open(path, "r", encoding="utf-8") as f:
+            yield from json.load(f).get("entries", {}).items()
+        return
+    with open(path, "rb") as f:
+        yield from ijson.kvitems(f, "entries", use_float=True)
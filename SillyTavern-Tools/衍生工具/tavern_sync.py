@@ -1,27 +1,55 @@
 #!/usr/bin/env python3
 import argparse
+import copy
+import difflib
+import hashlib
 import inspect
 import json
+import os
 import re
 import shutil
+import struct
 import subprocess
 import sys
+import tempfile
+import threading
 import zipfile
-from collections import defaultdict
+import zlib
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 from itertools import groupby
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple, Any
+from typing import List, Dict, Callable, Iterator, Optional, Tuple, Any
 
 import send2trash
 import yaml
 
+try: import tomllib
+except ImportError: tomllib = None  # Python < 3.11
+
+YamlSafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
 class AppSettings:
     SCRIPT_VERSION = "5.0"
     DEFAULT_WATCH_PORT = "6620"
+    DEFAULT_WATCH_DEBOUNCE_MS = "300"
+    DELTA_ACK_TIMEOUT = 5
+    EXTRACT_WRITERS = 4
+    PUBLISH_WORKERS = 4
+    PUBLISH_READ_AHEAD = 16
+    STORED_MEDIA_SUFFIXES = {".png", ".jpg", ".jpeg", ".webp", ".gif", ".avif", ".mp3", ".ogg", ".mp4", ".webm", ".zip", ".gz", ".7z"}
     GROUP_SEPARATOR = '&'
     COLLECTION_SUFFIXES = ("合集", "collection")
-    IGNORED_FILE_SUBSTRINGS = {".vscode", ".idea", ".DS_Store"}
+    IGNORED_FILE_SUBSTRINGS = {".vscode", ".idea", ".DS_Store", ".tavern_sync"}
+    SYNC_IGNORE_NAME = ".tavernsyncignore"
+    DEFAULT_SYNC_IGNORE = [".git/", "node_modules/", "__pycache__/"]
+    FORMAT_MANIFEST_NAME = ".tavern_sync_format"
+    PUSH_MANIFEST_NAME = ".tavern_sync_manifest"
+    PUBLISH_MANIFEST_NAME = ".tavern_sync_publish"
+    FORMAT_WORKERS = 4
+    SINGLE_FILE_FORMATTERS = {"yq"}  # yq -i 只会改写第一个文件，不能批量传参
+    YAML_FIXTURES_DIR = Path(__file__).resolve().parent / "tavern_sync_fixtures"
     ILLEGAL_WINDOWS_CHARS = ['<', '>', ':', '"', '/', '\\', '|', '?', '*']
     REPLACEMENT_CHARS = ['①', '②', '③', '④', '⑤', '⑥', '⑦', '⑧', '⑨']
     PUBLISH_README_CONTENT = """# 使用说明
@@ -48,6 +76,8 @@ class AppSettings:
   
   to_json   - 批量将文件夹内 .yaml 文件转换为 .json 文件。
   to_yaml   - 批量将文件夹内 .json 文件转换为 .yaml 文件。
+  check_yaml - 以 yq 为基准比对内置 YAML 输出；未安装 yq 或加 --fixtures 时比对保存的基准文件。
+  文件夹中可放置 .tavernsyncignore (语法同 .gitignore) 排除不属于世界书的文件/文件夹。
   其他详见文档 https://sillytaverm-stage-girls-dog.readthedocs.io/工具经验/世界书同步脚本/文件格式
 
   固有缺陷：因为是一对一的，处理不好注释同名的世界书，请做好区分
@@ -118,26 +148,179 @@ def _toggle_special_blocks(file_path: Path, mode: str):
     modified_content = _toggle_special_blocks_content(content, mode)
     if content != modified_content: file_path.write_text(modified_content, encoding='utf-8')
 
-def to_flow_yaml(path: Path) -> str:
-    original_content = path.read_text(encoding='utf-8')
-    lines = original_content.strip().splitlines()
-    start_match = re.match(r'^\s*#\s*:\s*<([^>]+)>', lines[0]) if lines else None
-    end_match = re.match(r'^\s*#\s*:\s*</([^>]+)>', lines[-1]) if lines else None
-    is_tagged = start_match and end_match and start_match.group(1) == end_match.group(1)
-    wrapper_start, wrapper_end, content_to_process = (lines[0], lines[-1], "\n".join(lines[1:-1])) if is_tagged else ("", "", original_content)
+# === 进程内 YAML 输出 (按 yq / go-yaml v3 的规则，免去每个文件一次 yq 子进程) ===
+
+class GoYamlResolver(yaml.resolver.BaseResolver):
+    """go-yaml v3 的隐式类型规则 (YAML 1.2): yes/no/on/off 等是字符串而非布尔值。"""
+
+for _tag, _regexp, _first in [
+    ('bool', r'^(?:true|True|TRUE|false|False|FALSE)$', 'tTfF'),
+    ('int', r'^[-+]?(?:0b[01_]+|0o?[0-7_]+|0x[0-9a-fA-F_]+|[0-9][0-9_]*)$', '-+0123456789'),
+    ('float', r'^(?:[-+]?(?:\.[0-9]+|[0-9][0-9_]*(?:\.[0-9_]*)?)(?:[eE][-+]?[0-9]+)?|[-+]?\.(?:inf|Inf|INF)|\.(?:nan|NaN|NAN))$', '-+0123456789.'),
+    ('merge', r'^<<$', '<'),
+    ('null', r'^(?:~|null|Null|NULL|)$', ['~', 'n', 'N', '']),
+    ('timestamp', r'^(?:[0-9]{4}-[0-9]{2}-[0-9]{2}|[0-9]{4}-[0-9]{1,2}-[0-9]{1,2}(?:[Tt]|[ \t]+)[0-9]{1,2}:[0-9]{2}:[0-9]{2}(?:\.[0-9]*)?(?:[ \t]*(?:Z|[-+][0-9]{1,2}(?::[0-9]{2})?))?)$', '0123456789'),
+]: GoYamlResolver.add_implicit_resolver(f'tag:yaml.org,2002:{_tag}', re.compile(_regexp), list(_first))
+
+class GoYamlLoader(yaml.reader.Reader, yaml.scanner.Scanner, yaml.parser.Parser, yaml.composer.Composer, yaml.constructor.SafeConstructor, GoYamlResolver):
+    # 用纯 Python 解析器: 需要节点在原文中的准确位置来判断是否含注释
+    def __init__(self, stream):
+        yaml.reader.Reader.__init__(self, stream); yaml.scanner.Scanner.__init__(self); yaml.parser.Parser.__init__(self)
+        yaml.composer.Composer.__init__(self); yaml.constructor.SafeConstructor.__init__(self); GoYamlResolver.__init__(self)
+        self.has_anchors = False
+
+    def compose_node(self, parent, index):
+        if self.check_event(yaml.AliasEvent) or getattr(self.peek_event(), 'anchor', None): self.has_anchors = True
+        return super().compose_node(parent, index)
+
+    def construct_go_int(self, node):
+        value = self.construct_scalar(node).replace('_', '')
+        return int(value, 8) if re.fullmatch(r'[-+]?0[0-7]+', value) else int(value, 0)
+
+GoYamlLoader.add_constructor('tag:yaml.org,2002:int', GoYamlLoader.construct_go_int)
+GoYamlLoader.add_constructor('tag:yaml.org,2002:timestamp', yaml.constructor.SafeConstructor.construct_yaml_str)
+
+class GoYamlDumper(yaml.emitter.Emitter, yaml.serializer.Serializer, GoYamlResolver):
+    def __init__(self, stream, canonical=None, indent=None, width=None, allow_unicode=None, line_break=None,
+                 encoding=None, explicit_start=None, explicit_end=None, version=None, tags=None):
+        yaml.emitter.Emitter.__init__(self, stream, canonical=canonical, indent=indent, width=width, allow_unicode=allow_unicode, line_break=line_break)
+        yaml.serializer.Serializer.__init__(self, encoding=encoding, explicit_start=explicit_start, explicit_end=explicit_end, version=version, tags=tags)
+        GoYamlResolver.__init__(self)
+
+    def increase_indent(self, flow=False, indentless=False):
+        return super().increase_indent(flow, False)  # go-yaml v3 会缩进映射下的列表
+
+    def choose_scalar_style(self):
+        # 字符串被隐式解析为其他类型 (如 "123", "true", "") 时，go-yaml 一律使用双引号
+        if not self.event.style and self.event.implicit == (False, True): return '"'
+        return super().choose_scalar_style()
+
+def _data_to_yaml_node(data: Any) -> yaml.Node:
+    if isinstance(data, dict):
+        return yaml.MappingNode('tag:yaml.org,2002:map', [(_data_to_yaml_node(str(k)), _data_to_yaml_node(v)) for k, v in data.items()])
+    if isinstance(data, list): return yaml.SequenceNode('tag:yaml.org,2002:seq', [_data_to_yaml_node(v) for v in data])
+    if isinstance(data, bool): return yaml.ScalarNode('tag:yaml.org,2002:bool', 'true' if data else 'false')
+    if data is None: return yaml.ScalarNode('tag:yaml.org,2002:null', 'null')
+    if isinstance(data, (int, float)): return yaml.ScalarNode(f"tag:yaml.org,2002:{'int' if isinstance(data, int) else 'float'}", repr(data))
+    return yaml.ScalarNode('tag:yaml.org,2002:str', str(data))
+
+def _has_comment(text: str, nodes: List[yaml.Node]) -> bool:
+    """标量之外出现 '#' 即为注释。"""
+    hashes = [m.start() for m in re.finditer('#', text)]
+    if not hashes: return False
+    spans, stack = [], list(nodes)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, yaml.ScalarNode): spans.append((node.start_mark.index, node.end_mark.index))
+        elif isinstance(node, yaml.MappingNode): stack.extend(x for pair in node.value for x in pair)
+        else: stack.extend(node.value)
+    return any(not any(s <= h < e for s, e in spans) for h in hashes)
+
+def emit_yaml_nodes(nodes: List[yaml.Node], flow: bool) -> str:
+    """等价于 yq '.. style="flow"' (flow=True) 或 yq '... style=""' (flow=False) 的输出。
+
+    '..' 只遍历值，映射的键保留原有引号风格；'...' 连键一起重置。"""
+    stack = [(node, True) for node in nodes]
+    while stack:
+        node, is_value = stack.pop()
+        if isinstance(node, yaml.ScalarNode):
+            if flow and not is_value: continue
+            # go-yaml 对多行字符串请求 literal 风格，flow 上下文中退化为双引号
+            node.style = ('"' if flow else '|') if '\n' in node.value else None
+            continue
+        node.flow_style = flow
+        if isinstance(node, yaml.MappingNode): stack.extend(x for k, v in node.value for x in ((k, False), (v, True)))
+        else: stack.extend((x, True) for x in node.value)
+    if not nodes: return ""
+    out = yaml.serialize_all(nodes, Dumper=GoYamlDumper, allow_unicode=True, width=1 << 31, indent=2)
+    return out[:-4] if out.endswith("\n...\n") else out
+
+def restyle_yaml(text: str, flow: bool) -> Optional[str]:
+    """进程内转换为 flow / block 风格 YAML；含注释或锚点时返回 None (交给 yq 原样保留)。
+
+    go-yaml 在 flow 输出中摆放注释的规则没有在这里复刻，带 '# ^标题' 行的合集文件和注释掉的特殊块
+    由 to_flow_yaml_batch 合并为一次 yq 调用处理。"""
+    loader = GoYamlLoader(text)
     try:
+        nodes = []
+        while loader.check_node(): nodes.append(loader.get_node())
+    finally: loader.dispose()
+    if loader.has_anchors or _has_comment(text, nodes): return None
+    return emit_yaml_nodes(nodes, flow)
+
+def convert_yaml_json(text: str, old_format: str, new_format: str) -> str:
+    """进程内等价于 yq '.. style=""' -p <old> -o <new>。"""
+    if old_format == "json": return emit_yaml_nodes([_data_to_yaml_node(json.loads(text))], flow=False)
+    return json.dumps(yaml.load(text, Loader=GoYamlLoader), indent=2, ensure_ascii=False) + "\n"
+
+_YQ_SPLIT_KEY = "__tavern_sync_split__"
+_YQ_SPLIT_PATTERN = re.compile(rf"^(?:---\n)?\{{{_YQ_SPLIT_KEY}: 1\}}\n(?:---\n)?", re.MULTILINE)
+
+def _yq_flow_batch(texts: List[str]) -> List[Optional[str]]:
+    """对每段 YAML 执行 yq '.. style="flow"'，合并为尽量少的 yq 调用 (按命令行长度分批)，失败的段返回 None。
+
+    每段写成临时文件作为单独的参数，yq 逐个文件解析，注释的归属与单独处理时相同；
+    文件之间插入哨兵文件来切分输出。整批失败或输出无法切分时逐个重试。未安装 yq 时抛出 FileNotFoundError。"""
+    results: List[Optional[str]] = [None] * len(texts)
+    command = ["yq", '.. style="flow"']
+    with tempfile.TemporaryDirectory(prefix="tavern_sync_") as tmp:
+        sentinel = Path(tmp, "split.yaml")
+        sentinel.write_text(f"{_YQ_SPLIT_KEY}: 1\n", encoding="utf-8")
+        paths = [Path(tmp, f"{i}.yaml") for i in range(len(texts))]
+        for path, text in zip(paths, texts): path.write_text(text, encoding="utf-8")
+        index = {path: i for i, path in enumerate(paths)}
+        # 每个文件后面还跟着一个哨兵参数，所以可用长度减半
+        for batch in _batch_paths(paths, len(os.fsencode(" ".join(command))) + 1, _command_line_limit() // 2):
+            try:
+                output = run_subprocess(command + [str(a) for path in batch for a in (path, sentinel)], stdout=subprocess.PIPE, stderr=subprocess.PIPE).stdout
+                chunks = _YQ_SPLIT_PATTERN.split(output)
+                if len(chunks) == len(batch) + 1 and not chunks[-1].strip():
+                    for path, chunk in zip(batch, chunks): results[index[path]] = chunk
+                    continue
+            except subprocess.CalledProcessError: pass
+            for path in batch:
+                try: results[index[path]] = run_subprocess(command + [str(path)], stdout=subprocess.PIPE).stdout
+                except subprocess.CalledProcessError: pass
+    return results
+
+def to_flow_yaml(path: Path) -> str:
+    return to_flow_yaml_batch({path: path.read_text(encoding='utf-8')})[path]
+
+def to_flow_yaml_batch(contents: Dict[Path, str]) -> Dict[Path, str]:
+    """批量转换为 flow-style YAML: 不含注释的文件在进程内转换，其余文件合并为一次 yq 调用。"""
+    prepared: Dict[Path, Tuple[str, str, bool, str]] = {}
+    flows: Dict[Path, Optional[str]] = {}
+    invalid = set()
+    for path, original_content in contents.items():
+        lines = original_content.strip().splitlines()
+        start_match = re.match(r'^\s*#\s*:\s*<([^>]+)>', lines[0]) if lines else None
+        end_match = re.match(r'^\s*#\s*:\s*</([^>]+)>', lines[-1]) if lines else None
+        is_tagged = bool(start_match and end_match and start_match.group(1) == end_match.group(1))
+        wrapper_start, wrapper_end, content_to_process = (lines[0], lines[-1], "\n".join(lines[1:-1])) if is_tagged else ("", "", original_content)
         commented = _toggle_special_blocks_content(content_to_process, 'comment')
-        flow = run_subprocess(["yq", '.. style="flow"'], input=commented, stdout=subprocess.PIPE).stdout.strip()
-        uncommented = _toggle_special_blocks_content(flow, 'uncomment')
-        return f"{wrapper_start}\n{uncommented}\n{wrapper_end}" if is_tagged else uncommented
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        print(f"警告: 无法将 '{path.name}' 转换为 flow-style YAML, 将按原样处理。")
-        return original_content
-
-def _split_entries(path: Path, content: str, file_type: str, should_trim: bool, comment_prefix: str) -> List[Entry]:
+        prepared[path] = (wrapper_start, wrapper_end, is_tagged, commented)
+        try: flows[path] = restyle_yaml(commented, flow=True)
+        except yaml.YAMLError: flows[path] = None; invalid.add(path)
+    external = [path for path, flow in flows.items() if flow is None and path not in invalid]
+    if external:
+        try: outputs = _yq_flow_batch([prepared[path][3] for path in external])
+        except FileNotFoundError: outputs = [None] * len(external)
+        flows.update(zip(external, outputs))
+    results = {}
+    for path, original_content in contents.items():
+        if flows[path] is None:
+            print(f"警告: 无法将 '{path.name}' 转换为 flow-style YAML, 将按原样处理。")
+            results[path] = original_content
+            continue
+        wrapper_start, wrapper_end, is_tagged, _ = prepared[path]
+        uncommented = _toggle_special_blocks_content(flows[path].strip(), 'uncomment')
+        results[path] = f"{wrapper_start}\n{uncommented}\n{wrapper_end}" if is_tagged else uncommented
+    return results
+
+def _split_entries(path: Path, content: str, file_type: str, should_trim: bool, comment_prefix: str, flow: Optional[str] = None) -> List[Entry]:
     processed_content = content
     if should_trim:
-        if file_type == "yaml": processed_content = to_flow_yaml(path)
+        if file_type == "yaml": processed_content = flow
         elif file_type == "json":
             lines = content.strip().splitlines()
             start_match = re.match(r'^\s*#\s*:\s*<([^>]+)>', lines[0]) if lines else None
@@ -151,38 +334,165 @@ def _split_entries(path: Path, content: str, file_type: str, should_trim: bool,
     codify_pattern = rf"( *){re.escape(comment_prefix)} :(.*)"
     return [Entry(title=m.group(2).strip(), file=path, content=re.sub(codify_pattern, r'\2', m.group(3)).rstrip(), spaces=m.group(1), type=file_type) for m in pattern.finditer(processed_content)]
 
+def _is_entry_file(path: Path) -> bool:
+    return path.is_file() and not any(sub in path.name for sub in AppSettings.IGNORED_FILE_SUBSTRINGS) and not path.stem.endswith("!")
+
+# === .tavernsyncignore ===
+# 语法同 .gitignore: # 注释, ! 取反, 结尾 / 只匹配文件夹, 含 / 的模式相对规则文件所在的文件夹, 支持 * ? [...] **。
+# 任意层级的文件夹中都可以放置规则文件；被忽略的文件夹在遍历时直接剪枝，不再向下扫描。
+
+def _translate_glob(pattern: str) -> str:
+    out, i, n = [], 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        at_segment = i == 0 or pattern[i - 1] == "/"
+        if at_segment and pattern.startswith("**/", i): out.append("(?:.*/)?"); i += 3; continue
+        if at_segment and pattern.startswith("**", i) and i + 2 == n: out.append(".*"); i += 2; continue
+        if c == "*": out.append("[^/]*")
+        elif c == "?": out.append("[^/]")
+        elif c == "\\" and i + 1 < n: i += 1; out.append(re.escape(pattern[i]))
+        elif c == "[" and (j := pattern.find("]", i + 2)) != -1:
+            body = pattern[i + 1:j].replace("\\", "\\\\")
+            out.append("[" + ("^" + body[1:] if body[0] in "!^" else body) + "]"); i = j
+        else: out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+class _IgnoreRule:
+    def __init__(self, line: str):
+        self.negate = line.startswith("!")
+        if self.negate: line = line[1:]
+        self.dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        self.anchored = "/" in line  # 不含 / 的模式匹配任意层级的同名文件/文件夹
+        self.regex = re.compile(_translate_glob(line.lstrip("/")))
+
+    def matches(self, rel: str, name: str, is_dir: bool) -> bool:
+        return (is_dir or not self.dir_only) and self.regex.fullmatch(rel if self.anchored else name) is not None
+
+class SyncIgnore:
+    """按 .tavernsyncignore 遍历条目文件: 用 os.scandir 逐层扫描，只凭 DirEntry 判断类型，结果按路径各级名称排序。"""
+    def __init__(self, root: Path):
+        self.root, self._resolved_root = root, root.resolve()
+        self.defaults = [_IgnoreRule(line) for line in AppSettings.DEFAULT_SYNC_IGNORE]
+        self._rules: Dict[Path, List[_IgnoreRule]] = {}
+
+    def _load(self, directory: Path) -> List[_IgnoreRule]:
+        if directory not in self._rules:
+            try: lines = (directory / AppSettings.SYNC_IGNORE_NAME).read_text(encoding="utf-8").splitlines()
+            except OSError: lines = []
+            lines = (re.sub(r"(?<!\\)\s+$", "", line) for line in lines)
+            self._rules[directory] = [_IgnoreRule(line) for line in lines if line and not line.startswith("#")]
+        return self._rules[directory]
+
+    def _with_rules(self, chain: list, directory: Path, prefix: str) -> list:
+        rules = self._load(directory)
+        return chain + [(prefix, rules)] if rules else chain
+
+    @staticmethod
+    def _ignored(chain: list, rel: str, name: str, is_dir: bool) -> bool:
+        ignored = False  # 后出现的规则优先，所以只需检查能改变当前结论的规则
+        for prefix, rules in chain:
+            for rule in rules:
+                if rule.negate == ignored and rule.matches(rel[len(prefix):], name, is_dir): ignored = not rule.negate
+        return ignored
+
+    def _chain(self, directory: Path) -> Optional[Tuple[list, str]]:
+        """返回 directory 上级各层的规则链与其相对路径前缀；directory 或其上级被忽略时返回 None。"""
+        chain, current, prefix = [("", self.defaults)], self.root, ""
+        for part in directory.resolve().relative_to(self._resolved_root).parts:
+            chain = self._with_rules(chain, current, prefix)
+            if any(sub in part for sub in AppSettings.IGNORED_FILE_SUBSTRINGS) or self._ignored(chain, prefix + part, part, True): return None
+            current, prefix = current / part, prefix + part + "/"
+        return chain, prefix
+
+    def is_ignored(self, path: Path) -> bool:
+        found = self._chain(path.parent)
+        if found is None: return True
+        chain, prefix = found
+        return self._ignored(self._with_rules(chain, path.parent, prefix), prefix + path.name, path.name, path.is_dir())
+
+    def walk(self, directory: Optional[Path] = None) -> Iterator[Path]:
+        directory = self.root if directory is None else directory
+        found = self._chain(directory)
+        if found: yield from self._walk(directory, found[1], found[0])
+
+    def _walk(self, directory: Path, prefix: str, chain: list) -> Iterator[Path]:
+        try:
+            with os.scandir(directory) as it: entries = sorted(it, key=lambda e: e.name)
+        except OSError: return
+        if any(e.name == AppSettings.SYNC_IGNORE_NAME for e in entries): chain = self._with_rules(chain, directory, prefix)
+        for e in entries:
+            if e.name == AppSettings.SYNC_IGNORE_NAME or any(sub in e.name for sub in AppSettings.IGNORED_FILE_SUBSTRINGS): continue
+            is_dir = e.is_dir(follow_symlinks=False)
+            if self._ignored(chain, prefix + e.name, e.name, is_dir): continue
+            if is_dir: yield from self._walk(directory / e.name, f"{prefix}{e.name}/", chain)
+            elif e.is_file() and not os.path.splitext(e.name)[0].endswith("!"): yield directory / e.name
+
 def read_entries(directory: Path, should_trim: bool, user_name: Optional[str]) -> List[Entry]:
-    entries = []
-    for path in directory.rglob("*"):
-        if not path.is_file() or any(sub in path.name for sub in AppSettings.IGNORED_FILE_SUBSTRINGS) or path.stem.endswith("!"): continue
-        content = extract_file_content(path, user_name)
-        if path.stem.endswith(AppSettings.COLLECTION_SUFFIXES):
-            file_type = path.suffix.strip('.')
-            comment_prefix, start_token = ("//", "// ^") if file_type == "json" else ("#", "# ^")
-            if not content.lstrip().startswith(start_token): raise RuntimeError(f"解析 '{path}' 出错, 合集文件开头必须是 '{start_token}条目名'")
-            collection_entries = _split_entries(path, content, file_type, should_trim, comment_prefix)
-            group_name = path.stem
-            for suffix in AppSettings.COLLECTION_SUFFIXES: group_name = group_name.removesuffix(suffix)
-            desanitized_group_name = desanitize_filename_component(group_name)
-            for entry in collection_entries: entry.title = f"{desanitized_group_name}{AppSettings.GROUP_SEPARATOR}{entry.title}"
-            entries.extend(collection_entries)
-        else:
-            file_type = path.suffix.strip('.')
-            if file_type == "yaml":
-                if should_trim: content = to_flow_yaml(path)
-                content = re.sub(r"( *)\# :(.*)", r'\2', content)
-            elif file_type == "json":
-                if should_trim:
-                    lines = content.strip().splitlines()
-                    start_match = re.match(r'^\s*#\s*:\s*<([^>]+)>', lines[0]) if lines else None
-                    end_match = re.match(r'^\s*#\s*:\s*</([^>]+)>', lines[-1]) if lines else None
-                    is_tagged = start_match and end_match and start_match.group(1) == end_match.group(1)
-                    def trim_logic(text: str) -> str: return re.sub(r'("[^"]*")|(\s+)(//.*\n)?', lambda m: m.group(1) or m.group(3), text)
-                    if is_tagged: content = f"{lines[0]}\n{trim_logic('\n'.join(lines[1:-1]))}\n{lines[-1]}"
-                    else: content = trim_logic(content)
-                content = re.sub(r"( *)// :(.*)", r'\2', content)
-            entries.append(Entry(title=desanitize_filename_component(path.stem), file=path, content=content.strip(), spaces="", type="normal"))
-    return entries
+    return [e for file_entries in read_files_entries(list(SyncIgnore(directory).walk()), should_trim, user_name).values() for e in file_entries]
+
+def read_file_entries(path: Path, should_trim: bool, user_name: Optional[str]) -> List[Entry]:
+    return read_files_entries([path], should_trim, user_name)[path]
+
+def read_files_entries(paths: List[Path], should_trim: bool, user_name: Optional[str]) -> Dict[Path, List[Entry]]:
+    """先读入全部文件，需要 yq 的 YAML 文件 (含注释) 合并为一次 yq 调用，再逐个解析出条目。"""
+    contents = {path: extract_file_content(path, user_name) for path in paths}
+    flows = to_flow_yaml_batch({path: content for path, content in contents.items() if path.suffix == ".yaml"}) if should_trim else {}
+    return {path: _parse_file_entries(path, content, should_trim, flows.get(path)) for path, content in contents.items()}
+
+def _parse_file_entries(path: Path, content: str, should_trim: bool, flow: Optional[str]) -> List[Entry]:
+    if path.stem.endswith(AppSettings.COLLECTION_SUFFIXES):
+        file_type = path.suffix.strip('.')
+        comment_prefix, start_token = ("//", "// ^") if file_type == "json" else ("#", "# ^")
+        if not content.lstrip().startswith(start_token): raise RuntimeError(f"解析 '{path}' 出错, 合集文件开头必须是 '{start_token}条目名'")
+        collection_entries = _split_entries(path, content, file_type, should_trim, comment_prefix, flow)
+        group_name = path.stem
+        for suffix in AppSettings.COLLECTION_SUFFIXES: group_name = group_name.removesuffix(suffix)
+        desanitized_group_name = desanitize_filename_component(group_name)
+        for entry in collection_entries: entry.title = f"{desanitized_group_name}{AppSettings.GROUP_SEPARATOR}{entry.title}"
+        return collection_entries
+    else:
+        file_type = path.suffix.strip('.')
+        if file_type == "yaml":
+            if should_trim: content = flow
+            content = re.sub(r"( *)\# :(.*)", r'\2', content)
+        elif file_type == "json":
+            if should_trim:
+                lines = content.strip().splitlines()
+                start_match = re.match(r'^\s*#\s*:\s*<([^>]+)>', lines[0]) if lines else None
+                end_match = re.match(r'^\s*#\s*:\s*</([^>]+)>', lines[-1]) if lines else None
+                is_tagged = start_match and end_match and start_match.group(1) == end_match.group(1)
+                def trim_logic(text: str) -> str: return re.sub(r'("[^"]*")|(\s+)(//.*\n)?', lambda m: m.group(1) or m.group(3), text)
+                if is_tagged: content = f"{lines[0]}\n{trim_logic('\n'.join(lines[1:-1]))}\n{lines[-1]}"
+                else: content = trim_logic(content)
+            content = re.sub(r"( *)// :(.*)", r'\2', content)
+        return [Entry(title=desanitize_filename_component(path.stem), file=path, content=content.strip(), spaces="", type="normal")]
+
+class EntryCache:
+    """watch 模式的条目缓存: 文件路径 -> 解析出的条目；文件变动时只重新解析变动的文件。"""
+    def __init__(self, directory: Path, should_trim: bool, user_name: Optional[str]):
+        self.directory, self.should_trim, self.user_name = directory, should_trim, user_name
+        self.by_file: Dict[Path, List[Entry]] = {}
+        self.ignore = SyncIgnore(directory)
+        self.refresh([directory])
+
+    def refresh(self, paths: List[Path]):
+        if any(path.name == AppSettings.SYNC_IGNORE_NAME for path in paths):  # 忽略规则变了，整个文件夹重新遍历
+            self.by_file.clear()
+            self.ignore = SyncIgnore(self.directory)
+            paths = [self.directory]
+        files = []
+        for path in paths:
+            key = path.resolve()
+            if path.is_dir(): files.extend(self.ignore.walk(path))
+            elif _is_entry_file(path) and not self.ignore.is_ignored(path): files.append(path)
+            else:  # 文件或整个文件夹被删除/重命名
+                for stale in [k for k in self.by_file if k == key or key in k.parents]: del self.by_file[stale]
+        for path, file_entries in read_files_entries(files, self.should_trim, self.user_name).items(): self.by_file[path.resolve()] = file_entries
+
+    def entries(self) -> List[Entry]:
+        return [e for file_entries in self.by_file.values() for e in file_entries]
 
 def write_entries(entries: List[Entry]):
     for file, grouped_entries in groupby(sorted(entries, key=lambda x: x.file), key=lambda x: x.file):
@@ -200,26 +510,90 @@ def read_json(json_file: Path) -> dict:
 def write_json(json_file: Path, data: dict):
     with json_file.open("w", encoding="utf-8") as f: json.dump(data, f, indent=4, ensure_ascii=False)
 
-def push_impl(directory: Path, json_data: dict, user_name: Optional[str], should_trim: bool) -> Tuple[bool, dict]:
-    entries = read_entries(directory, should_trim, user_name)
+class PushManifest:
+    """.tavern_sync_manifest: 记录上次成功推送时每个世界书条目 (uid) 对应的标题、本地文件与内容哈希。"""
+    def __init__(self, directory: Path, lorebook_name: str):
+        self.path, self.lorebook_name = directory / AppSettings.PUSH_MANIFEST_NAME, lorebook_name
+        self.entries: Dict[str, Dict[str, str]] = {}
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            if data.get("lorebook") == lorebook_name: self.entries = data.get("entries", {})
+        except (OSError, ValueError, AttributeError): pass
+        self.pending: Dict[str, Dict[str, str]] = {}
+        self.report: Dict[str, List[str]] = {"added": [], "changed": [], "removed": []}
+
+    @staticmethod
+    def digest(content: str) -> str:
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+
+    def print_report(self):
+        if not self.entries: return print(f"首次推送, 记录 {len(self.pending)} 个条目。")
+        if not any(self.report.values()): return print("自上次推送以来本地条目无变化。")
+        for key, label in (("added", "新增"), ("changed", "修改"), ("removed", "移除")):
+            if self.report[key]: print(f"{label} {len(self.report[key])} 个: {', '.join(self.report[key])}")
+
+    def commit(self):
+        if self.pending == self.entries: return  # 无变化时不重写清单
+        self.entries = self.pending
+        self.path.write_text(json.dumps({"lorebook": self.lorebook_name, "entries": self.entries}, ensure_ascii=False, indent=1), encoding="utf-8")
+
+def push_impl(directory: Path, json_data: dict, user_name: Optional[str], should_trim: bool, entries: Optional[List[Entry]] = None,
+              manifest: Optional[PushManifest] = None, changed_only: bool = False) -> Tuple[bool, dict]:
+    if entries is None: entries = read_entries(directory, should_trim, user_name)
     changed = False
+    json_entries = json_data.get("entries", {})
+
+    prefix = os.path.join(str(directory), "")
+    def relative(e: Entry) -> str:  # 等同于 relative_to(directory).as_posix()，但不构造 Path，条目多时快得多
+        path = str(e.file)
+        return path[len(prefix):].replace(os.sep, "/") if path.startswith(prefix) else e.file.as_posix()
+
+    # 标题、内容哈希与文件都和上次推送时一致的条目直接按清单 (标题 -> 哈希 -> uid) 找回，
+    # 只有新增、改名、移动或改过内容的条目才需要下面按标题的完整匹配
+    unchanged: Dict[str, Tuple[Entry, str]] = {}
+    unmatched = entries
+    if manifest and manifest.entries:
+        uids_by_content = defaultdict(list)
+        for uid, record in manifest.entries.items(): uids_by_content[(record.get("title"), record.get("hash"))].append(uid)
+        unmatched = []
+        for e in entries:
+            digest = PushManifest.digest(e.content)
+            file = relative(e)
+            uid = next((uid for uid in uids_by_content.get((e.title, digest), ()) if manifest.entries[uid].get("file") == file
+                        and uid not in unchanged and json_entries.get(uid, {}).get("comment", "").strip() == e.title), None)
+            if uid is None: unmatched.append(e)
+            else: unchanged[uid] = (e, digest)
 
     local_entries_by_title = defaultdict(list)
-    for e in entries:
+    for e in unmatched:
         local_entries_by_title[e.title].append(e)
 
-    for entry_data in json_data.get("entries", {}).values():
+    for uid, entry_data in json_entries.items():
         title = entry_data.get("comment", "").strip()
+        record = manifest.entries.get(str(uid)) if manifest else None
 
-        if title in local_entries_by_title and local_entries_by_title[title]:
-            matching_entry = local_entries_by_title[title].pop(0)
-
-            if entry_data.get("content", "").strip() != matching_entry.content.strip():
-                entry_data["content"] = matching_entry.content
-                changed = True
+        if str(uid) in unchanged:
+            matching_entry, digest = unchanged[str(uid)]
+            manifest.pending[str(uid)] = {"title": title, "file": relative(matching_entry), "hash": digest}
+            if changed_only: continue
+        elif local_entries_by_title[title]:
+            candidates = local_entries_by_title[title]
+            # 同名条目优先匹配上次推送时对应的文件，不受文件遍历顺序影响
+            index = next((i for i, e in enumerate(candidates) if record and record.get("file") == relative(e)), 0)
+            matching_entry = candidates.pop(index)
+            digest = PushManifest.digest(matching_entry.content)
+            if manifest:
+                if record is None: manifest.report["added"].append(title)
+                elif record.get("hash") != digest: manifest.report["changed"].append(title)
+                manifest.pending[str(uid)] = {"title": title, "file": relative(matching_entry), "hash": digest}
+            if changed_only and record and record.get("hash") == digest: continue
         else:
             raise RuntimeError(f"未找到酒馆世界书中条目 '{title}' 对应的文件，或本地同名文件数量少于酒馆世界书中的条目数量。")
 
+        if entry_data.get("content", "").strip() != matching_entry.content.strip():
+            entry_data["content"] = matching_entry.content
+            changed = True
+
     leftover_entries = []
     for title, entry_list in local_entries_by_title.items():
         if entry_list:
@@ -228,37 +602,103 @@ def push_impl(directory: Path, json_data: dict, user_name: Optional[str], should
     if leftover_entries:
         raise RuntimeError(f"未能在酒馆世界书中找到以下本地文件对应的条目: {', '.join(leftover_entries)}")
 
+    if manifest: manifest.report["removed"] = [r["title"] for uid, r in manifest.entries.items() if uid not in manifest.pending]
+
     if 'originalData' in json_data:
         del json_data['originalData']
         changed = True
 
     return changed, json_data
 
-def push(directory: Path, lorebook_file: Path, user_name: Optional[str], no_trim: bool, need_confirm: bool):
+def push(directory: Path, lorebook_file: Path, user_name: Optional[str], no_trim: bool, need_confirm: bool, changed_only: bool = False):
     if need_confirm and not confirm_action("将本地修改推送到世界书文件?"): return print("取消推送")
     json_data = read_json(lorebook_file)
-    changed, updated_json_data = push_impl(directory, json_data, user_name, not no_trim)
+    manifest = PushManifest(directory, lorebook_file.name)
+    changed, updated_json_data = push_impl(directory, json_data, user_name, not no_trim, manifest=manifest, changed_only=changed_only)
+    manifest.print_report()
     if changed:
         write_json(lorebook_file, updated_json_data)
         print("世界书已更新并成功推送。")
     else: print("内容无变化，无需推送。")
+    manifest.commit()
+
+def _command_line_limit() -> int:
+    """单次命令行参数可用的字节数 (扣除环境变量并留出余量)。"""
+    if sys.platform == "win32": return 30000  # CreateProcess 上限 32767 字符
+    try: limit = os.sysconf("SC_ARG_MAX")
+    except (ValueError, OSError, AttributeError): limit = 131072
+    env_size = sum(len(k) + len(v) + 2 for k, v in os.environ.items())
+    return max(4096, min(limit - env_size - 4096, 1 << 20))
+
+def _batch_paths(paths: List[Path], base_size: int, limit: int) -> List[List[Path]]:
+    batches, current, size = [], [], base_size
+    for path in paths:
+        n = len(os.fsencode(path)) + 1
+        if current and size + n > limit: batches.append(current); current, size = [], base_size
+        current.append(path); size += n
+    if current: batches.append(current)
+    return batches
+
+def _run_formatter_batch(command: List[str], batch: List[Path]) -> List[Path]:
+    """一次格式化一批文件，返回失败的文件；整批失败时逐个重试找出无效文件。"""
+    for file_path in batch: _toggle_special_blocks(file_path, 'comment')
+    try:
+        try: run_subprocess(command + [str(p) for p in batch]); return []
+        except subprocess.CalledProcessError:
+            if len(batch) == 1: return batch
+        failed = []
+        for file_path in batch:
+            try: run_subprocess(command + [str(file_path)])
+            except subprocess.CalledProcessError: failed.append(file_path)
+        return failed
+    finally:
+        for file_path in batch:
+            try: _toggle_special_blocks(file_path, 'uncomment')
+            except Exception: pass
+
+def _file_digest(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+def _load_format_manifest(directory: Path) -> Dict[str, str]:
+    try: return json.loads((directory / AppSettings.FORMAT_MANIFEST_NAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError): return {}
 
 def format_files(directory: Path, extension: str, command: List[str]):
     files = [p for p in directory.rglob(f"*.{extension}") if p.is_file()]
     if not files: return
-    try: run_subprocess([command[0], "--version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    except (FileNotFoundError, subprocess.CalledProcessError): return print(f"警告: 未找到 '{command[0]}', 跳过 .{extension} 文件格式化。")
-    for file_path in files:
+    # 清单记录每个文件上次格式化后的哈希，内容未变的文件直接跳过
+    manifest = _load_format_manifest(directory)
+    keys = {p: p.relative_to(directory).as_posix() for p in files}
+    pending = [p for p in files if manifest.get(keys[p]) != _file_digest(p)]
+    invalid: List[Path] = []
+    if extension == "yaml":
+        # 不含注释 (特殊块) 和锚点的 YAML 在进程内格式化，其余仍交给 yq
+        external = []
+        for file_path in pending:
+            original = file_path.read_text(encoding='utf-8')
+            try: formatted = restyle_yaml(_toggle_special_blocks_content(original, 'comment'), flow=False)
+            except yaml.YAMLError: invalid.append(file_path); continue
+            if formatted is None: (external if is_valid_file(file_path, extension) else invalid).append(file_path)
+            elif formatted != original: file_path.write_text(formatted, encoding='utf-8')
+        pending = external
+    unformatted: List[Path] = []
+    if pending:
         try:
-            _toggle_special_blocks(file_path, 'comment')
-            run_subprocess(command + [str(file_path)])
-            _toggle_special_blocks(file_path, 'uncomment')
-        except subprocess.CalledProcessError:
-            print(f"格式化 '{file_path.name}' 失败, 可能不是有效的 {extension}。已跳过。")
-            try: _toggle_special_blocks(file_path, 'uncomment')
-            except Exception: pass
-            file_path.rename(file_path.with_suffix(".md"))
-            print(f" -> 已将 '{file_path.name}' 重命名为 '{file_path.with_suffix('.md').name}'")
+            run_subprocess([command[0], "--version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            if command[0] in AppSettings.SINGLE_FILE_FORMATTERS: batches = [[p] for p in pending]
+            else: batches = _batch_paths(pending, len(os.fsencode(" ".join(command))) + 1, _command_line_limit())
+            with ThreadPoolExecutor(max_workers=min(AppSettings.FORMAT_WORKERS, len(batches))) as pool:
+                for failed in pool.map(partial(_run_formatter_batch, command), batches): invalid.extend(failed)
+        except (FileNotFoundError, subprocess.CalledProcessError):
+            print(f"警告: 未找到 '{command[0]}', 跳过 .{extension} 文件格式化。")
+            unformatted = pending
+    for file_path in invalid:
+        print(f"格式化 '{file_path.name}' 失败, 可能不是有效的 {extension}。已跳过。")
+        file_path.rename(file_path.with_suffix(".md"))
+        print(f" -> 已将 '{file_path.name}' 重命名为 '{file_path.with_suffix('.md').name}'")
+    updated = {k: v for k, v in manifest.items() if not k.endswith(f".{extension}")}
+    updated.update({keys[p]: _file_digest(p) for p in files if p.exists() and p not in unformatted})
+    if updated != manifest: (directory / AppSettings.FORMAT_MANIFEST_NAME).write_text(json.dumps(updated, ensure_ascii=False, indent=1), encoding="utf-8")
 
 def pull(directory: Path, lorebook_file: Path, user_name: Optional[str], need_confirm: bool):
     if need_confirm and not confirm_action("将世界书文件拉取到本地?"): return print("取消拉取")
@@ -275,11 +715,31 @@ def pull(directory: Path, lorebook_file: Path, user_name: Optional[str], need_co
     format_files(directory, "yaml", ["yq", '... style=""', "-i"])
     print("成功拉取")
 
+_content_validation_cache: Dict[Tuple[str, str], bool] = {}
+
 def is_valid_format(content: str, extension: str) -> bool:
+    """进程内等价于 yq -p <ext> -e: 能解析且结果不是 null/false。相同内容只校验一次 (按摘要缓存，不保留内容本身)。"""
+    key = (hashlib.sha1(content.encode("utf-8")).hexdigest(), extension)
+    if key in _content_validation_cache: return _content_validation_cache[key]
     try:
-        run_subprocess(["yq", "-p", extension, "-e"], input=content, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        return True
-    except (subprocess.CalledProcessError, FileNotFoundError): return False
+        if extension == "json": data = json.loads(content)
+        elif extension == "yaml": data = yaml.load(content, Loader=YamlSafeLoader)
+        elif extension == "toml" and tomllib: data = tomllib.loads(content)
+        else: data = None
+    except (ValueError, yaml.YAMLError): data = None  # TOMLDecodeError 也是 ValueError
+    _content_validation_cache[key] = valid = data is not None and data is not False
+    return valid
+
+_file_validation_cache: Dict[str, Tuple[int, int, str, bool]] = {}
+
+def is_valid_file(path: Path, extension: str) -> bool:
+    """按 (路径, mtime_ns, 大小) 缓存文件的校验结果，未改动的文件在本次运行 (含 watch 的每一轮) 中不会重复解析。"""
+    st = path.stat()
+    cached = _file_validation_cache.get(str(path))
+    if cached and cached[:3] == (st.st_mtime_ns, st.st_size, extension): return cached[3]
+    valid = is_valid_format(_toggle_special_blocks_content(path.read_text(encoding='utf-8'), 'comment'), extension)
+    _file_validation_cache[str(path)] = (st.st_mtime_ns, st.st_size, extension, valid)
+    return valid
 
 def _detect_format(content: str) -> Tuple[str, str, str]:
     stripped = content.strip()
@@ -294,6 +754,112 @@ def _detect_format(content: str) -> Tuple[str, str, str]:
     if re.search(r"^\s*[^\s:]+\s*:\s+.+", parsable, re.MULTILINE) and is_valid_format(parsable, "yaml"): return writing, ".yaml", "#"
     return writing, ".md", "#"
 
+class _JsonObjectStream:
+    """极简增量 JSON 读取 (未安装 ijson 时使用): 只逐项展开顶层对象中指定键的对象值，其余值扫描跳过而不构造。"""
+    CHUNK_SIZE = 1 << 16
+    _WHITESPACE = re.compile(r'[ \t\n\r]*')
+    _STRUCTURAL = re.compile(r'[\\"{}\[\]]')
+
+    def __init__(self, f):
+        self.f, self.buf, self.pos, self.eof = f, "", 0, False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self.eof: return False
+        chunk = self.f.read(max(self.CHUNK_SIZE, len(self.buf) - self.pos))  # 待解析的值越大读得越多，避免反复重试
+        if not chunk: self.eof = True; return False
+        self.buf, self.pos = self.buf[self.pos:] + chunk, 0
+        return True
+
+    def _peek(self) -> str:
+        while True:
+            self.pos = self._WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf): return self.buf[self.pos]
+            if not self._fill(): raise ValueError("JSON 意外结束")
+
+    def _expect(self, char: str):
+        if self._peek() != char: raise ValueError(f"JSON 格式错误: 位置 {self.pos} 处应为 '{char}'")
+        self.pos += 1
+
+    def _value(self) -> Any:
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                if end < len(self.buf) or self.eof: self.pos = end; return value  # 数字可能恰好被截断在缓冲区末尾
+            except json.JSONDecodeError:
+                if self.eof: raise
+            self._fill()
+
+    def _skip(self):
+        if self._peek() not in '{[': return self._value()
+        depth, in_string = 0, False
+        while True:
+            m = self._STRUCTURAL.search(self.buf, self.pos)
+            if m is None or (m.group() == '\\' and m.end() >= len(self.buf)):
+                self.pos = len(self.buf) if m is None else m.start()
+                if not self._fill(): raise ValueError("JSON 意外结束")
+                continue
+            char, self.pos = m.group(), m.end()
+            if in_string:
+                if char == '\\': self.pos += 1
+                elif char == '"': in_string = False
+            elif char == '"': in_string = True
+            elif char in '{[': depth += 1
+            elif char in '}]':
+                depth -= 1
+                if depth == 0: return
+
+    def iter_items(self, key: str) -> Iterator[Any]:
+        self._expect('{')
+        if self._peek() == '}': return
+        while True:
+            name = self._value()
+            self._expect(':')
+            if name == key and self._peek() == '{':
+                self.pos += 1
+                while self._peek() != '}':
+                    self._value()
+                    self._expect(':')
+                    yield self._value()
+                    if self._peek() == ',': self.pos += 1
+                self.pos += 1
+            else: self._skip()
+            if self._peek() != ',': return self._expect('}')
+            self.pos += 1
+
+def iter_lorebook_entries(lorebook_file: Path) -> Iterator[dict]:
+    """逐个产出世界书 entries 中的条目，内存占用与文件大小无关 (优先使用 ijson)。"""
+    try: import ijson
+    except ImportError: ijson = None
+    if ijson:
+        with lorebook_file.open("rb") as f:
+            for _, entry in ijson.kvitems(f, "entries", use_float=True): yield entry
+    else:
+        with lorebook_file.open("r", encoding="utf-8") as f: yield from _JsonObjectStream(f).iter_items("entries")
+
+class _BoundedWriter:
+    """有界写文件线程池: 同时排队的写入数有上限，解析速度超过磁盘时主线程会等待，内存不会堆积。"""
+    def __init__(self, workers: int):
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.slots = threading.BoundedSemaphore(workers * 4)
+        self.last: Dict[Path, Any] = {}
+
+    def _release(self, future):
+        self.slots.release()
+
+    def submit(self, path: Path, text: str):
+        previous = self.last.get(path)
+        if previous: previous.result()  # 同名文件保持 "后写覆盖先写"
+        self.slots.acquire()
+        future = self.pool.submit(path.write_text, text, encoding='utf-8')
+        future.add_done_callback(self._release)
+        self.last[path] = future
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        for future in self.last.values(): future.result()
+
 def extract(directory: Path, lorebook_file: Path, no_detect: bool, group: bool, need_confirm: bool):
     action_desc = f"将 {lorebook_file.name} 提取到 {directory}"
     if group: action_desc += " (并合并 '合集名&条目名' 格式的条目)"
@@ -302,34 +868,84 @@ def extract(directory: Path, lorebook_file: Path, no_detect: bool, group: bool,
         if need_confirm and not confirm_action("提取目标文件夹非空, 将清空并继续?"): return print("操作因文件夹非空而取消。")
         send2trash.send2trash(str(directory))
     directory.mkdir(parents=True, exist_ok=True)
-    json_data = read_json(lorebook_file)
-    single_entries, grouped_entries = [], defaultdict(list)
-    for entry in json_data.get("entries", {}).values():
-        title = entry.get("comment", "").strip()
-        if group and AppSettings.GROUP_SEPARATOR in title:
-            group_name, entry_title = title.split(AppSettings.GROUP_SEPARATOR, 1)
-            grouped_entries[group_name.strip()].append({'title': entry_title.strip(), 'content': entry.get("content", "")})
-        else: single_entries.append(entry)
-    for group_name, items in grouped_entries.items():
-        if not items: continue
-        _, ext, prefix = _detect_format(items[0]['content']) if not no_detect else (items[0]['content'], ".md", "#")
-        full_content = []
-        for item in items:
-            content, detected_ext, _ = _detect_format(item['content']) if not no_detect else (item['content'], ".md", "#")
-            if detected_ext != ext: print(f"警告: 合集 '{group_name}' 中条目 '{item['title']}' 格式({detected_ext})与首个条目({ext})不一致。")
-            full_content.append(f"{prefix} ^{item['title']}\n{content}")
-        (directory / f"{sanitize_filename_component(group_name)}合集{ext}").write_text("\n".join(full_content).strip() + "\n", encoding='utf-8')
-    for entry in single_entries:
-        title = entry.get("comment", "").strip()
-        content, ext, _ = _detect_format(entry.get("content", "")) if not no_detect else (entry.get("content", ""), ".md", "#")
-        (directory / f"{sanitize_filename_component(title)}{ext}").write_text(content.strip() + "\n", encoding='utf-8')
+    # 条目边解析边写出；合集文件逐条追加，每个合集只在内存中保留最后一条 (写出时需去掉结尾空白)
+    groups: Dict[str, Dict[str, Any]] = {}
+    writer = _BoundedWriter(AppSettings.EXTRACT_WRITERS)
+    try:
+        for entry in iter_lorebook_entries(lorebook_file):
+            title, raw_content = entry.get("comment", "").strip(), entry.get("content", "")
+            content, ext, prefix = _detect_format(raw_content) if not no_detect else (raw_content, ".md", "#")
+            if group and AppSettings.GROUP_SEPARATOR in title:
+                group_name, entry_title = (part.strip() for part in title.split(AppSettings.GROUP_SEPARATOR, 1))
+                g = groups.get(group_name)
+                if g is None:
+                    g = groups[group_name] = {'path': directory / f"{sanitize_filename_component(group_name)}合集{ext}", 'ext': ext, 'prefix': prefix, 'last': None}
+                    g['path'].write_text("", encoding='utf-8')
+                elif ext != g['ext']: print(f"警告: 合集 '{group_name}' 中条目 '{entry_title}' 格式({ext})与首个条目({g['ext']})不一致。")
+                if g['last'] is not None:
+                    with g['path'].open("a", encoding='utf-8') as f: f.write(g['last'] + "\n")
+                g['last'] = f"{g['prefix']} ^{entry_title}\n{content}"
+            else: writer.submit(directory / f"{sanitize_filename_component(title)}{ext}", content.strip() + "\n")
+        for g in groups.values():
+            with g['path'].open("a", encoding='utf-8') as f: f.write(g['last'].rstrip() + "\n")
+    finally: writer.close()
     if not no_detect:
         print("正在格式化提取的文件...")
         format_files(directory, "json", ["clang-format", "-i"])
         format_files(directory, "yaml", ["yq", '... style=""', "-i"])
     print("成功提取")
 
-def watch(directory: Path, lorebook_name: str, user_name: Optional[str], no_trim: bool, port: str):
+# === watch 增量推送协议 ===
+# lorebook_updated: {name, content, version}  完整快照 (旧版接收端忽略 version 即可)
+# lorebook_delta:   {name, base_version, version, upserts: {uid: 条目}, deletes: [uid]}
+#   接收端的版本等于 base_version 时应用并回复 {'ok': True}，否则回复 {'ok': False}，随后会收到完整快照。
+
+def apply_lorebook_delta(lorebook: dict, version: int, payload: dict) -> Optional[int]:
+    """接收端参考实现: 应用增量并返回新版本号；版本不匹配返回 None (应等待完整快照)。"""
+    if payload.get('base_version') != version: return None
+    entries = lorebook.setdefault('entries', {})
+    for uid in payload.get('deletes', []): entries.pop(uid, None)
+    entries.update(payload.get('upserts', {}))
+    return payload['version']
+
+class DeltaPublisher:
+    """记录接收端已确认的条目摘要与版本号；增量模式下只发送新增/修改/删除的条目。"""
+    def __init__(self, sio: Any, lorebook_name: str, use_delta: bool):
+        self.sio, self.lorebook_name, self.use_delta = sio, lorebook_name, use_delta
+        self.sids: set = set()
+        self.legacy_sids: set = set()
+        self.version = 0
+        self.sent: Optional[Dict[str, str]] = None  # None 表示与接收端没有共同基线，下次必须发送快照
+
+    @staticmethod
+    def digest_entries(entries: dict) -> Dict[str, str]:
+        return {str(uid): hashlib.sha1(json.dumps(e, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest() for uid, e in entries.items()}
+
+    def _snapshot(self, lorebook: dict) -> dict:
+        return {'name': self.lorebook_name, 'content': json.dumps(lorebook), 'version': self.version}
+
+    async def publish(self, lorebook: dict) -> str:
+        entries = lorebook.get('entries', {})
+        current = self.digest_entries(entries)
+        if not self.use_delta or self.sent is None:
+            self.version += 1
+            await self.sio.emit('lorebook_updated', self._snapshot(lorebook))
+            self.sent = current
+            return "完整快照"
+        upserts = {str(uid): e for uid, e in entries.items() if self.sent.get(str(uid)) != current[str(uid)]}
+        deletes = [uid for uid in self.sent if uid not in current]
+        payload = {'name': self.lorebook_name, 'base_version': self.version, 'version': self.version + 1, 'upserts': upserts, 'deletes': deletes}
+        self.version += 1
+        stale = [sid for sid in self.sids if sid in self.legacy_sids]
+        for sid in list(self.sids - self.legacy_sids):
+            try: ack = await self.sio.call('lorebook_delta', payload, to=sid, timeout=AppSettings.DELTA_ACK_TIMEOUT)
+            except Exception: ack = None; self.legacy_sids.add(sid)  # 超时: 接收端不支持增量事件，之后只发快照
+            if not (isinstance(ack, dict) and ack.get('ok')): stale.append(sid)
+        for sid in stale: await self.sio.emit('lorebook_updated', self._snapshot(lorebook), to=sid)
+        self.sent = current
+        return f"增量: 更新 {len(upserts)} 个, 删除 {len(deletes)} 个" + (f"; {len(stale)} 个接收端改用完整快照" if stale else "")
+
+def watch(directory: Path, lorebook_name: str, user_name: Optional[str], no_trim: bool, port: str, debounce: str = AppSettings.DEFAULT_WATCH_DEBOUNCE_MS, delta: bool = False):
     try:
         import socketio, tornado.ioloop, tornado.web, watchfiles
     except ImportError:
@@ -337,30 +953,54 @@ def watch(directory: Path, lorebook_name: str, user_name: Optional[str], no_trim
         sys.exit(1)
     
     sio = socketio.AsyncServer(cors_allowed_origins='*', async_mode='tornado')
+    publisher = DeltaPublisher(sio, lorebook_name, delta)
+    # 条目按文件缓存，世界书缓存为上次从酒馆取得并打过补丁的版本；文件变动时只重新解析变动的文件
+    state: Dict[str, Any] = {'cache': None, 'lorebook': None}
+    
+    async def send_lorebook(data: dict, fresh: bool = False):
+        try:
+            if fresh: publisher.sent = None  # 刚从酒馆取得的世界书，接收端的版本未知
+            changed, updated_json = push_impl(directory, data, user_name, not no_trim, entries=state['cache'].entries())
+            state['lorebook'] = updated_json
+            if changed:
+                mode = await publisher.publish(updated_json)
+                print(f"成功将更新推送到 '{lorebook_name}' ({mode})")
+            else: print("内容无变化，无需推送。")
+        except Exception as e: print(f'推送错误: {e}')
     
-    async def push_once(reason: str):
+    async def push_once(reason: str, changed_paths: Optional[List[Path]] = None):
         print(f"{'='*80}\n{reason}")
+        try:
+            if state['cache'] is None: state['cache'] = EntryCache(directory, not no_trim, user_name)
+            elif changed_paths: state['cache'].refresh(changed_paths)
+        except Exception as e:
+            print(f'推送错误: {e}'); print('='*80); return
+        if changed_paths is not None and state['lorebook'] is not None:
+            await send_lorebook(state['lorebook'])
+            print('='*80)
+            return
         async def update_lorebook(data: Optional[dict]):
-            if data:
-                try:
-                    changed, updated_json = push_impl(directory, data, user_name, not no_trim)
-                    if changed:
-                        await sio.emit('lorebook_updated', {'name': lorebook_name, 'content': json.dumps(updated_json)})
-                        print(f"成功将更新推送到 '{lorebook_name}'")
-                    else: print("内容无变化，无需推送。")
-                except Exception as e: print(f'推送错误: {e}')
+            if data: await send_lorebook(data, fresh=True)
             else: print("错误: 未在酒馆网页中找到相应世界书")
             print('='*80)
         await sio.emit('request_lorebook_update', {'name': lorebook_name}, callback=update_lorebook)
     
     @sio.event
-    async def connect(sid, *_): await push_once(f"成功连接到酒馆网页 '{sid}', 初始化推送...")
+    async def connect(sid, *_):
+        publisher.sids.add(sid)
+        state['lorebook'] = None  # 重新连接时以酒馆中的世界书为准
+        await push_once(f"成功连接到酒馆网页 '{sid}', 初始化推送...")
     
     @sio.event
-    async def disconnect(sid, reason=None): print(f"与酒馆网页 '{sid}' 断开连接" + (f" (原因: {reason})" if reason else ""))
+    async def disconnect(sid, reason=None):
+        publisher.sids.discard(sid); publisher.legacy_sids.discard(sid)
+        print(f"与酒馆网页 '{sid}' 断开连接" + (f" (原因: {reason})" if reason else ""))
     
     async def background_task():
-        async for changes in watchfiles.awatch(directory): await push_once(f"检测到文件变化: {', '.join(map(str, {c[1] for c in changes}))}")
+        window = int(debounce)
+        async for changes in watchfiles.awatch(directory, debounce=window, step=min(50, window)):
+            paths = sorted({Path(c[1]) for c in changes})
+            await push_once(f"检测到文件变化: {', '.join(map(str, paths))}", paths)
     
     sio.start_background_task(background_task)
     
@@ -374,6 +1014,110 @@ def watch(directory: Path, lorebook_name: str, user_name: Optional[str], no_trim
         print("\n监听已停止。")
         tornado.ioloop.IOLoop.current().stop()
 
+# === 增量发布压缩包 ===
+# 清单 (.tavern_sync_publish) 记录上次生成的压缩包的 (mtime_ns, 大小)，以及每个源文件的 [mtime_ns, 大小, sha256]。
+# stat 与清单一致的文件不再读取，直接拷贝旧成员的压缩数据；stat 变了但 sha256 没变的同样复用。
+# 其余文本文件在线程池中压缩并按顺序流式写入新压缩包，内存中最多同时保留 PUBLISH_READ_AHEAD 个压缩结果。
+# 已压缩过的媒体文件只存储不压缩。
+
+def _append_raw_member(dst: zipfile.ZipFile, info: zipfile.ZipInfo, write_data: Callable[[Any], None]):
+    """把已压缩好的数据作为成员追加到 dst (info 中的 CRC/大小/压缩方式须已填好)。"""
+    info.header_offset = dst.fp.tell()
+    info.flag_bits &= ~0x08  # CRC 与大小直接写在本地文件头中，不使用数据描述符
+    dst.fp.write(info.FileHeader())
+    write_data(dst.fp)
+    dst.filelist.append(info)
+    dst.NameToInfo[info.filename] = info
+    dst.start_dir = dst.fp.tell()
+    dst._didModify = True
+
+def _copy_member_data(src: zipfile.ZipFile, info: zipfile.ZipInfo, out: Any):
+    src.fp.seek(info.header_offset)
+    name_len, extra_len = struct.unpack('<HH', src.fp.read(30)[26:30])
+    src.fp.seek(info.header_offset + 30 + name_len + extra_len)
+    remaining = info.compress_size
+    while remaining:
+        chunk = src.fp.read(min(remaining, 1 << 20))
+        if not chunk: raise zipfile.BadZipFile(f"旧压缩包中的 '{info.filename}' 已损坏")
+        out.write(chunk)
+        remaining -= len(chunk)
+
+def _copy_file_data(path: Path, out: Any):
+    with path.open("rb") as f: shutil.copyfileobj(f, out, 1 << 20)
+
+def _prepare_zip_member(path: Path, arcname: str, previous: Optional[zipfile.ZipInfo], record: Optional[list]) -> Tuple[zipfile.ZipInfo, Any, list]:
+    """返回 (成员信息, 数据, 清单记录)；数据为 None 表示复用旧成员，为 Path 表示按原样存储该文件，否则为压缩后的字节。"""
+    st = path.stat()
+    stored = path.suffix.lower() in AppSettings.STORED_MEDIA_SUFFIXES
+    compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+    reusable = previous is not None and record is not None and previous.compress_type == compress_type
+    if reusable and record[:2] == [st.st_mtime_ns, st.st_size]: return previous, None, record
+    sha, crc, size, data = hashlib.sha256(), 0, 0, b""
+    if stored:  # 媒体文件可能很大，分块计算哈希，写入时再从磁盘拷贝
+        with path.open("rb") as f:
+            for chunk in iter(partial(f.read, 1 << 20), b""): sha.update(chunk); crc = zlib.crc32(chunk, crc); size += len(chunk)
+    else:
+        data = path.read_bytes()
+        sha.update(data); crc, size = zlib.crc32(data), len(data)
+    new_record = [st.st_mtime_ns, st.st_size, sha.hexdigest()]
+    if reusable and (record[2], previous.file_size) == (new_record[2], size): return previous, None, new_record
+    info = zipfile.ZipInfo.from_file(path, arcname)
+    info.compress_type, info.CRC, info.file_size = compress_type, crc, size
+    if stored:
+        info.compress_size = size
+        return info, path, new_record
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    data = compressor.compress(data) + compressor.flush()
+    info.compress_size = len(data)
+    return info, data, new_record
+
+def _load_publish_manifest(manifest_path: Path, dest_zip: Path) -> Dict[str, list]:
+    """清单只在压缩包仍是上次生成的那个时有效。"""
+    try:
+        data, st = json.loads(manifest_path.read_text(encoding="utf-8")), dest_zip.stat()
+        if data.get("zip") == [st.st_mtime_ns, st.st_size]: return data.get("files", {})
+    except (OSError, ValueError, AttributeError): pass
+    return {}
+
+def build_source_zip(source_dir: Path, dest_zip: Path) -> int:
+    """生成 (或增量更新) 源文件压缩包，返回复用的成员数。"""
+    arc_root = Path("世界书源文件")
+    files = sorted(f for f in source_dir.rglob('*') if f.is_file() and not any(sub in str(f) for sub in AppSettings.IGNORED_FILE_SUBSTRINGS))
+    arcnames = [(arc_root / f.relative_to(source_dir)).as_posix() for f in files]
+    manifest_path = dest_zip.with_name(AppSettings.PUBLISH_MANIFEST_NAME)
+    old_records = _load_publish_manifest(manifest_path, dest_zip)
+    try: previous = zipfile.ZipFile(dest_zip) if old_records else None
+    except (OSError, zipfile.BadZipFile): previous = None
+    old_infos = {info.filename: info for info in previous.infolist()} if previous else {}
+    tmp_zip, reused, records = dest_zip.with_name(dest_zip.name + ".tmp"), 0, {}
+
+    def write_member(zf: zipfile.ZipFile, arcname: str, prepared: Any):
+        nonlocal reused
+        info, data, records[arcname] = prepared.result()
+        if data is None:
+            _append_raw_member(zf, copy.copy(info), partial(_copy_member_data, previous, info)); reused += 1
+        elif isinstance(data, Path): _append_raw_member(zf, info, partial(_copy_file_data, data))
+        else: _append_raw_member(zf, info, lambda out: out.write(data))
+
+    try:
+        with ThreadPoolExecutor(max_workers=AppSettings.PUBLISH_WORKERS) as pool, zipfile.ZipFile(tmp_zip, 'w', zipfile.ZIP_DEFLATED) as zf:
+            window = deque()  # 按顺序写入，同时最多有 PUBLISH_READ_AHEAD 个成员在读取/压缩
+            for f, a in zip(files, arcnames):
+                window.append((a, pool.submit(_prepare_zip_member, f, a, old_infos.get(a), old_records.get(a))))
+                if len(window) >= AppSettings.PUBLISH_READ_AHEAD: write_member(zf, *window.popleft())
+            while window: write_member(zf, *window.popleft())
+            zf.writestr((arc_root / "README.md").as_posix(), AppSettings.PUBLISH_README_CONTENT)
+    except BaseException:
+        tmp_zip.unlink(missing_ok=True)
+        raise
+    finally:
+        if previous: previous.close()
+    if dest_zip.exists(): send2trash.send2trash(str(dest_zip))
+    tmp_zip.replace(dest_zip)
+    st = dest_zip.stat()
+    manifest_path.write_text(json.dumps({"zip": [st.st_mtime_ns, st.st_size], "files": records}, ensure_ascii=False, indent=1), encoding="utf-8")
+    return reused
+
 def publish(publish_dir: Path, character_card: Optional[Path], source_dir: Optional[Path], should_zip: bool, need_confirm: bool):
     publish_list = ""
     if character_card: publish_list += f"\n- 角色卡: {character_card}"
@@ -384,15 +1128,11 @@ def publish(publish_dir: Path, character_card: Optional[Path], source_dir: Optio
     if source_dir:
         dest_dir, dest_zip = publish_dir / "源文件", publish_dir / "源文件.zip"
         if dest_dir.exists(): send2trash.send2trash(str(dest_dir))
-        if dest_zip.exists(): send2trash.send2trash(str(dest_zip))
         if should_zip:
-            with zipfile.ZipFile(dest_zip, 'w', zipfile.ZIP_DEFLATED) as zf:
-                for file in source_dir.rglob('*'):
-                    if file.is_file() and not any(sub in str(file) for sub in AppSettings.IGNORED_FILE_SUBSTRINGS):
-                        zf.write(file, Path("世界书源文件") / file.relative_to(source_dir))
-                zf.writestr(str(Path("世界书源文件") / "README.md"), AppSettings.PUBLISH_README_CONTENT)
-            print(f"已创建源文件压缩包于 {dest_zip}")
+            reused = build_source_zip(source_dir, dest_zip)  # 旧压缩包用于复用，新包写好后才移入回收站
+            print(f"已创建源文件压缩包于 {dest_zip} (复用 {reused} 个未变动的文件)")
         else:
+            if dest_zip.exists(): send2trash.send2trash(str(dest_zip))
             shutil.copytree(source_dir, dest_dir, ignore=lambda d, f: [x for x in f if any(s in str(Path(d, x)) for s in AppSettings.IGNORED_FILE_SUBSTRINGS)])
             (dest_dir / "README.md").write_text(AppSettings.PUBLISH_README_CONTENT, encoding="utf-8")
             print(f"已拷贝 {source_dir} 到 {dest_dir} 中")
@@ -403,9 +1143,89 @@ def convert_extension(directory: Path, old_ext: str, new_ext: str, need_confirm:
     for path in directory.rglob(f"*{old_ext}"):
         if not path.is_file(): continue
         try:
-            run_subprocess(["yq", '.. style=""', "-p", old_ext[1:], "-o", new_ext[1:], "-i", str(path)])
+            path.write_text(convert_yaml_json(path.read_text(encoding='utf-8'), old_ext[1:], new_ext[1:]), encoding='utf-8')
             path.rename(path.with_suffix(new_ext))
-        except (subprocess.CalledProcessError, FileNotFoundError): print(f"转换 '{path.name}' 失败，已跳过。")
+        except (yaml.YAMLError, ValueError, TypeError): print(f"转换 '{path.name}' 失败，已跳过。")
+
+# 比对模式: 名称 -> (输入扩展名, yq 参数, 进程内实现)
+YAML_CHECK_MODES: Dict[str, Tuple[str, List[str], Callable[[str], Optional[str]]]] = {
+    "flow": (".yaml", ['.. style="flow"'], lambda text: restyle_yaml(text, flow=True)),
+    "block": (".yaml", ['... style=""'], lambda text: restyle_yaml(text, flow=False)),
+    "json2yaml": (".json", ['.. style=""', "-p", "json", "-o", "yaml"], lambda text: convert_yaml_json(text, "json", "yaml")),
+}
+
+def _yq_version() -> Optional[str]:
+    """已安装的 mikefarah/yq 的版本信息 (pip 的同名 jq 包装器输出格式不同，不能作为基准)，未安装时返回 None。"""
+    try: result = run_subprocess(["yq", "--version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except (FileNotFoundError, subprocess.CalledProcessError): return None
+    version = (result.stdout + result.stderr).strip()
+    return version if "mikefarah" in version else None
+
+def _yq_available() -> bool:
+    return _yq_version() is not None
+
+def _builtin_yaml(mode: str, text: str) -> Optional[str]:
+    try: return YAML_CHECK_MODES[mode][2](text)
+    except (yaml.YAMLError, ValueError) as e: return f"<解析失败: {e}>\n"
+
+def _report_mismatch(name: str, expected: str, actual: str, expected_label: str) -> bool:
+    if actual.strip() == expected.strip(): return False
+    print(f"不一致: {name}")
+    for line in list(difflib.unified_diff(expected.strip().splitlines(), actual.strip().splitlines(), expected_label, "内置", lineterm=""))[:12]: print(f"    {line}")
+    return True
+
+def check_yaml_fixtures(record: bool = False) -> int:
+    """比对 tavern_sync_fixtures 中保存的 <名称>.<模式>.in.* 与 <名称>.<模式>.out.yaml，无需安装 yq。
+
+    record=True 时用本机的 yq 重新生成 .out.yaml (需安装 mikefarah/yq)，并在 recorded_with.txt 中记下 yq 版本。返回不一致的数量。"""
+    fixtures = sorted(AppSettings.YAML_FIXTURES_DIR.glob("*.in.*"))
+    recorded_with = AppSettings.YAML_FIXTURES_DIR / "recorded_with.txt"
+    if record:
+        version = _yq_version()
+        if version is None: print("错误: 未找到 'yq', 无法生成基准文件。"); return 0
+        recorded_with.write_text(version + "\n", encoding='utf-8')
+    elif recorded_with.exists(): print(f"基准文件录制自: {recorded_with.read_text(encoding='utf-8').strip()}")
+    else: print("注意: 基准文件尚未用 mikefarah/yq 录制 (安装 yq 后运行 check_yaml --record)，以下结果只说明与手写的基准一致。")
+    mismatched = 0
+    for path in fixtures:
+        name, mode = path.name.split(".")[:2]
+        if mode not in YAML_CHECK_MODES: continue
+        text = path.read_text(encoding='utf-8')
+        expected_path = path.with_name(f"{name}.{mode}.out.yaml")
+        if record:
+            output = run_subprocess(["yq", *YAML_CHECK_MODES[mode][1]], input=text, stdout=subprocess.PIPE).stdout
+            expected_path.write_text(output, encoding='utf-8')
+            continue
+        actual = _builtin_yaml(mode, text)
+        if actual is None: actual = "<含注释或锚点, 未在进程内处理>\n"
+        mismatched += _report_mismatch(path.name, expected_path.read_text(encoding='utf-8'), actual, expected_path.name)
+    print(f"共{'生成' if record else '比对'} {len(fixtures)} 个基准文件" + ("。" if record else f", {mismatched} 个与保存的 yq 输出不一致。"))
+    return mismatched
+
+def check_yaml(directory: Path, fixtures: bool = False, record: bool = False):
+    """以 yq 的输出为基准，逐文件比对进程内 YAML 输出 (flow 压缩 与 JSON 转 YAML)。
+
+    fixtures=True 或未安装 yq 时改为比对仓库中保存的基准文件。"""
+    if fixtures or record: return check_yaml_fixtures(record)
+    if not _yq_available():
+        print("未找到 'yq', 改为比对保存的基准文件。")
+        return check_yaml_fixtures()
+    checked, mismatched, external = 0, 0, []
+    for path in sorted(p for p in directory.rglob("*") if p.suffix in (".yaml", ".json") and p.is_file()):
+        text = _toggle_special_blocks_content(path.read_text(encoding='utf-8'), 'comment')
+        mode = "flow" if path.suffix == ".yaml" else "json2yaml"
+        try: expected = run_subprocess(["yq", *YAML_CHECK_MODES[mode][1]], input=text, stdout=subprocess.PIPE, stderr=subprocess.PIPE).stdout
+        except subprocess.CalledProcessError: continue
+        actual = _builtin_yaml(mode, text)
+        if actual is None:  # 含注释或锚点, 交给 yq 批量处理: 核对批量调用切分出的输出与单独调用一致
+            if mode == "flow": external.append((path, text, expected))
+            continue
+        checked += 1
+        mismatched += _report_mismatch(str(path.relative_to(directory)), expected, actual, "yq")
+    for (path, _, expected), actual in zip(external, _yq_flow_batch([text for _, text, _ in external])):
+        checked += 1
+        mismatched += _report_mismatch(f"{path.relative_to(directory)} (批量 yq)", expected, actual or "<批量调用失败>\n", "yq")
+    print(f"共比对 {checked} 个文件, {mismatched} 个与 yq 输出不一致。")
 
 COMMAND_REGISTRY = {
     'extract': {'handler': extract, 'help': '从世界书文件提取条目', 'interactive_desc': '提取',
@@ -417,8 +1237,12 @@ COMMAND_REGISTRY = {
             {"key": "group", "text": "是否将 '合集名&条目名' 格式的条目合并为文件?", "type": "bool", "default": False}],
         'required_paths': {'directory': {'key': '世界书本地文件夹', 'must_exist': False}, 'lorebook_file': {'key': '世界书酒馆文件', 'is_file': True}}},
     'push': {'handler': push, 'help': '将本地修改推送到世界书文件', 'interactive_desc': '推送',
-        'cli_args': [{"name": "--no_trim", "action": "store_true", "help": "推送时不压缩条目内容。"}],
-        'interactive_prompts': [{"key": "no_trim", "type": "bool", "cli_help_ref": "--no_trim"}],
+        'cli_args': [
+            {"name": "--no_trim", "action": "store_true", "help": "推送时不压缩条目内容。"},
+            {"name": "--changed_only", "action": "store_true", "help": "只推送自上次推送以来本地有改动的条目。"}],
+        'interactive_prompts': [
+            {"key": "no_trim", "type": "bool", "cli_help_ref": "--no_trim"},
+            {"key": "changed_only", "type": "bool", "cli_help_ref": "--changed_only", "default": False}],
         'required_paths': {'directory': {'key': '世界书本地文件夹', 'is_dir': True}, 'lorebook_file': {'key': '世界书酒馆文件', 'is_file': True}},
         'uses_user_name': True},
     'pull': {'handler': pull, 'help': '从世界书文件拉取内容到本地', 'interactive_desc': '拉取',
@@ -427,9 +1251,12 @@ COMMAND_REGISTRY = {
     'watch': {'handler': watch, 'help': '实时监听本地文件并推送到酒馆网页', 'interactive_desc': '监听',
         'cli_args': [
             {"name": "--no_trim", "action": "store_true", "help": "推送时不压缩条目内容。"},
-            {"name": "--port", "default": AppSettings.DEFAULT_WATCH_PORT, "help": f"监听端口号。"}],
+            {"name": "--port", "default": AppSettings.DEFAULT_WATCH_PORT, "help": f"监听端口号。"},
+            {"name": "--debounce", "default": AppSettings.DEFAULT_WATCH_DEBOUNCE_MS, "help": "合并多少毫秒内的连续文件变动后再推送。"},
+            {"name": "--delta", "action": "store_true", "help": "只推送变动的条目 (需要接收端支持 lorebook_delta 事件)。"}],
         'interactive_prompts': [
             {"key": "no_trim", "type": "bool", "cli_help_ref": "--no_trim"},
+            {"key": "delta", "type": "bool", "cli_help_ref": "--delta", "default": False},
             {"key": "port", "text": f"监听端口号 (默认{AppSettings.DEFAULT_WATCH_PORT}): ", "type": "str", "default": AppSettings.DEFAULT_WATCH_PORT}],
         'required_paths': {'directory': {'key': '世界书本地文件夹', 'is_dir': True}}, 'uses_lorebook_name': True, 'uses_user_name': True},
     'publish': {'handler': publish, 'help': '打包发布角色卡和源文件', 'interactive_desc': '发布',
@@ -440,6 +1267,11 @@ COMMAND_REGISTRY = {
         'required_paths': {'directory': {'key': '世界书本地文件夹', 'is_dir': True}}},
     'to_yaml': {'handler': partial(convert_extension, old_ext=".json", new_ext=".yaml"), 'help': '批量转换 .json 为 .yaml', 'interactive_desc': '转为YAML',
         'required_paths': {'directory': {'key': '世界书本地文件夹', 'is_dir': True}}},
+    'check_yaml': {'handler': check_yaml, 'help': '与 yq 比对内置 YAML 输出是否一致', 'interactive_desc': '校验YAML输出',
+        'cli_args': [
+            {"name": "--fixtures", "action": "store_true", "help": "只比对仓库中保存的基准文件 (不需要 yq)。"},
+            {"name": "--record", "action": "store_true", "help": "用本机 yq 重新生成基准文件的期望输出。"}],
+        'required_paths': {'directory': {'key': '世界书本地文件夹', 'is_dir': True}}},
 }
 
 def as_path(config: dict, key: str, **kwargs) -> Path:
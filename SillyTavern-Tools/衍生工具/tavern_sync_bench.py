@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""tavern_sync 基准测试
+
+生成 100 / 1,000 / 10,000 个条目的合成项目 (YAML/JSON/TOML 混合，含 YAML 合集文件)，
+依次测量 read_entries、push、watch 触发的推送 (快照/增量)、extract、publish 与格式转换，
+输出每个阶段的耗时与峰值内存 (JSON)，便于在不同提交之间比较。
+
+watch 阶段在进程内启动与 watch 相同的 tornado + socketio.AsyncServer (127.0.0.1 随机端口)，
+用真实的 socketio.AsyncClient 扮演酒馆网页，推送耗时包含 socket.io 的编码与传输，
+快照等到接收端应用完毕、增量等到 ack 返回才计时结束。
+(需要 pip install python-socketio tornado aiohttp)
+
+--check_socketio 不做基准测试，只用同一套服务端/客户端检查快照 / 增量 / ack / 回退快照 / 拉取世界书的完整往返。
+
+用法:
+  python tavern_sync_bench.py                         # 默认 100 1000 10000
+  python tavern_sync_bench.py --sizes 100 1000 -o new.json --compare old.json
+  python tavern_sync_bench.py --check_socketio
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import yaml
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import tavern_sync as ts
+
+COLLECTION_RATIO = 5  # 每 5 个条目中有 1 个放进合集文件 (只用 YAML 合集)
+COLLECTION_SIZE = 10
+WATCH_EDITS = 5
+
+
+class _TrashShim:
+    """基准测试只在临时目录中操作，回收站改为直接删除，避免塞满系统回收站。"""
+    @staticmethod
+    def send2trash(path: str):
+        p = Path(path)
+        if p.is_dir(): shutil.rmtree(p)
+        else: p.unlink(missing_ok=True)
+
+
+# === 进程内 socket.io 往返 ===
+
+class InProcessServer:
+    """与 watch 相同的 tornado + socketio.AsyncServer，监听 127.0.0.1 的随机端口。"""
+    def __init__(self):
+        import socketio
+        self.socketio = socketio
+        self.sio = socketio.AsyncServer(async_mode='tornado')
+        self.sids: List[str] = []
+        self.sio.on('connect', lambda sid, *_: self.sids.append(sid))
+        self.sio.on('disconnect', lambda sid, *_: self.sids.remove(sid))
+
+    async def start(self) -> str:
+        import tornado.httpserver, tornado.netutil, tornado.web
+        sockets = tornado.netutil.bind_sockets(0, "127.0.0.1")
+        app = tornado.web.Application([('/socket.io/', self.socketio.get_tornado_handler(self.sio))])
+        self.http = tornado.httpserver.HTTPServer(app)
+        self.http.add_sockets(sockets)
+        return f"http://127.0.0.1:{sockets[0].getsockname()[1]}"
+
+    async def stop(self):
+        await self.sio.shutdown()
+        self.http.stop()
+        await self.http.close_all_connections()
+
+
+class SocketIOReceiver:
+    """用 socketio.AsyncClient 扮演酒馆网页: 处理快照 (lorebook_updated)、增量 (lorebook_delta，返回 ack)
+    与拉取请求 (request_lorebook_update，回调返回当前世界书)，用 apply_lorebook_delta 维护世界书副本。"""
+    def __init__(self, supports_delta: bool = True):
+        import socketio
+        # aiohttp 默认单条消息上限 4MB，一万条目的完整快照会超出；酒馆网页的 JS 客户端没有这个限制
+        self.client = socketio.AsyncClient(reconnection=False, websocket_extra_options={'max_msg_size': 0})
+        self.lorebook: Optional[dict] = None
+        self.version = 0
+        self.bytes_received = 0
+        self.events: Dict[str, int] = {}
+        self._changed = asyncio.Event()
+        self.client.on('lorebook_updated', self._on_snapshot)
+        if supports_delta: self.client.on('lorebook_delta', self._on_delta)
+        self.client.on('request_lorebook_update', lambda data: self.lorebook)
+
+    def _count(self, event: str, data: Any):
+        self.events[event] = self.events.get(event, 0) + 1
+        self.bytes_received += len(json.dumps(data, ensure_ascii=False).encode("utf-8"))
+
+    async def connect(self, url: str):
+        await self.client.connect(url, transports=['websocket'])
+
+    async def _on_snapshot(self, data: dict):
+        self._count('lorebook_updated', data)
+        self.lorebook, self.version = json.loads(data['content']), data.get('version', 0)
+        self._changed.set()
+
+    async def _on_delta(self, data: dict) -> dict:
+        self._count('lorebook_delta', data)
+        version = ts.apply_lorebook_delta(self.lorebook, self.version, data) if self.lorebook is not None else None
+        if version is None: return {'ok': False}
+        self.version = version
+        self._changed.set()
+        return {'ok': True}
+
+    async def wait_version(self, version: int, timeout: float = 10):
+        """等待快照 (emit 无 ack) 真正送达并应用。"""
+        while self.version != version:
+            self._changed.clear()
+            await asyncio.wait_for(self._changed.wait(), timeout)
+
+
+async def _shutdown(server: InProcessServer, *receivers: SocketIOReceiver):
+    for receiver in receivers: await receiver.client.disconnect()
+    await server.stop()
+    tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]  # engine.io 的心跳等后台任务
+    for task in tasks: task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _check_socketio() -> List[str]:
+    failures: List[str] = []
+    def expect(ok: bool, what: str):
+        print(f"  {'通过' if ok else '失败'}: {what}")
+        if not ok: failures.append(what)
+
+    server = InProcessServer()
+    url = await server.start()
+    modern, legacy = SocketIOReceiver(), SocketIOReceiver(supports_delta=False)
+    try:
+        await modern.connect(url); await legacy.connect(url)
+        publisher = ts.DeltaPublisher(server.sio, "检查.json", use_delta=True)
+        publisher.sids.update(server.sids)
+        expect(len(server.sids) == 2, "两个客户端已连接，connect 事件登记了 sid")
+
+        lorebook = {"entries": {str(i): {"uid": i, "comment": f"条目{i}", "content": f"内容{i}"} for i in range(5)}}
+        mode = await publisher.publish(lorebook)
+        await modern.wait_version(publisher.version); await legacy.wait_version(publisher.version)
+        expect(mode == "完整快照" and modern.lorebook == lorebook == legacy.lorebook, "首次推送: 两端都收到完整快照")
+
+        lorebook = json.loads(json.dumps(lorebook))
+        lorebook["entries"]["1"]["content"] = "已修改"
+        lorebook["entries"]["9"] = {"uid": 9, "comment": "新条目", "content": "新增"}
+        del lorebook["entries"]["3"]
+        snapshots = legacy.events.get('lorebook_updated', 0)
+        mode = await publisher.publish(lorebook)
+        await legacy.wait_version(publisher.version)
+        expect(modern.events.get('lorebook_delta') == 1 and modern.events.get('lorebook_updated') == 1, "增量: 支持增量的客户端只收到 lorebook_delta")
+        expect(modern.lorebook == lorebook and modern.version == publisher.version, "增量: 经 ack 确认后两端世界书一致 (更新 2 个，删除 1 个)")
+        expect(legacy.events.get('lorebook_updated') == snapshots + 1 and legacy.lorebook == lorebook, f"不支持增量的客户端回退为完整快照 ({mode})")
+
+        modern.version = -1  # 模拟接收端重新载入后版本对不上
+        lorebook["entries"]["0"]["content"] = "再次修改"
+        await publisher.publish(lorebook)
+        await modern.wait_version(publisher.version)
+        expect(modern.lorebook == lorebook and modern.events.get('lorebook_updated') == 2, "版本不匹配时 ack 为 ok: False，随后补发完整快照")
+
+        future = asyncio.get_running_loop().create_future()
+        await server.sio.emit('request_lorebook_update', {'name': "检查.json"}, to=server.sids[0], callback=future.set_result)
+        expect(await asyncio.wait_for(future, 10) == lorebook, "request_lorebook_update 的回调带回接收端的世界书")
+    finally:
+        await _shutdown(server, modern, legacy)
+    return failures
+
+
+def check_socketio() -> bool:
+    """进程内跑一遍真实的 socket.io 往返，检查事件名、ack/call 语义与负载结构。"""
+    try:
+        import socketio, tornado, aiohttp  # noqa: F401  (AsyncClient 的传输层依赖 aiohttp)
+    except ImportError:
+        print("错误: 需要 pip install python-socketio tornado aiohttp", file=sys.stderr)
+        return False
+    timeout = ts.AppSettings.DELTA_ACK_TIMEOUT
+    ts.AppSettings.DELTA_ACK_TIMEOUT = 1  # 不支持增量的客户端要等 ack 超时，检查时缩短
+    try: failures = asyncio.run(_check_socketio())
+    finally: ts.AppSettings.DELTA_ACK_TIMEOUT = timeout
+    print(f"socket.io 往返检查: {'全部通过' if not failures else f'{len(failures)} 项失败'}")
+    return not failures
+
+
+# === 合成项目 ===
+
+def _entry_data(i: int) -> Dict[str, Any]:
+    return {"名称": f"角色{i}", "编号": i, "标签": [f"标签{i % 7}", f"标签{i % 11}"],
+            "设定": {"性格": "冷静" if i % 2 else "活泼", "描述": f"第 {i} 个条目的描述文字。" * 3}}
+
+
+def _render(data: Dict[str, Any], fmt: str) -> str:
+    if fmt == "yaml": return ts.emit_yaml_nodes([ts._data_to_yaml_node(data)], flow=False)
+    if fmt == "json": return json.dumps(data, ensure_ascii=False, indent=2) + "\n"
+    lines = [f'名称 = "{data["名称"]}"', f'编号 = {data["编号"]}', f'标签 = {json.dumps(data["标签"], ensure_ascii=False)}', "", "[设定]"]
+    lines += [f'{k} = "{v}"' for k, v in data["设定"].items()]
+    return "\n".join(lines) + "\n"
+
+
+def generate_project(root: Path, size: int) -> Path:
+    """生成 size 个条目的源文件夹与对应的世界书 JSON (条目内容为空，首次推送会全部更新)，返回世界书路径。"""
+    source = root / "源文件"
+    formats = ("yaml", "json", "toml")
+    titles: List[str] = []
+    collections: Dict[str, List[int]] = {}
+    for i in range(size):
+        fmt = formats[i % len(formats)]
+        if i % COLLECTION_RATIO == 0 and fmt == "yaml":
+            group = f"组{i // (COLLECTION_RATIO * COLLECTION_SIZE)}"
+            collections.setdefault(group, []).append(i)
+            titles.append(f"{group}{ts.AppSettings.GROUP_SEPARATOR}条目{i}")
+            continue
+        folder = source / f"分类{i % 10}"
+        folder.mkdir(parents=True, exist_ok=True)
+        (folder / f"条目{i}.{fmt}").write_text(_render(_entry_data(i), fmt), encoding="utf-8")
+        titles.append(f"条目{i}")
+    (source / "合集").mkdir(parents=True, exist_ok=True)
+    for group, indices in collections.items():
+        parts = [f"# ^条目{i}\n{_render(_entry_data(i), 'yaml')}" for i in indices]
+        (source / "合集" / f"{group}合集.yaml").write_text("".join(parts), encoding="utf-8")
+    lorebook = {"entries": {str(uid): {"uid": uid, "key": [title], "keysecondary": [], "comment": title, "content": "",
+                                       "constant": False, "order": 100, "position": 0, "depth": 4}
+                            for uid, title in enumerate(titles)}}
+    lorebook_file = root / "世界书.json"
+    lorebook_file.write_text(json.dumps(lorebook, ensure_ascii=False, indent=4), encoding="utf-8")
+    return lorebook_file
+
+
+# === 测量 ===
+
+def measure(run: Callable[[], Any], setup: Optional[Callable[[], Any]] = None, repeat: int = 1, memory: bool = True) -> Dict[str, Any]:
+    """取 repeat 次中的最短耗时；峰值内存在单独一轮中用 tracemalloc 测量，不影响计时。"""
+    times = []
+    for _ in range(repeat):
+        if setup: setup()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter(); run(); times.append(time.perf_counter() - start)
+    result: Dict[str, Any] = {"seconds": round(min(times), 4)}
+    if memory:
+        if setup: setup()
+        tracemalloc.start()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()): run()
+            result["peak_kib"] = tracemalloc.get_traced_memory()[1] // 1024
+        finally: tracemalloc.stop()
+    return result
+
+
+def bench_size(workdir: Path, size: int, repeat: int, memory: bool) -> Dict[str, Any]:
+    root = workdir / f"n{size}"
+    lorebook_file = generate_project(root, size)
+    source, pristine = root / "源文件", lorebook_file.read_text(encoding="utf-8")
+    results: Dict[str, Any] = {}
+    reset_push = lambda: (lorebook_file.write_text(pristine, encoding="utf-8"), (source / ts.AppSettings.PUSH_MANIFEST_NAME).unlink(missing_ok=True))
+
+    results["read_entries"] = measure(lambda: ts.read_entries(source, True, None), repeat=repeat, memory=memory)
+    results["push"] = measure(lambda: ts.push(source, lorebook_file, None, False, False), reset_push, repeat, memory)
+    results["push_unchanged"] = measure(lambda: ts.push(source, lorebook_file, None, False, False), repeat=repeat, memory=memory)
+
+    yaml_texts = [p.read_text(encoding="utf-8") for p in sorted(source.rglob("*.yaml"))]
+    results["convert_yaml_to_json"] = measure(lambda: [ts.convert_yaml_json(t, "yaml", "json") for t in yaml_texts], repeat=repeat, memory=memory)
+
+    for mode in ("snapshot", "delta"):
+        results[f"watch_push_{mode}"] = bench_watch(source, lorebook_file, mode == "delta", repeat, memory)
+
+    extract_dir = root / "提取"
+    results["extract"] = measure(lambda: ts.extract(extract_dir, lorebook_file, False, True, False),
+                                 lambda: shutil.rmtree(extract_dir, ignore_errors=True), repeat, memory)
+
+    publish_dir = root / "发布"
+    results["publish"] = measure(lambda: ts.publish(publish_dir, None, source, True, False),
+                                 lambda: shutil.rmtree(publish_dir, ignore_errors=True), repeat, memory)
+    touched = next(source.rglob("*.json"))
+    def touch_one():
+        touched.write_text(touched.read_text(encoding="utf-8") + " ", encoding="utf-8")
+    results["publish_one_changed"] = measure(lambda: ts.publish(publish_dir, None, source, True, False), touch_one, repeat, memory)
+    results["files"] = sum(1 for p in source.rglob("*") if p.is_file())
+    shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+def bench_watch(source: Path, lorebook_file: Path, delta: bool, repeat: int, memory: bool) -> Dict[str, Any]:
+    """模拟 watch: 连接时推送一次，之后每次改动一个文件，测量 缓存刷新 + push_impl + 经 socket.io 送达接收端 的耗时。
+
+    事件循环在单独的线程中一直运行 (与 watch 一样)，大项目的 push_impl 耗时较长时 engine.io 的心跳也不会超时。"""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    run = lambda coro: asyncio.run_coroutine_threadsafe(coro, loop).result()
+    server, receiver = InProcessServer(), SocketIOReceiver()
+    run(receiver.connect(run(server.start())))
+    publisher = ts.DeltaPublisher(server.sio, lorebook_file.name, delta)
+    publisher.sids.update(server.sids)
+
+    async def publish(lorebook: dict):
+        await publisher.publish(lorebook)
+        await receiver.wait_version(publisher.version)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        cache = ts.EntryCache(source, True, None)
+        _, lorebook = ts.push_impl(source, ts.read_json(lorebook_file), None, True, entries=cache.entries())
+        run(publish(lorebook))
+    targets = sorted(p for p in source.rglob("*.yaml") if "合集" not in p.stem)[:WATCH_EDITS]
+    state = {"n": 0, "lorebook": lorebook}
+
+    def edit():
+        path = targets[state["n"] % len(targets)]
+        state["n"] += 1
+        text = path.read_text(encoding="utf-8")
+        path.write_text(ts.emit_yaml_nodes([ts._data_to_yaml_node({**yaml.safe_load(text), "修改次数": f"{'增量' if delta else '快照'}{state['n']}"})], flow=False), encoding="utf-8")
+        state["path"] = path
+
+    def push_once():
+        cache.refresh([state["path"]])
+        changed, state["lorebook"] = ts.push_impl(source, state["lorebook"], None, True, entries=cache.entries())
+        if changed: run(publish(state["lorebook"]))
+
+    before = receiver.bytes_received
+    runs = max(repeat, WATCH_EDITS)
+    try: result = measure(push_once, edit, runs, memory)
+    finally:
+        run(_shutdown(server, receiver))
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+    if receiver.lorebook != json.loads(json.dumps(state["lorebook"])): raise RuntimeError("接收端的世界书与推送端不一致")
+    if delta and receiver.events.get('lorebook_delta', 0) < runs: raise RuntimeError("增量推送没有经 lorebook_delta 送达")
+    result["bytes_per_push"] = (receiver.bytes_received - before) // (runs + (1 if memory else 0))
+    return result
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]):
+    """打印两次结果中各阶段耗时的比值 (新/旧)。"""
+    for size, phases in new["results"].items():
+        for phase, value in phases.items():
+            base = old.get("results", {}).get(size, {}).get(phase)
+            if isinstance(value, dict) and isinstance(base, dict) and base.get("seconds"):
+                print(f"{size:>6} {phase:<22} {base['seconds']:>9.4f}s -> {value['seconds']:>9.4f}s  x{value['seconds'] / base['seconds']:.2f}", file=sys.stderr)
+
+
+def _git_revision() -> Optional[str]:
+    try: return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError): return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="tavern_sync 基准测试: 输出各阶段耗时与峰值内存 (JSON)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000], help="条目数量")
+    parser.add_argument("--repeat", type=int, default=3, help="每个阶段重复次数 (取最短耗时)")
+    parser.add_argument("--no_memory", action="store_true", help="跳过 tracemalloc 峰值内存测量")
+    parser.add_argument("-o", "--output", type=Path, help="结果写入的 JSON 文件 (默认输出到屏幕)")
+    parser.add_argument("--compare", type=Path, help="与之前保存的结果比较")
+    parser.add_argument("--check_socketio", action="store_true", help="只检查进程内 socket.io 往返 (快照/增量/ack)，不做基准测试")
+    args = parser.parse_args()
+    if args.check_socketio: sys.exit(0 if check_socketio() else 1)
+
+    ts.send2trash = _TrashShim
+    report: Dict[str, Any] = {"revision": _git_revision(), "script_version": ts.AppSettings.SCRIPT_VERSION,
+                              "python": platform.python_version(), "platform": platform.platform(), "results": {}}
+    with tempfile.TemporaryDirectory(prefix="tavern_sync_bench_") as workdir:
+        for size in args.sizes:
+            print(f"正在测试 {size} 个条目...", file=sys.stderr)
+            report["results"][str(size)] = bench_size(Path(workdir), size, args.repeat, not args.no_memory)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output: args.output.write_text(text + "\n", encoding="utf-8")
+    else: print(text)
+    if args.compare: compare(json.loads(args.compare.read_text(encoding="utf-8")), report)
+
+
+if __name__ == "__main__":
+    main()